@@ -4,19 +4,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from alpaca_trade_api.rest import REST, TimeFrame
-api = REST()
+
+from common.rate_limit import rate_limited, ALPACA_ENDPOINTS, ALPACA_ORDER_METHODS
+from common.charting import plot_price
+
+api = rate_limited(REST(), 'alpaca', endpoints=ALPACA_ENDPOINTS, order_methods=ALPACA_ORDER_METHODS,
+                   default_endpoint='trading')
 
 # Fetch Apple data from last 100 days
 APPLE_DATA=api.get_bars("AAPL", TimeFrame.Hour, "2024-09-14", "2024-10-14").df
 
-# Reformat data (drop multiindex, rename columns, reset index)
-APPLE_DATA.columns = APPLE_DATA.columns.to_flat_index()
-APPLE_DATA.columns = [x[1] for x in APPLE_DATA.columns]
+# Reset index so the bar time is a column
 APPLE_DATA.reset_index(inplace=True)
 print(APPLE_DATA.head())
 
-# Plot stock price data
-plot = APPLE_DATA.plot(x="timestamp", y="p", legend=False)
-plot.set_xlabel("Date")
-plot.set_ylabel("Apple Close Price ($)")
+# Plot close with SMA and ATR overlays, downsampled to a fixed number of points
+fig, ax = plt.subplots()
+plot_price(ax, APPLE_DATA["timestamp"].dt.tz_localize(None).to_numpy(), APPLE_DATA["close"],
+           APPLE_DATA["high"], APPLE_DATA["low"], short_window=20, long_window=50)
+ax.set_xlabel("Date")
+ax.set_ylabel("Apple Close Price ($)")
 plt.show()
@@ -0,0 +1,536 @@
+"""
+Distributed parameter sweeps of the EnhancedMLTrader rules over plain TCP.
+
+A coordinator shards (parameter set x symbol x date range) into tasks and
+hands them to workers that pull one shard at a time, so faster nodes simply
+take more shards. Workers read bars through a shared on-disk cache (e.g. an
+NFS mount) and stream each result back as soon as it is done. Shards held by
+a worker that disconnects or stops heartbeating are requeued, up to
+max_attempts. Once the queue is empty, idle workers take a duplicate of the
+longest-running shard and the first result wins, so one slow node does not
+hold up the end of the job.
+
+    # On the coordinator host
+    python distributed.py coordinator --host 0.0.0.0 --symbols SPY,QQQ,IWM \
+        --periods 2016-01-01:2019-12-31,2020-01-01:2023-12-31 --output sweep.jsonl
+    # On every worker node
+    python distributed.py worker --host coordinator.lan --processes 8 --cache /mnt/shared/bars
+    # Everything on localhost
+    python distributed.py local --workers 4 --symbols SPY,QQQ --periods 2018-01-01:2023-12-31
+
+``--runner lumibot`` runs each shard through EnhancedMLTrader.backtest instead
+of the vectorized replay in robustness.simulate.
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from filelock import SoftFileLock, Timeout
+
+from common.rate_limit import get_limiter
+from robustness import DEFAULT_GRID, param_grid, simulate, trade_stats
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 5.0
+WARMUP_DAYS = 400  # Calendar days of bars loaded before a shard's start to warm up the indicators
+
+
+# ----------------------------
+# Wire protocol: one JSON object per line
+# ----------------------------
+def _send(wfile, lock, message):
+    data = (json.dumps(message, default=str) + "\n").encode()
+    with lock:
+        wfile.write(data)
+        wfile.flush()
+
+
+def make_tasks(grid, symbols, periods):
+    """
+    One task per (parameter set, symbol, (start, end)) combination; dates are YYYY-MM-DD strings.
+    """
+    return [{'params': params, 'symbol': symbol, 'start': start, 'end': end}
+            for params, symbol, (start, end) in itertools.product(list(param_grid(grid)), symbols, periods)]
+
+
+# ----------------------------
+# Coordinator
+# ----------------------------
+class _Shard:
+    __slots__ = ('id', 'task', 'attempts', 'holders', 'started', 'done', 'errors')
+
+    def __init__(self, shard_id, task):
+        self.id = shard_id
+        self.task = task
+        self.attempts = 0
+        self.holders = set()  # Workers currently running this shard
+        self.started = None
+        self.done = False
+        self.errors = []
+
+
+class Coordinator:
+    """
+    Hands out shards to pulling workers and collects their results.
+
+    Parameters:
+    - tasks (list): JSON-serializable task dicts.
+    - host, port: Address to listen on; port 0 picks a free one.
+    - lease_timeout (float): Seconds without any message before a worker counts as lost.
+    - max_attempts (int): Runs per shard (lost worker or error) before it is given up.
+    - steal_after (float): Seconds a shard must have run before idle workers duplicate it.
+    - token (str): Shared secret workers must present.
+    - on_result (callable): Called with each result record as it arrives.
+    """
+
+    def __init__(self, tasks, host="127.0.0.1", port=7700, lease_timeout=30.0, max_attempts=3,
+                 steal_after=5.0, token=None, on_result=None):
+        self.shards = {i: _Shard(i, task) for i, task in enumerate(tasks)}
+        self.pending = collections.deque(self.shards)
+        self.results = {}
+        self.failed = {}
+        self.workers = {}  # worker id -> {'last_seen', 'shards', 'connection'}
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.steal_after = steal_after
+        self.token = token
+        self.on_result = on_result
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.stolen = 0
+        self.requeued = 0
+        self._stop = threading.Event()
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator._serve(self)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="sweep-coordinator", daemon=True).start()
+        threading.Thread(target=self._monitor, name="sweep-leases", daemon=True).start()
+        logger.info("Coordinator listening on %s:%s with %d shards", *self.address, len(self.shards))
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _complete(self):
+        return len(self.results) + len(self.failed) == len(self.shards)
+
+    def wait(self, timeout=None):
+        """
+        Block until every shard has a result or has failed; returns (results, failed) by shard id.
+        """
+        with self.finished:
+            self.finished.wait_for(self._complete, timeout)
+            return dict(self.results), dict(self.failed)
+
+    # ----------------------------
+    # Connection handling
+    # ----------------------------
+    def _serve(self, connection):
+        write_lock = threading.Lock()
+        worker = None
+        try:
+            hello = json.loads(connection.rfile.readline() or b"{}")
+            if hello.get('type') != 'hello' or (self.token and hello.get('token') != self.token):
+                logger.warning("Rejected connection from %s", connection.client_address)
+                return
+            worker = hello.get('worker') or uuid.uuid4().hex
+            self._lost(worker, "reconnected")  # Requeue whatever an earlier connection of this worker held
+            with self.lock:
+                self.workers[worker] = {'last_seen': time.monotonic(), 'shards': set(), 'connection': connection}
+            logger.info("Worker %s connected from %s", worker, connection.client_address[0])
+            for line in connection.rfile:
+                message = json.loads(line)
+                with self.lock:
+                    state = self.workers.get(worker)
+                    if state is None or state['connection'] is not connection:
+                        return  # Lease expired; its shards were already requeued
+                    state['last_seen'] = time.monotonic()
+                kind = message.get('type')
+                if kind == 'next':
+                    _send(connection.wfile, write_lock, self._next(worker))
+                elif kind == 'result':
+                    self._finish(worker, message.get('shard'), message.get('result'), message.get('elapsed'))
+                elif kind == 'error':
+                    self._failed_attempt(worker, message.get('shard'), message.get('error'))
+        except (OSError, ValueError) as e:
+            logger.warning("Worker %s connection error: %s", worker, e)
+        finally:
+            if worker is not None:
+                self._lost(worker, "disconnected", connection)
+
+    def _next(self, worker):
+        with self.lock:
+            while self.pending:
+                shard = self.shards[self.pending.popleft()]
+                if shard.done:
+                    continue
+                return self._assign(worker, shard)
+            if self._complete():
+                return {'type': 'done'}
+            # Queue drained: duplicate the longest-running shard this worker is not already on
+            now = time.monotonic()
+            running = [shard for shard in self.shards.values()
+                       if not shard.done and shard.holders and worker not in shard.holders
+                       and len(shard.holders) < 2 and now - shard.started >= self.steal_after]
+            if running:
+                self.stolen += 1
+                return self._assign(worker, min(running, key=lambda shard: shard.started), steal=True)
+            return {'type': 'wait', 'seconds': 0.5}
+
+    def _assign(self, worker, shard, steal=False):
+        if not steal:
+            shard.attempts += 1
+            shard.started = time.monotonic()
+        shard.holders.add(worker)
+        self.workers[worker]['shards'].add(shard.id)
+        return {'type': 'shard', 'shard': shard.id, 'task': shard.task}
+
+    def _release(self, worker, shard):
+        shard.holders.discard(worker)
+        if worker in self.workers:
+            self.workers[worker]['shards'].discard(shard.id)
+
+    def _shard(self, worker, shard_id):
+        # Caller holds the lock. A bad id from one worker must not end its connection handler.
+        shard = self.shards.get(shard_id) if isinstance(shard_id, int) else None
+        if shard is None:
+            logger.warning("Worker %s reported unknown shard %r; ignored", worker, shard_id)
+        return shard
+
+    def _finish(self, worker, shard_id, result, elapsed):
+        with self.lock:
+            shard = self._shard(worker, shard_id)
+            if shard is None:
+                return
+            self._release(worker, shard)
+            if shard.done:
+                return  # A duplicate finished first
+            shard.done = True
+            record = {'shard': shard_id, 'task': shard.task, 'worker': worker, 'elapsed': elapsed, 'result': result}
+            self.results[shard_id] = record
+            self.finished.notify_all()
+        if self.on_result is not None:
+            self.on_result(record)
+
+    def _retry(self, shard, reason):
+        # Caller holds the lock. Requeue unless another copy is still running or attempts are used up.
+        if shard.done or shard.holders:
+            return
+        shard.errors.append(reason)
+        if shard.attempts >= self.max_attempts:
+            shard.done = True
+            self.failed[shard.id] = {'shard': shard.id, 'task': shard.task, 'errors': shard.errors}
+            logger.error("Shard %s failed after %d attempts: %s", shard.id, shard.attempts, reason)
+            self.finished.notify_all()
+        else:
+            self.requeued += 1
+            self.pending.appendleft(shard.id)
+
+    def _failed_attempt(self, worker, shard_id, error):
+        with self.lock:
+            shard = self._shard(worker, shard_id)
+            if shard is None:
+                return
+            self._release(worker, shard)
+            self._retry(shard, f"{worker}: {error}")
+
+    def _lost(self, worker, reason, connection=None):
+        with self.lock:
+            state = self.workers.get(worker)
+            if state is None or (connection is not None and state['connection'] is not connection):
+                return None  # Already handled, or the worker has since reconnected
+            del self.workers[worker]
+            for shard_id in state['shards']:
+                shard = self.shards[shard_id]
+                shard.holders.discard(worker)
+                self._retry(shard, f"{worker}: {reason}")
+        if state['shards']:
+            logger.warning("Worker %s %s; requeued its unfinished shards", worker, reason)
+        else:
+            logger.info("Worker %s %s", worker, reason)
+        return state
+
+    def _monitor(self):
+        while not self._stop.wait(1.0):
+            now = time.monotonic()
+            with self.lock:
+                expired = [worker for worker, state in self.workers.items()
+                           if now - state['last_seen'] > self.lease_timeout]
+            for worker in expired:
+                state = self._lost(worker, "missed heartbeats")
+                if state is not None:
+                    try:
+                        state['connection'].connection.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+    def status(self):
+        with self.lock:
+            return {
+                'shards': len(self.shards),
+                'done': len(self.results),
+                'failed': len(self.failed),
+                'pending': len(self.pending),
+                'running': sum(1 for shard in self.shards.values() if shard.holders and not shard.done),
+                'workers': len(self.workers),
+                'stolen': self.stolen,
+                'requeued': self.requeued,
+            }
+
+
+# ----------------------------
+# Shared bar cache
+# ----------------------------
+class BarCache:
+    """
+    Daily bars cached as .npz files in a directory shared by the workers (e.g. NFS).
+
+    Each file is written to a temporary name unique to the host and process, then
+    renamed into place, so a reader sees either nothing or the whole file. Only
+    the rename is relied on; fcntl locks are not dependable on NFS. A soft lock
+    (an exclusively created lock file) keeps other workers from downloading the
+    same bars meanwhile. If it is held for longer than lock_timeout (e.g. left by
+    a dead worker), the waiter downloads anyway and the last rename wins.
+
+    Parameters:
+    - directory (str): Cache directory.
+    - lock_timeout (float): Seconds to wait for another worker's download.
+    """
+
+    def __init__(self, directory, lock_timeout=120.0):
+        self.directory = directory
+        self.lock_timeout = lock_timeout
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, symbol, start, end):
+        """
+        Return dict of 'ts' (int64 ns), 'close', 'high', 'low' arrays for [start, end].
+        """
+        path = os.path.join(self.directory, f"{symbol.replace(':', '_')}_{start}_{end}.npz")
+        if not os.path.exists(path):
+            lock = SoftFileLock(path + ".lock")
+            try:
+                lock.acquire(timeout=self.lock_timeout)
+            except Timeout:
+                logger.warning("%s is still locked after %ss; downloading anyway", path, self.lock_timeout)
+                lock = None
+            try:
+                if not os.path.exists(path):
+                    self._download(symbol, start, end, path)
+            finally:
+                if lock is not None:
+                    lock.release()
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    def _download(self, symbol, start, end, path):
+        import yfinance as yf
+
+        get_limiter('yahoo').acquire()  # This host's share of the Yahoo budget
+        data = yf.download(symbol, start=start, end=(datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)),
+                           interval="1d", progress=False)
+        if data.empty:
+            raise ValueError(f"No bars for {symbol} {start}..{end}")
+        data.columns = data.columns.get_level_values(0)  # Newer yfinance adds a ticker level
+        tmp = f"{path}.{socket.gethostname()}-{os.getpid()}.tmp.npz"
+        np.savez(tmp, ts=data.index.asi8, close=data['Close'].to_numpy(dtype=np.float64),
+                 high=data['High'].to_numpy(dtype=np.float64), low=data['Low'].to_numpy(dtype=np.float64))
+        os.replace(tmp, path)
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+def run_simulation(task, cache):
+    params = dict(task['params'])
+    warmup_start = (datetime.strptime(task['start'], '%Y-%m-%d') - timedelta(days=WARMUP_DAYS)).strftime('%Y-%m-%d')
+    bars = cache.load(task['symbol'], warmup_start, task['end'])
+    start = int(np.searchsorted(bars['ts'], np.datetime64(task['start'], 'ns').astype(np.int64)))
+    pnls = simulate(bars['close'], bars['high'], bars['low'], start=start, **params)
+    return dict(trade_stats(pnls), pnl=float(pnls.sum()))
+
+
+def run_lumibot(task, cache):
+    from lumibot.backtesting import YahooDataBacktesting
+    from tradingbot import EnhancedMLTrader
+
+    stats = EnhancedMLTrader.backtest(
+        datasource_class=YahooDataBacktesting,
+        backtesting_start=datetime.strptime(task['start'], '%Y-%m-%d'),
+        backtesting_end=datetime.strptime(task['end'], '%Y-%m-%d'),
+        parameters=dict(task['params'], symbol=task['symbol']),
+        show_plot=False,
+        show_tearsheet=False,
+        save_tearsheet=False,
+    )
+    return json.loads(json.dumps(stats or {}, default=str))
+
+
+RUNNERS = {'simulate': run_simulation, 'lumibot': run_lumibot}
+
+
+def run_worker(host, port, cache_dir, runner='simulate', token=None, worker=None, connect_retries=10):
+    """
+    Pull and run shards until the coordinator reports the job is done.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    cache = BarCache(cache_dir)
+    run = RUNNERS[runner]
+    for attempt in range(connect_retries):
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError as e:
+            logger.warning("Coordinator %s:%s unreachable (%s); retrying", host, port, e)
+            time.sleep(min(2 ** attempt, 30))
+    else:
+        raise ConnectionError(f"Could not reach coordinator at {host}:{port}")
+
+    rfile, wfile = sock.makefile('rb'), sock.makefile('wb')
+    write_lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeat():
+        # Keeps the lease alive while a long shard runs
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                _send(wfile, write_lock, {'type': 'heartbeat'})
+            except OSError:
+                return
+
+    threading.Thread(target=heartbeat, name="sweep-heartbeat", daemon=True).start()
+    completed = 0
+    try:
+        _send(wfile, write_lock, {'type': 'hello', 'worker': worker, 'token': token})
+        while True:
+            _send(wfile, write_lock, {'type': 'next'})
+            line = rfile.readline()
+            if not line:
+                logger.warning("Coordinator closed the connection")
+                break
+            message = json.loads(line)
+            if message['type'] == 'done':
+                break
+            if message['type'] == 'wait':
+                time.sleep(message['seconds'])
+                continue
+            start = time.perf_counter()
+            try:
+                result = run(message['task'], cache)
+            except Exception as e:
+                logger.exception("Shard %s failed", message['shard'])
+                _send(wfile, write_lock, {'type': 'error', 'shard': message['shard'], 'error': repr(e)})
+                continue
+            _send(wfile, write_lock, {'type': 'result', 'shard': message['shard'], 'result': result,
+                                      'elapsed': time.perf_counter() - start})
+            completed += 1
+    finally:
+        stop.set()
+        sock.close()
+    logger.info("Worker %s finished %d shards", worker, completed)
+    return completed
+
+
+def _worker_process(host, port, cache_dir, runner, token):
+    logging.basicConfig(level=logging.INFO)
+    run_worker(host, port, cache_dir, runner, token)
+
+
+def start_workers(count, host, port, cache_dir, runner='simulate', token=None):
+    # Spawn, not fork: the coordinator's server threads and sockets must not be copied into workers
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_process, args=(host, port, cache_dir, runner, token), daemon=True)
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def summarize(results):
+    """
+    Average each parameter set's stats across its symbols and periods, best total return first.
+    """
+    by_params = collections.defaultdict(list)
+    for record in results.values():
+        by_params[json.dumps(record['task']['params'], sort_keys=True)].append(record['result'])
+    summary = []
+    for key, stats in by_params.items():
+        summary.append({
+            'params': json.loads(key),
+            'shards': len(stats),
+            'total_return': float(np.mean([s.get('total_return', 0.0) for s in stats])),
+            'win_rate': float(np.mean([s.get('win_rate', 0.0) for s in stats])),
+            'trades': int(sum(s.get('trades', 0) for s in stats)),
+        })
+    return sorted(summary, key=lambda row: -row['total_return'])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Distributed EnhancedMLTrader parameter sweeps.")
+    parser.add_argument("mode", choices=("coordinator", "worker", "local"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7700)
+    parser.add_argument("--token", default=os.getenv("SWEEP_TOKEN"), help="Shared secret (or SWEEP_TOKEN)")
+    parser.add_argument("--runner", choices=tuple(RUNNERS), default="simulate")
+    parser.add_argument("--symbols", default="SPY", help="Comma-separated symbols")
+    parser.add_argument("--periods", default="2018-01-01:2023-12-31", help="Comma-separated start:end ranges")
+    parser.add_argument("--grid", help="JSON parameter grid; defaults to robustness.DEFAULT_GRID")
+    parser.add_argument("--output", default="sweep.jsonl", help="Results, one JSON line per shard as it completes")
+    parser.add_argument("--cache", default="bar_cache", help="Shared bar cache directory")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Worker processes on this node")
+    parser.add_argument("--workers", type=int, default=4, help="Local worker processes (local mode)")
+    parser.add_argument("--lease-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        processes = start_workers(args.processes, args.host, args.port, args.cache, args.runner, args.token)
+        for process in processes:
+            process.join()
+        sys.exit(0)
+
+    grid = json.loads(args.grid) if args.grid else DEFAULT_GRID
+    periods = [tuple(period.split(":")) for period in args.periods.split(",")]
+    tasks = make_tasks(grid, args.symbols.split(","), periods)
+    with open(args.output, 'w') as output:
+        def write(record):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+
+        coordinator = Coordinator(tasks, host=args.host, port=args.port, lease_timeout=args.lease_timeout,
+                                  token=args.token, on_result=write).start()
+        if args.mode == "local":
+            start_workers(args.workers, *coordinator.address, args.cache, args.runner, args.token)
+        while True:
+            results, failed = coordinator.wait(timeout=10)
+            logger.info("Progress: %s", coordinator.status())
+            if len(results) + len(failed) == len(tasks):
+                break
+        coordinator.stop()
+    print(json.dumps({'status': coordinator.status(), 'summary': summarize(results)[:10],
+                      'failed': list(failed.values())}, indent=2))
@@ -1,21 +1,47 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import threading
 from typing import Tuple
 
-device = "cuda:0" if torch.cuda.is_available() else "cpu"
-
-tokenizer = AutoTokenizer.from_pretrained("ProsusAI/finbert")
-model = AutoModelForSequenceClassification.from_pretrained("ProsusAI/finbert").to(
-    device
-)
 labels = ["positive", "negative", "neutral"]
 
+# torch, transformers and the model weights take seconds to import and load, so
+# they are loaded on first use; importing this module stays cheap
+_model = {}
+_load_lock = threading.Lock()
+
+
+def load():
+    """
+    Import torch and transformers and load FinBERT, once per process.
+
+    Returns a dict with ``torch``, ``device``, ``tokenizer`` and ``model``.
+    """
+    if not _model:
+        with _load_lock:
+            if not _model:
+                import torch
+                from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+                device = "cuda:0" if torch.cuda.is_available() else "cpu"
+                tokenizer = AutoTokenizer.from_pretrained("ProsusAI/finbert")
+                model = AutoModelForSequenceClassification.from_pretrained("ProsusAI/finbert").to(device)
+                _model.update(torch=torch, device=device, tokenizer=tokenizer, model=model)
+    return _model
+
+
+def __getattr__(name):
+    # Keep finbert_utils.model / .tokenizer / .device working, loading on first access
+    if name in ("torch", "device", "tokenizer", "model"):
+        return load()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def estimate_sentiment(news):
     if news:
-        tokens = tokenizer(news, return_tensors="pt", padding=True).to(device)
+        finbert = load()
+        torch = finbert['torch']
+        tokens = finbert['tokenizer'](news, return_tensors="pt", padding=True).to(finbert['device'])
 
-        result = model(tokens["input_ids"], attention_mask=tokens["attention_mask"])[
+        result = finbert['model'](tokens["input_ids"], attention_mask=tokens["attention_mask"])[
             "logits"
         ]
         result = torch.nn.functional.softmax(torch.sum(result, 0), dim=-1)
@@ -26,9 +52,30 @@ def estimate_sentiment(news):
         return 0, labels[-1]
 
 
+def score_headlines(news, batch_size=32):
+    """
+    Score each headline separately.
+
+    Returns an array of shape (len(news), 3) with [positive, negative, neutral]
+    probabilities per headline, in the order of ``labels``.
+    """
+    finbert = load()
+    torch = finbert['torch']
+    scores = []
+    with torch.no_grad():
+        for start in range(0, len(news), batch_size):
+            tokens = finbert['tokenizer'](news[start:start + batch_size], return_tensors="pt", padding=True,
+                                          truncation=True).to(finbert['device'])
+            result = finbert['model'](tokens["input_ids"], attention_mask=tokens["attention_mask"])["logits"]
+            scores.append(torch.nn.functional.softmax(result, dim=-1).cpu())
+    if not scores:
+        return torch.empty((0, len(labels))).numpy()
+    return torch.cat(scores).numpy()
+
+
 if __name__ == "__main__":
     tensor, sentiment = estimate_sentiment(
         ["markets responded negatively to the news!", "traders were displeased!"]
     )
     print(tensor, sentiment)
-    print(torch.cuda.is_available())
+    print(load()['torch'].cuda.is_available())
@@ -3,6 +3,8 @@ from alpaca_trade_api.stream import Stream
 import os
 from dotenv import load_dotenv
 
+from common.quote_store import QuoteStore, alpaca_quote_handler, start_alpaca_quotes
+
 load_dotenv()
 
 # Fetch Alpaca API credentials
@@ -10,20 +12,30 @@ API_KEY = os.getenv("APCA_API_KEY_ID")
 API_SECRET = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = os.getenv("APCA_API_BASE_URL")
 
+# Latest bid/ask per symbol, readable from any thread (e.g. PaperTrader(quotes=quotes))
+quotes = QuoteStore()
+
 
 async def trade_callback(t):
     print("trade", t)
 
 
-async def quote_callback(q):
-    print("quote", q)
+quote_callback = alpaca_quote_handler(quotes)
+
+
+def start_quote_stream(symbols, data_feed="iex"):
+    """
+    Stream quotes for symbols into ``quotes`` on a background thread; returns the Stream.
+    """
+    return start_alpaca_quotes(quotes, symbols, data_feed)
 
 
-# Initiate Class Instance
-stream = Stream(data_feed="iex")  # <- replace to 'sip' if you have PRO subscription
+if __name__ == "__main__":
+    # Initiate Class Instance
+    stream = Stream(data_feed="iex")  # <- replace to 'sip' if you have PRO subscription
 
-# subscribing to event
-stream.subscribe_trades(trade_callback, "AAPL")
-stream.subscribe_quotes(quote_callback, "IBM")
+    # subscribing to event
+    stream.subscribe_trades(trade_callback, "AAPL")
+    stream.subscribe_quotes(quote_callback, "IBM")
 
-stream.run()
+    stream.run()
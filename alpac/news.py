@@ -5,13 +5,15 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from common.rate_limit import rate_limited
+
 # Fetch Alpaca API credentials
 API_KEY = os.getenv("APCA_API_KEY_ID")
 API_SECRET = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = os.getenv("APCA_API_BASE_URL")
 
 # no keys required for news data
-client = NewsClient(api_key=API_KEY, secret_key=API_SECRET )
+client = rate_limited(NewsClient(api_key=API_KEY, secret_key=API_SECRET ), 'alpaca', default_endpoint='data')
 
 request_params = NewsRequest(
                         symbols="TSLA",
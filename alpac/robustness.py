@@ -0,0 +1,238 @@
+"""
+Walk-forward and Monte Carlo robustness analysis for the EnhancedMLTrader rules.
+
+Price arrays are placed in shared memory once and every worker process maps
+them read-only, so windows and resamples fan out across cores without copying
+bars per task. Results are aggregated as tasks complete.
+
+    python robustness.py --symbol SPY --start 2015-01-01 --end 2023-12-31 --resamples 5000
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from common.indicators import atr, sma
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRID = {
+    'short_window': (20, 50),
+    'long_window': (100, 200),
+    'atr_period': (14,),
+    'atr_multiplier': (1.0, 1.5, 2.0),
+}
+
+
+# ----------------------------
+# Strategy rules
+# ----------------------------
+def simulate(close, high, low, short_window, long_window, atr_period, atr_multiplier,
+             risk_per_trade=0.01, initial_cash=100000.0, start=0):
+    """
+    Replay the EnhancedMLTrader rules over daily bars.
+
+    Enters when the short SMA is above the long SMA with a bracket of
+    take profit at +3 ATR and stop loss at -atr_multiplier ATR, sized as in
+    EnhancedMLTrader.position_sizing. Exits on the bracket (stop first if both
+    are hit intrabar) or when the short SMA drops below the long SMA. Only
+    entries at or after ``start`` are taken; earlier bars warm up indicators.
+
+    Returns an array of per-trade P&L.
+    """
+    short = sma(close, short_window).tolist()
+    long_ = sma(close, long_window).tolist()
+    atr_values = atr(high, low, close, atr_period).tolist()
+    close, high, low = close.tolist(), high.tolist(), low.tolist()
+    cash = initial_cash
+    qty = 0
+    entry = take_profit = stop_loss = 0.0
+    pnls = []
+    first = max(start, long_window - 1, atr_period)
+    for i in range(first, len(close)):
+        if qty:
+            if low[i] <= stop_loss:
+                exit_price = stop_loss
+            elif high[i] >= take_profit:
+                exit_price = take_profit
+            elif short[i] < long_[i]:
+                exit_price = close[i]
+            else:
+                continue
+            cash += qty * exit_price
+            pnls.append(qty * (exit_price - entry))
+            qty = 0
+        elif short[i] > long_[i]:
+            stop_distance = atr_values[i] * atr_multiplier
+            if not stop_distance > 0:
+                continue
+            quantity = min(int(cash * risk_per_trade / stop_distance / close[i]), int(cash / close[i]))
+            if quantity > 0:
+                qty = quantity
+                entry = close[i]
+                cash -= qty * entry
+                take_profit = entry + atr_values[i] * 3
+                stop_loss = entry - stop_distance
+    if qty:
+        pnls.append(qty * (close[-1] - entry))
+    return np.array(pnls)
+
+
+def trade_stats(pnls, initial_cash=100000.0):
+    if len(pnls) == 0:
+        return {'trades': 0, 'total_return': 0.0, 'win_rate': 0.0, 'profit_factor': 0.0}
+    losses = -pnls[pnls < 0].sum()
+    return {
+        'trades': int(len(pnls)),
+        'total_return': float(pnls.sum() / initial_cash),
+        'win_rate': float((pnls > 0).mean()),
+        'profit_factor': float(pnls[pnls > 0].sum() / losses) if losses else float('inf'),
+    }
+
+
+def param_grid(grid):
+    keys = list(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        if params['short_window'] < params['long_window']:
+            yield params
+
+
+# ----------------------------
+# Worker side
+# ----------------------------
+_prices = {}
+
+
+def _attach(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    _prices['shm'] = shm  # Keep the mapping alive for the worker's lifetime
+    _prices['bars'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def _walk_forward_window(train_start, test_start, test_end, grid, objective):
+    close, high, low = _prices['bars']
+    best, best_score = None, -np.inf
+    for params in param_grid(grid):
+        pnls = simulate(close[train_start:test_start], high[train_start:test_start], low[train_start:test_start],
+                        **params)
+        score = trade_stats(pnls)[objective]
+        if score > best_score:
+            best, best_score = params, score
+    # Test on unseen bars, using the bars before test_start only to warm up indicators
+    warmup = max(best['long_window'], best['atr_period'] + 1)
+    offset = max(test_start - warmup, 0)
+    pnls = simulate(close[offset:test_end], high[offset:test_end], low[offset:test_end],
+                    start=test_start - offset, **best)
+    return {
+        'train': [train_start, test_start],
+        'test': [test_start, test_end],
+        'params': best,
+        'in_sample': best_score,
+        'out_of_sample': trade_stats(pnls),
+        'pnls': pnls.tolist(),
+    }
+
+
+def _monte_carlo(pnls, count, seed, initial_cash):
+    rng = np.random.default_rng(seed)
+    samples = rng.choice(pnls, size=(count, len(pnls)), replace=True)
+    equity = initial_cash + np.cumsum(samples, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, initial_cash), axis=1)
+    return equity[:, -1] / initial_cash - 1, ((peak - equity) / peak).max(axis=1)
+
+
+# ----------------------------
+# Coordinator
+# ----------------------------
+def run(close, high, low, train_bars=756, test_bars=126, grid=None, objective='total_return',
+        resamples=5000, chunk=500, workers=None, initial_cash=100000.0, seed=0):
+    """
+    Run walk-forward windows, then bootstrap the out-of-sample trade sequence.
+
+    Parameters:
+    - close, high, low (array): Daily bars.
+    - train_bars, test_bars (int): Optimize/test window lengths; windows roll by test_bars.
+    - grid (dict): Parameter name -> candidate values.
+    - objective (str): trade_stats key maximized in-sample.
+    - resamples (int): Monte Carlo resamples of the trade sequence.
+    - chunk (int): Resamples per task.
+    """
+    grid = grid or DEFAULT_GRID
+    bars = np.ascontiguousarray(np.vstack([close, high, low]), dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=bars.nbytes)
+    try:
+        np.ndarray(bars.shape, dtype=np.float64, buffer=shm.buf)[:] = bars
+        with ProcessPoolExecutor(workers, initializer=_attach, initargs=(shm.name, bars.shape)) as pool:
+            futures = [pool.submit(_walk_forward_window, start, start + train_bars,
+                                   min(start + train_bars + test_bars, bars.shape[1]), grid, objective)
+                       for start in range(0, bars.shape[1] - train_bars - 1, test_bars)]
+            windows = []
+            for future in as_completed(futures):
+                window = future.result()
+                windows.append(window)
+                logger.info("Window %s: %s -> %s", window['test'], window['params'], window['out_of_sample'])
+            windows.sort(key=lambda w: w['test'][0])
+            pnls = np.array([pnl for window in windows for pnl in window.pop('pnls')])
+
+            final_returns, drawdowns = [], []
+            if len(pnls):
+                futures = [pool.submit(_monte_carlo, pnls, min(chunk, resamples - i), seed + i, initial_cash)
+                           for i in range(0, resamples, chunk)]
+                for future in as_completed(futures):
+                    returns, dd = future.result()
+                    final_returns.append(returns)
+                    drawdowns.append(dd)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    quantiles = (0.05, 0.25, 0.5, 0.75, 0.95)
+    monte_carlo = {}
+    if final_returns:
+        final_returns = np.concatenate(final_returns)
+        drawdowns = np.concatenate(drawdowns)
+        monte_carlo = {
+            'resamples': int(len(final_returns)),
+            'final_return': {str(q): float(np.quantile(final_returns, q)) for q in quantiles},
+            'max_drawdown': {str(q): float(np.quantile(drawdowns, q)) for q in quantiles},
+            'probability_of_loss': float((final_returns < 0).mean()),
+        }
+    return {
+        'walk_forward': windows,
+        'out_of_sample': trade_stats(pnls, initial_cash),
+        'monte_carlo': monte_carlo,
+    }
+
+
+if __name__ == "__main__":
+    import yfinance as yf
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Walk-forward and Monte Carlo robustness analysis.")
+    parser.add_argument("--symbol", default="SPY")
+    parser.add_argument("--start", default="2015-01-01")
+    parser.add_argument("--end", default="2023-12-31")
+    parser.add_argument("--train-bars", type=int, default=756, help="~3 years of daily bars")
+    parser.add_argument("--test-bars", type=int, default=126, help="~6 months of daily bars")
+    parser.add_argument("--resamples", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="Write the report JSON here instead of stdout")
+    args = parser.parse_args()
+
+    data = yf.download(args.symbol, start=args.start, end=args.end, interval="1d", progress=False)
+    report = run(data['Close'].to_numpy(), data['High'].to_numpy(), data['Low'].to_numpy(),
+                 train_bars=args.train_bars, test_bars=args.test_bars, resamples=args.resamples,
+                 workers=args.workers)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
@@ -0,0 +1,199 @@
+"""
+Precomputed historical news sentiment for backtests.
+
+The build job fetches Alpaca news for a universe, scores every headline with
+FinBERT in a pool of worker processes (one CPU model copy per worker, with a
+capped torch thread count), and writes per-symbol hourly and daily aggregates:
+
+    python sentiment_store.py --symbols SPY,AAPL,TSLA --start 2020-01-01 --end 2023-12-31 \
+        --workers 4 --threads 2 --out sentiment_store
+
+Strategies then read it with an O(log n) as-of lookup:
+
+    store = SentimentStore("sentiment_store")
+    score, count = store.asof("AAPL", self.get_datetime(), freq="daily")
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from common.rate_limit import rate_limited
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {
+    'hourly': pd.Timedelta(hours=1).value,
+    'daily': pd.Timedelta(days=1).value,
+}
+
+
+def aggregate(timestamps_ns, scores, freq_ns):
+    """
+    Bucket scores by time and return (bucket_end_ns, mean_score, count) arrays.
+
+    Buckets are keyed by their end, so an as-of lookup at time t only sees
+    buckets that had fully closed by t and backtests cannot peek ahead.
+    """
+    if len(timestamps_ns) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+    bucket_end = (timestamps_ns // freq_ns + 1) * freq_ns
+    ends, inverse = np.unique(bucket_end, return_inverse=True)
+    counts = np.bincount(inverse)
+    means = np.bincount(inverse, weights=scores) / counts
+    return ends, means, counts
+
+
+# ----------------------------
+# Build job (worker side)
+# ----------------------------
+_worker = {}
+
+
+def _init_worker(threads, api_key, secret_key):
+    # Keep every worker on its own CPU model copy, sharing the cores evenly
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    import torch
+    torch.set_num_threads(threads)
+    import finbert_utils
+    from alpaca.data.historical.news import NewsClient
+
+    finbert_utils.load()  # Load the model now rather than inside the first job
+    _worker['finbert'] = finbert_utils
+    _worker['client'] = rate_limited(NewsClient(api_key=api_key, secret_key=secret_key), 'alpaca',
+                                     default_endpoint='data')
+
+
+def _fetch_headlines(symbol, start, end):
+    from alpaca.data.requests import NewsRequest
+
+    news_set = _worker['client'].get_news(NewsRequest(symbols=symbol, start=start, end=end))
+    items = getattr(news_set, 'news', None)
+    if items is None:
+        items = news_set.data['news']
+    items = [item for item in items if item.headline]
+    timestamps = pd.to_datetime([item.created_at for item in items], utc=True)
+    return [item.headline for item in items], timestamps.asi8
+
+
+def _build_symbol(args):
+    symbol, start, end, out_dir = args
+    headlines, timestamps_ns = _fetch_headlines(symbol, start, end)
+    probabilities = _worker['finbert'].score_headlines(headlines)
+    # Net sentiment per headline: P(positive) - P(negative)
+    scores = probabilities[:, 0] - probabilities[:, 1] if len(headlines) else np.empty(0)
+    arrays = {}
+    for freq, freq_ns in FREQUENCIES.items():
+        ends, means, counts = aggregate(timestamps_ns, scores, freq_ns)
+        arrays[f'{freq}_ts'] = ends
+        arrays[f'{freq}_score'] = means
+        arrays[f'{freq}_count'] = counts
+    np.savez(os.path.join(out_dir, f'{symbol}.npz'), **arrays)
+    return symbol, len(headlines)
+
+
+# ----------------------------
+# Build job (coordinator)
+# ----------------------------
+def build_store(symbols, start, end, out_dir, workers=None, threads=1, api_key=None, secret_key=None):
+    """
+    Score historical news for every symbol and write one .npz per symbol to out_dir.
+
+    Parameters:
+    - symbols (list): Universe to score.
+    - start, end (datetime): News window.
+    - out_dir (str): Store directory.
+    - workers (int): Worker processes; defaults to cpu_count // threads.
+    - threads (int): Torch threads per worker.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or max(multiprocessing.cpu_count() // threads, 1)
+    # Spawn, not fork: torch and the news client's connection pool are not fork-safe
+    context = multiprocessing.get_context("spawn")
+    jobs = [(symbol, start, end, out_dir) for symbol in symbols]
+    with context.Pool(workers, initializer=_init_worker, initargs=(threads, api_key, secret_key)) as pool:
+        for symbol, headline_count in pool.imap_unordered(_build_symbol, jobs):
+            logger.info("Scored %d headlines for %s", headline_count, symbol)
+
+
+# ----------------------------
+# Reader
+# ----------------------------
+class SentimentStore:
+    """
+    Read-only view of a store written by build_store. Symbols load on first use.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.symbols = {}
+
+    def _load(self, symbol):
+        arrays = self.symbols.get(symbol)
+        if arrays is None:
+            path = os.path.join(self.store_dir, f'{symbol}.npz')
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    arrays = {key: data[key] for key in data.files}
+            else:
+                logger.warning("No sentiment data for %s in %s", symbol, self.store_dir)
+                arrays = {}
+            self.symbols[symbol] = arrays
+        return arrays
+
+    def asof(self, symbol, when, freq='daily'):
+        """
+        Return (mean_score, headline_count) of the latest bucket that closed at or before ``when``.
+
+        Returns (0.0, 0) when there is no earlier bucket.
+        """
+        arrays = self._load(symbol)
+        timestamps = arrays.get(f'{freq}_ts')
+        if timestamps is None or len(timestamps) == 0:
+            return 0.0, 0
+        index = np.searchsorted(timestamps, pd.Timestamp(when).value, side='right') - 1
+        if index < 0:
+            return 0.0, 0
+        return float(arrays[f'{freq}_score'][index]), int(arrays[f'{freq}_count'][index])
+
+    def series(self, symbol, freq='daily'):
+        """
+        Return the aggregates for symbol as a DataFrame indexed by bucket end (UTC).
+        """
+        arrays = self._load(symbol)
+        return pd.DataFrame({
+            'score': arrays.get(f'{freq}_score', np.empty(0)),
+            'count': arrays.get(f'{freq}_count', np.empty(0, dtype=np.int64)),
+        }, index=pd.to_datetime(arrays.get(f'{freq}_ts', np.empty(0, dtype=np.int64)), utc=True))
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build the historical sentiment store.")
+    parser.add_argument("--symbols", required=True, help="Comma-separated symbols")
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--out", default="sentiment_store")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads per worker")
+    args = parser.parse_args()
+
+    build_store(
+        symbols=args.symbols.split(","),
+        start=datetime.strptime(args.start, '%Y-%m-%d'),
+        end=datetime.strptime(args.end, '%Y-%m-%d'),
+        out_dir=args.out,
+        workers=args.workers,
+        threads=args.threads,
+        api_key=os.getenv("APCA_API_KEY_ID"),
+        secret_key=os.getenv("APCA_API_SECRET_KEY"),
+    )
@@ -1,17 +1,18 @@
 import os
+import time
 from datetime import datetime, timedelta
 import logging
-import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from alpaca_trade_api import REST, TimeFrame
-from lumibot.brokers import Alpaca
-from lumibot.backtesting import YahooDataBacktesting
-from lumibot.strategies.strategy import Strategy
-from lumibot.traders import Trader
+from lumibot.strategies.strategy import Strategy  # Needed for the class definition; brokers and backtesting load in __main__
 import ssl
 import certifi
 
+from common.rate_limit import rate_limited, ALPACA_ENDPOINTS, ALPACA_ORDER_METHODS
+from common.metrics import AckTimer, timer, start_metrics_server
+from common.structured_logging import configure_logging
+from common.telemetry import monitor_from_env
+
 # Set SSL_CERT_FILE to certifi's certificate bundle
 os.environ['SSL_CERT_FILE'] = certifi.where()
 
@@ -36,12 +37,13 @@ ALPACA_CREDS = {
     "PAPER": True  # Set to False for live trading
 }
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s %(levelname)s %(name)s: %(message)s',
+# Configure logging: records are formatted and written as JSON lines on a background thread
+configure_logging(
     level=logging.DEBUG,  # Set to DEBUG for detailed logs; change to INFO in production
+    debug_sample_every=10,  # Keep one in ten DEBUG records per call site
 )
 logger = logging.getLogger(__name__)
+broker_ack = AckTimer("broker_ack")  # Submit to Alpaca's new-order event
 
 class EnhancedMLTrader(Strategy):
     def initialize(self, symbol: str = "SPY", risk_per_trade: float = 0.01, 
@@ -64,9 +66,12 @@ class EnhancedMLTrader(Strategy):
         self.long_window = long_window
         self.atr_period = atr_period
         self.atr_multiplier = atr_multiplier
-        self.api = REST(key_id=API_KEY, secret_key=API_SECRET, base_url=BASE_URL)
-        logger.info(f"Initialized strategy for {self.symbol} with short_window={self.short_window}, "
-                    f"long_window={self.long_window}, atr_period={self.atr_period}, atr_multiplier={self.atr_multiplier}")
+        from alpaca_trade_api import REST
+        self.api = rate_limited(REST(key_id=API_KEY, secret_key=API_SECRET, base_url=BASE_URL), 'alpaca',
+                                endpoints=ALPACA_ENDPOINTS, order_methods=ALPACA_ORDER_METHODS,
+                                default_endpoint='trading')
+        logger.info("Initialized strategy for %s with short_window=%s, long_window=%s, atr_period=%s, atr_multiplier=%s",
+                    self.symbol, self.short_window, self.long_window, self.atr_period, self.atr_multiplier)
     
     def calculate_sma(self, window: int):
         """
@@ -78,10 +83,13 @@ class EnhancedMLTrader(Strategy):
         Returns:
         - float: The latest SMA value.
         """
-        logger.debug(f"Fetching historical prices for SMA calculation with window: {window}")
-        bars = self.api.get_bars(self.symbol, TimeFrame.Day, limit=window + 1).df
-        sma = bars['close'].rolling(window=window).mean().iloc[-1]
-        logger.debug(f"Calculated SMA({window}): {sma}")
+        from alpaca_trade_api import TimeFrame
+        logger.debug("Fetching historical prices for SMA calculation with window: %s", window)
+        with timer("data_fetch"):
+            bars = self.api.get_bars(self.symbol, TimeFrame.Day, limit=window + 1).df
+        with timer("indicator_compute"):
+            sma = bars['close'].rolling(window=window).mean().iloc[-1]
+        logger.debug("Calculated SMA(%s): %s", window, sma)
         return sma
     
     def calculate_atr(self):
@@ -91,19 +99,23 @@ class EnhancedMLTrader(Strategy):
         Returns:
         - float: The latest ATR value.
         """
-        logger.debug(f"Fetching historical prices for ATR calculation with period: {self.atr_period}")
-        bars = self.api.get_bars(self.symbol, TimeFrame.Day, limit=self.atr_period + 1).df
-        high = bars['high']
-        low = bars['low']
-        close = bars['close']
-        tr1 = high - low
-        tr2 = abs(high - close.shift())
-        tr3 = abs(low - close.shift())
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        atr = tr.rolling(self.atr_period).mean().iloc[-1]
-        logger.debug(f"Calculated ATR: {atr}")
+        from alpaca_trade_api import TimeFrame
+        logger.debug("Fetching historical prices for ATR calculation with period: %s", self.atr_period)
+        with timer("data_fetch"):
+            bars = self.api.get_bars(self.symbol, TimeFrame.Day, limit=self.atr_period + 1).df
+        with timer("indicator_compute"):
+            high = bars['high']
+            low = bars['low']
+            close = bars['close']
+            tr1 = high - low
+            tr2 = abs(high - close.shift())
+            tr3 = abs(low - close.shift())
+            tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
+            atr = tr.rolling(self.atr_period).mean().iloc[-1]
+        logger.debug("Calculated ATR: %s", atr)
         return atr
     
+    @timer("sizing")
     def position_sizing(self, stop_loss_distance):
         """
         Calculate the position size based on risk per trade and stop loss distance.
@@ -119,9 +131,10 @@ class EnhancedMLTrader(Strategy):
         position_size = risk_amount / stop_loss_distance
         last_price = self.get_last_price(self.symbol)
         quantity = int(position_size / last_price)
-        logger.debug(f"Position sizing calculated: {quantity} shares")
+        logger.debug("Position sizing calculated: %s shares", quantity)
         return quantity
     
+    @timer("iteration")
     def on_trading_iteration(self):
         """
         Main trading logic executed on each trading iteration.
@@ -135,8 +148,8 @@ class EnhancedMLTrader(Strategy):
             quantity = self.position_sizing(stop_loss_distance)
             current_positions = self.get_positions()
     
-            logger.debug(f"Short SMA: {short_sma}, Long SMA: {long_sma}, Last Price: {last_price}, "
-                         f"ATR: {atr}, Stop Loss Distance: {stop_loss_distance}, Quantity: {quantity}")
+            logger.debug("Short SMA: %s, Long SMA: %s, Last Price: %s, ATR: %s, Stop Loss Distance: %s, Quantity: %s",
+                         short_sma, long_sma, last_price, atr, stop_loss_distance, quantity)
     
             # Determine if a Golden Cross (buy signal) or Death Cross (sell signal) has occurred
             if short_sma > long_sma and self.symbol not in current_positions:
@@ -156,8 +169,11 @@ class EnhancedMLTrader(Strategy):
                         "stop_price": stop_loss_price
                     },
                 )
-                self.submit_order(order)
-                logger.info(f"Placed BUY order for {quantity} shares at {last_price}")
+                submitted_at = time.perf_counter_ns()
+                with timer("order_submit"):
+                    order = self.submit_order(order)
+                broker_ack.submitted(order.identifier, submitted_at)
+                logger.info("Placed BUY order for %s shares at %s", quantity, last_price)
             elif short_sma < long_sma and self.symbol in current_positions:
                 # Death Cross - Bearish Signal
                 position = self.get_position(self.symbol)
@@ -177,19 +193,35 @@ class EnhancedMLTrader(Strategy):
                         "stop_price": stop_loss_price
                     },
                 )
-                self.submit_order(order)
-                logger.info(f"Placed SELL order for {quantity} shares at {last_price}")
+                submitted_at = time.perf_counter_ns()
+                with timer("order_submit"):
+                    order = self.submit_order(order)
+                broker_ack.submitted(order.identifier, submitted_at)
+                logger.info("Placed SELL order for %s shares at %s", quantity, last_price)
             else:
                 logger.info("No trading signal detected.")
     
         except Exception as e:
-            logger.error(f"Error during trading iteration: {e}")
+            logger.error("Error during trading iteration: %s", e)
+
+    def on_new_order(self, order):
+        # Lumibot lifecycle hook: the broker has acknowledged the order
+        broker_ack.acked(order.identifier)
 
 if __name__ == "__main__":
+    from lumibot.brokers import Alpaca
+    from lumibot.backtesting import YahooDataBacktesting
+    from lumibot.traders import Trader
+
     # Define backtesting period
     start_date = datetime(2020, 1, 1)
     end_date = datetime(2023, 12, 31)
 
+    # Stage latencies at http://127.0.0.1:$METRICS_PORT/metrics (Prometheus) and /metrics.json
+    start_metrics_server()
+    # Opt-in memory sampling: set TELEMETRY_INTERVAL; `kill -USR1 <pid>` logs a diff report
+    monitor_from_env()
+
     # Initialize Alpaca broker with corrected credentials
     broker = Alpaca(ALPACA_CREDS)
 
@@ -0,0 +1,109 @@
+# fixtures.py
+
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+HEADLINES = [
+    "markets responded negatively to the news!",
+    "traders were displeased!",
+    "shares rallied after the company beat earnings estimates",
+    "regulators opened an investigation into the bank's lending practices",
+    "the central bank left interest rates unchanged",
+    "analysts upgraded the stock to buy on strong guidance",
+    "supply chain disruptions weighed on quarterly margins",
+    "the merger is expected to close by the end of the year",
+]
+
+
+def synthetic_bars(n=500, seed=7, start_price=100.0, yahoo_columns=True, freq=None):
+    """
+    Deterministic OHLCV bars following a geometric random walk.
+
+    Parameters:
+    - n (int): Number of bars.
+    - seed (int): RNG seed, so every run benchmarks the same data.
+    - start_price (float): First open.
+    - yahoo_columns (bool): Capitalized yfinance column names; lowercase Alpaca names otherwise.
+    - freq (str): Bar spacing as a pandas frequency, e.g. "1min"; business days if None.
+    """
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    wick = np.abs(rng.normal(0, 0.005, n)) * close
+    bars = pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + wick,
+        'low': np.minimum(open_, close) - wick,
+        'close': close,
+        'volume': rng.integers(100_000, 1_000_000, n),
+    }, index=pd.bdate_range(end='2024-10-14', periods=n) if freq is None
+        else pd.date_range(end='2024-10-14 20:00', periods=n, freq=freq, tz='UTC'))
+    if yahoo_columns:
+        bars.columns = [column.capitalize() for column in bars.columns]
+    return bars
+
+
+class StubTicker:
+    """
+    Stands in for a yfinance Ticker; history() returns the recorded bars.
+    """
+
+    def __init__(self, bars):
+        self.bars = bars
+
+    def history(self, period=None, interval=None):
+        return self.bars
+
+
+class StubAlpacaREST:
+    """
+    Stands in for alpaca_trade_api REST; get_bars() returns the recorded bars.
+    """
+
+    def __init__(self, bars):
+        self.bars = bars
+
+    def get_bars(self, symbol, timeframe, limit=None, **kwargs):
+        return SimpleNamespace(df=self.bars.tail(limit) if limit else self.bars)
+
+
+class StubFyersModel:
+    """
+    In-memory FyersModel: acknowledges orders immediately with sample success responses.
+    """
+
+    def __init__(self):
+        self.ids = itertools.count(808058117761)
+        self.orders = {}
+
+    def place_order(self, data):
+        order_id = str(next(self.ids))
+        self.orders[order_id] = dict(data, id=order_id, status=6)
+        return {"s": "ok", "code": 1101, "message": "Order submitted successfully.", "id": order_id}
+
+    def modify_order(self, data):
+        self.orders[data['id']].update(data)
+        return {"s": "ok", "code": 1102, "message": "Successfully modified order", "id": data['id']}
+
+    def cancel_order(self, data):
+        self.orders[data['id']]['status'] = 1
+        return {"s": "ok", "code": 1103, "message": "Successfully cancelled order", "id": data['id']}
+
+    def exit_positions(self, data):
+        return {"s": "ok", "code": 200, "message": "The position is closed."}
+
+    def positions(self):
+        return {"s": "ok", "netPositions": [], "overall": {}}
+
+    def orderbook(self):
+        return {"s": "ok", "orderBook": list(self.orders.values())}
+
+    def tradebook(self):
+        return {"s": "ok", "tradeBook": []}
+
+    def quotes(self, data):
+        return {"s": "ok", "d": [{"n": symbol, "s": "ok", "v": {"lp": 100.0}}
+                                 for symbol in data['symbols'].split(',')]}
@@ -0,0 +1,117 @@
+"""
+Import-time profile of the entry-point modules.
+
+Imports each module in a fresh interpreter under ``python -X importtime`` and
+reports where the time goes: self time summed per top-level package, plus
+the slowest individual imports by cumulative time.
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py tradingbot --top 25 --output importtime.json
+
+A module whose dependencies are missing is reported with the import error
+and whatever was imported before it failed.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# name -> (directory the module is run from, module)
+ENTRY_POINTS = {
+    'tradingbot': ('alpac', 'tradingbot'),
+    'finbert_utils': ('alpac', 'finbert_utils'),
+    'sentiment_store': ('alpac', 'sentiment_store'),
+    'robustness': ('alpac', 'robustness'),
+    'paper_trading': ('yahoofinance', 'paper_trading'),
+    'paper_journal': ('yahoofinance', 'paper_journal'),
+    'fyersTradeAutomate': ('fyers', 'fyersTradeAutomate'),
+    'gateway': ('', 'common.gateway'),
+}
+
+
+def parse(stderr):
+    """
+    Parse ``-X importtime`` output into [(module, self_us, cumulative_us)].
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def profile(directory, module):
+    code = f"import sys; sys.path.insert(0, {os.path.join(ROOT, directory)!r}); import {module}"
+    env = dict(os.environ)
+    # tradingbot refuses to import without Alpaca credentials; nothing here uses them
+    for var in ("APCA_API_KEY_ID", "APCA_API_SECRET_KEY", "APCA_API_BASE_URL"):
+        env.setdefault(var, "importtime")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    error = None
+    if proc.returncode:
+        error = next((line for line in reversed(proc.stderr.splitlines()) if line.strip()), "failed")
+    return wall, parse(proc.stderr), error
+
+
+def report(name, wall, imports, error, top):
+    packages = {}
+    for module, self_us, _ in imports:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    total = sum(packages.values())
+    return {
+        'module': name,
+        'wall_seconds': wall,
+        'import_seconds': total / 1e6,
+        'error': error,
+        'packages': {package: self_us / 1e6
+                     for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        'slowest': [{'module': module, 'cumulative_seconds': cumulative_us / 1e6, 'self_seconds': self_us / 1e6}
+                    for module, self_us, cumulative_us in sorted(imports, key=lambda item: -item[2])[:top]],
+    }
+
+
+def print_report(result):
+    print(f"\n== {result['module']}: {result['import_seconds'] * 1e3:.1f}ms importing "
+          f"({result['wall_seconds'] * 1e3:.1f}ms wall)")
+    if result['error']:
+        print(f"   import failed: {result['error']}")
+    print("   by package (self time):")
+    for package, seconds in result['packages'].items():
+        print(f"   {seconds * 1e3:9.1f}ms  {package}")
+    print("   slowest imports (cumulative):")
+    for item in result['slowest']:
+        print(f"   {item['cumulative_seconds'] * 1e3:9.1f}ms  {item['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help=f"Entry points to profile (default: all of {', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--top", type=int, default=15, help="Rows per section")
+    parser.add_argument("--output", help="Also write the report JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.modules or ENTRY_POINTS:
+        if name not in ENTRY_POINTS:
+            parser.error(f"unknown entry point {name!r}")
+        result = report(name, *profile(*ENTRY_POINTS[name]), top=args.top)
+        print_report(result)
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
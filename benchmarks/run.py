@@ -0,0 +1,419 @@
+"""
+Offline benchmark suite.
+
+Runs against synthetic fixtures and stub clients only; nothing touches the
+network. Results are written as JSON and can be compared against a saved
+baseline:
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --baseline bench.json --tolerance 0.25
+
+Exits with status 1 when any benchmark is slower than the baseline by more
+than the tolerance. Benchmarks whose dependencies are missing are skipped.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for path in (ROOT, os.path.join(ROOT, 'alpac'), os.path.join(ROOT, 'fyers'), os.path.join(ROOT, 'yahoofinance')):
+    sys.path.append(os.path.abspath(path))
+
+from common.structured_logging import configure_logging
+from fixtures import HEADLINES, StubAlpacaREST, StubFyersModel, StubTicker, synthetic_bars
+
+BENCHMARKS = {}
+
+
+class Skip(Exception):
+    pass
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat=20, number=10, warmup=2):
+    """
+    Time func and return per-call statistics in seconds.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter_ns() - start) / number / 1e9)
+    samples.sort()
+    return {
+        'median': statistics.median(samples),
+        'p90': samples[int(0.9 * (len(samples) - 1))],
+        'min': samples[0],
+        'max': samples[-1],
+        'calls': repeat * number,
+    }
+
+
+# ----------------------------
+# Indicators
+# ----------------------------
+@benchmark("indicators.yahoo")
+def bench_yahoo_indicators(scale):
+    try:
+        import paper_trading
+    except ImportError as e:
+        raise Skip(e)
+
+    ticker = StubTicker(synthetic_bars(260))
+    strategy = paper_trading.EnhancedMLTrader(trader=None, symbol="SPY", atr_period=14)
+    # Patched for this benchmark only, so later ones see the real get_ticker
+    with mock.patch.object(paper_trading, 'get_ticker', lambda symbol: ticker):
+        return {
+            'calculate_sma': measure(lambda: strategy.calculate_sma(200), repeat=scale),
+            'calculate_atr': measure(lambda: strategy.calculate_atr(), repeat=scale),
+        }
+
+
+@benchmark("indicators.resampler")
+def bench_resampler(scale):
+    from common.resampler import MultiTimeframeBars
+
+    bars = synthetic_bars(390 * 20 * scale, freq="1min")  # ~20 sessions of 1-minute bars per scale step
+    timeframes = ('5m', '15m', '1h', '1d')
+
+    def build():
+        store = MultiTimeframeBars()
+        store.extend_frame("SPY", bars)
+        for timeframe in timeframes:
+            store.bars("SPY", timeframe)
+
+    repeat, number = 5 * scale, 100
+    updates = repeat * number + 2  # measure() also runs two warmup calls
+    store = MultiTimeframeBars()
+    store.extend_frame("SPY", bars.iloc[:-updates])
+    for timeframe in timeframes:
+        store.bars("SPY", timeframe)
+    ts = bars.index.asi8[-updates:]
+    columns = [bars[field].to_numpy()[-updates:] for field in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    next_bar = iter(range(updates))
+
+    def update():
+        # Append the next new 1-minute bar, then read every timeframe
+        i = next(next_bar)
+        store.append("SPY", ts[i], *(column[i] for column in columns))
+        for timeframe in timeframes:
+            store.bars("SPY", timeframe)
+
+    return {
+        'build': measure(build, repeat=scale),
+        'incremental_update': measure(update, repeat=repeat, number=number),
+        'pandas_resample': measure(lambda: [bars.resample(rule).agg({'Open': 'first', 'High': 'max', 'Low': 'min',
+                                                                      'Close': 'last', 'Volume': 'sum'})
+                                            for rule in ('5min', '15min', '1h', '1D')], repeat=scale),
+    }
+
+
+@benchmark("indicators.alpaca")
+def bench_alpaca_indicators(scale):
+    for var in ("APCA_API_KEY_ID", "APCA_API_SECRET_KEY", "APCA_API_BASE_URL"):
+        os.environ.setdefault(var, "benchmark")
+    try:
+        import tradingbot
+    except ImportError as e:
+        raise Skip(e)
+
+    strategy = SimpleNamespace(symbol="SPY", atr_period=14,
+                               api=StubAlpacaREST(synthetic_bars(260, yahoo_columns=False)))
+    return {
+        'calculate_sma': measure(lambda: tradingbot.EnhancedMLTrader.calculate_sma(strategy, 200), repeat=scale),
+        'calculate_atr': measure(lambda: tradingbot.EnhancedMLTrader.calculate_atr(strategy), repeat=scale),
+    }
+
+
+@benchmark("indicators.scan_universe")
+def bench_scan_universe(scale):
+    import numpy as np
+    from common.scanner import scan
+
+    results = {}
+    for count in (100, 2000):
+        symbols = [f"SYM{i}" for i in range(count)]
+        frames = [synthetic_bars(260, seed=i) for i in range(min(count, 50))]
+        # Reuse 50 distinct random walks across the universe; the scan cost does not depend on the values
+        close, high, low = (np.column_stack([frames[i % len(frames)][field] for i in range(count)])
+                            for field in ('Close', 'High', 'Low'))
+        positions = {symbol: 10 for symbol in symbols[::10]}
+        results[f'symbols_{count}'] = measure(lambda: scan(close, high, low, symbols, 100000.0, positions),
+                                              repeat=scale)
+    return results
+
+
+# ----------------------------
+# Charting
+# ----------------------------
+@benchmark("charting.downsample")
+def bench_downsample(scale):
+    import numpy as np
+    from common.charting import DownsampledSeries, lttb_indices, minmax_indices
+
+    close = synthetic_bars(25_000 * scale, freq="1min")['Close']
+    x, y = close.index.tz_localize(None).to_numpy(), close.to_numpy()
+
+    def stream():
+        series = DownsampledSeries()
+        series.extend(x, y)
+        series.points()
+
+    series = DownsampledSeries()
+    series.extend(x, y)
+    step = np.timedelta64(1, 'm')
+
+    def append():
+        series.append(series.last[0] + step, y[-1])
+        series.points()
+
+    return {
+        'minmax': measure(lambda: minmax_indices(y), repeat=scale),
+        'lttb': measure(lambda: lttb_indices(x, y), repeat=max(scale // 4, 3), number=1),
+        'stream_build': measure(stream, repeat=scale),
+        'stream_append': measure(append, repeat=scale, number=100),
+    }
+
+
+# ----------------------------
+# Paper execution
+# ----------------------------
+@benchmark("paper.place_order")
+def bench_paper_place_order(scale):
+    try:
+        from paper_trading import PaperTrader
+    except ImportError as e:
+        raise Skip(e)
+
+    results = {}
+    orders_per_thread = 50 * scale
+    for threads in (1, 4, 16):
+        def run():
+            trader = PaperTrader(initial_cash=1e12)
+            workers = [threading.Thread(target=lambda: [trader.place_order("SPY", 1, "buy", 100.0)
+                                                        for _ in range(orders_per_thread)])
+                       for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        stats = measure(run, repeat=5, number=1, warmup=1)
+        orders = threads * orders_per_thread
+        # Report per-order cost so results compare like the other benchmarks
+        results[f'threads_{threads}'] = {key: value / orders if key != 'calls' else value * orders
+                                         for key, value in stats.items()}
+        results[f'threads_{threads}']['orders_per_second'] = orders / stats['median']
+    return results
+
+
+@benchmark("paper.quote_store")
+def bench_quote_store(scale):
+    from common.quote_store import QuoteStore
+
+    quotes = QuoteStore()
+    symbols = [f"SYM{i}" for i in range(500)]
+    for i, symbol in enumerate(symbols):
+        quotes.update(symbol, 100.0 + i, 100.05 + i, 100, 200)
+    return {
+        'update': measure(lambda: quotes.update("SYM250", 350.0, 350.05, 100, 200), repeat=scale, number=1000),
+        'fill_price': measure(lambda: quotes.fill_price("SYM250", 'buy'), repeat=scale, number=1000),
+    }
+
+
+# ----------------------------
+# Sentiment
+# ----------------------------
+@benchmark("sentiment.estimate_sentiment")
+def bench_sentiment(scale):
+    # Only use a model that is already cached locally
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    try:
+        import finbert_utils
+        finbert_utils.load()
+    except Exception as e:
+        raise Skip(e)
+
+    results = {}
+    for batch in (1, 8, 32):
+        headlines = (HEADLINES * (batch // len(HEADLINES) + 1))[:batch]
+        results[f'batch_{batch}'] = measure(lambda: finbert_utils.estimate_sentiment(headlines),
+                                            repeat=max(scale // 4, 3), number=1)
+    return results
+
+
+# ----------------------------
+# Telemetry
+# ----------------------------
+@benchmark("telemetry.sample")
+def bench_telemetry_sample(scale):
+    try:
+        from paper_trading import PaperTrader
+    except ImportError as e:
+        raise Skip(e)
+    from common.telemetry import ResourceMonitor
+
+    trader = PaperTrader()
+    for _ in range(1000 * scale):
+        trader.record_portfolio()
+    # Default settings only: tracemalloc would slow every benchmark after this one
+    monitor = ResourceMonitor()
+    monitor.track('paper', trader.sizes)
+    return {'sample': measure(monitor.sample, repeat=scale, number=10)}
+
+
+# ----------------------------
+# Fyers order client
+# ----------------------------
+@benchmark("fyers.order_round_trip")
+def bench_fyers_round_trip(scale):
+    try:
+        from fyersTradeAutomate import FyersAlgoTrader
+    except ImportError as e:
+        raise Skip(e)
+    from order_book import OrderBookMirror
+
+    token_dir = tempfile.mkdtemp()
+    trader = FyersAlgoTrader("BENCH-100", "secret", "http://localhost",
+                             token_file=os.path.join(token_dir, "token.json"))
+    trader.fyers = StubFyersModel()
+    trader.order_book = OrderBookMirror(trader.fyers)
+
+    def round_trip():
+        response = trader.place_order(symbol="NSE:IDEA-EQ", qty=1, order_type=1, side=1,
+                                      productType="INTRADAY", limitPrice=10.0)
+        trader.modify_order(response['id'], 1, 10.05, 1)
+        trader.cancel_order(response['id'])
+
+    # FyersAlgoTrader prints every response; keep that out of the timings' I/O
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {'place_modify_cancel': measure(round_trip, repeat=scale)}
+
+
+@benchmark("fyers.market_quote")
+def bench_fyers_market_quote(scale):
+    try:
+        from quote_coalescer import QuoteCoalescer
+    except ImportError as e:
+        raise Skip(e)
+    from concurrent.futures import ThreadPoolExecutor
+
+    fyers = StubFyersModel()
+    calls = []
+    quotes = fyers.quotes
+    fyers.quotes = lambda data: calls.append(data) or quotes(data)
+    watchlist = [f"NSE:SYM{i}-EQ" for i in range(300)]
+    # ttl=0 so every refresh goes to the (stub) API
+    coalescer = QuoteCoalescer(fyers, window=0.002, ttl=0)
+
+    def refresh_concurrent():
+        with ThreadPoolExecutor(32) as pool:
+            list(pool.map(lambda symbol: coalescer.get([symbol]), watchlist))
+
+    results = {'watchlist_300': measure(lambda: coalescer.get(watchlist), repeat=scale)}
+    calls.clear()
+    results['concurrent_300'] = measure(refresh_concurrent, repeat=max(scale // 4, 3), number=1, warmup=0)
+    # HTTP calls per refresh of 300 symbols quoted one at a time from 32 threads (300 without coalescing)
+    results['calls_per_concurrent_refresh'] = len(calls) / results['concurrent_300']['calls']
+    return results
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def flatten(results):
+    """
+    Yield (name, stats) for every leaf result that has a median.
+    """
+    for name, value in results.items():
+        if isinstance(value, dict) and 'median' in value:
+            yield name, value
+        elif isinstance(value, dict):
+            for child, stats in flatten(value):
+                yield f"{name}.{child}", stats
+
+
+def compare(results, baseline, tolerance):
+    baseline_stats = dict(flatten(baseline['results']))
+    regressions = []
+    for name, stats in flatten(results):
+        previous = baseline_stats.get(name)
+        if previous is None or not previous['median']:
+            continue
+        ratio = stats['median'] / previous['median']
+        status = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        print(f"{status:>10}  {name}: {previous['median'] * 1e6:.1f}us -> {stats['median'] * 1e6:.1f}us ({ratio:.2f}x)")
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a saved results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--scale", type=int, default=20, help="Repeat count; lower for a quick run")
+    args = parser.parse_args()
+
+    # Keep strategy/broker logging out of the measurements
+    configure_logging(level=logging.WARNING)
+
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        try:
+            results[name] = func(args.scale)
+            print(f"{name}: done")
+        except Skip as e:
+            print(f"{name}: skipped ({e})")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# charting.py
+
+import threading
+
+import numpy as np
+
+from common.indicators import atr, sma
+
+# Points drawn per series. A few thousand is more than a chart's pixel width,
+# so the downsampled line looks the same as the full one.
+DEFAULT_BUDGET = 2000
+
+
+# ----------------------------
+# Downsampling
+# ----------------------------
+def minmax_indices(y, budget=DEFAULT_BUDGET):
+    """
+    Indices of the min and max point in each of budget / 2 equal-count buckets,
+    plus the first and last point. Keeps every spike, in a few vectorized operations.
+    """
+    n = len(y)
+    if n <= budget:
+        return np.arange(n)
+    width = -(-n // (budget // 2))
+    buckets = -(-n // width)
+    # Pad the last bucket with copies of the final value; argmin/argmax return the
+    # first occurrence, so they never point past the real data
+    padded = np.pad(np.asarray(y), (0, buckets * width - n), mode='edge').reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    return np.unique(np.concatenate((padded.argmin(axis=1) + offsets, padded.argmax(axis=1) + offsets, [0, n - 1])))
+
+
+def lttb_indices(x, y, budget=DEFAULT_BUDGET):
+    """
+    Largest-Triangle-Three-Buckets: per bucket, keep the point forming the largest
+    triangle with the previously kept point and the next bucket's average. Follows
+    the shape of the line more faithfully than min-max, at one step per bucket.
+    """
+    n = len(y)
+    if n <= budget or budget < 3:
+        return np.arange(n)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.view(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    # Average of each bucket, plus the last point as the final "next bucket"
+    starts = np.append(edges[:-1], n - 1)
+    counts = np.diff(np.append(starts, n))
+    avg_x = (np.add.reduceat(x, starts) / counts).tolist()
+    avg_y = (np.add.reduceat(y, starts) / counts).tolist()
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0] = anchor = 0
+    selected[-1] = n - 1
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[anchor], y[anchor]
+        area = np.abs((ax - avg_x[i + 1]) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y[i + 1] - ay))
+        anchor = start + int(area.argmax())
+        selected[i + 1] = anchor
+    return selected
+
+
+def downsample_indices(x, y, budget=DEFAULT_BUDGET, method='minmax'):
+    if method == 'lttb':
+        return lttb_indices(x, y, budget)
+    if method == 'minmax':
+        return minmax_indices(y, budget)
+    raise ValueError(f"Unknown downsampling method {method!r}")
+
+
+class DownsampledSeries:
+    """
+    Streaming min-max downsampler for an append-only series (e.g. an equity curve).
+
+    Points fall into buckets of ``width`` consecutive points and only each
+    bucket's min and max are kept. When the buckets fill the budget, adjacent
+    pairs merge and the width doubles. Memory stays at the budget, an append
+    only touches the last bucket, and points() is cached between appends.
+    x values must arrive in increasing order.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.capacity = max(budget // 2 // 2 * 2, 2)  # Buckets; even so pairs merge cleanly
+        self.width = 1
+        self.buckets = 0
+        self.fill = 0  # Points in the last bucket
+        self.count = 0
+        self.lock = threading.Lock()
+        self.min_x = self.min_y = self.max_x = self.max_y = None
+        self.last = None
+        self._points = None
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, x_dtype):
+        self.min_x = np.empty(self.capacity, dtype=x_dtype)
+        self.max_x = np.empty(self.capacity, dtype=x_dtype)
+        self.min_y = np.empty(self.capacity)
+        self.max_y = np.empty(self.capacity)
+
+    def _merge_pairs(self):
+        # Keep the lower min and the higher max of each pair of buckets
+        half = self.buckets // 2
+        for xs, ys, pick in ((self.min_x, self.min_y, np.argmin), (self.max_x, self.max_y, np.argmax)):
+            pair_y = ys[:self.buckets].reshape(half, 2)
+            choice = pick(pair_y, axis=1)
+            rows = np.arange(half)
+            xs[:half] = xs[:self.buckets].reshape(half, 2)[rows, choice]
+            ys[:half] = pair_y[rows, choice]
+        self.buckets = half
+        self.width *= 2
+        self.fill = self.width
+
+    def extend(self, x, y):
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=np.float64)
+        if not len(x):
+            return
+        with self.lock:
+            if self.min_x is None:
+                self._allocate(x.dtype)
+            self.count += len(x)
+            self.last = (x[-1], y[-1])
+            self._points = None
+            while len(x):
+                if self.buckets and self.fill < self.width:
+                    # Top up the partially filled last bucket
+                    take = min(self.width - self.fill, len(x))
+                    b = self.buckets - 1
+                    i = int(y[:take].argmin())
+                    if y[i] < self.min_y[b]:
+                        self.min_x[b], self.min_y[b] = x[i], y[i]
+                    i = int(y[:take].argmax())
+                    if y[i] > self.max_y[b]:
+                        self.max_x[b], self.max_y[b] = x[i], y[i]
+                    self.fill += take
+                    x, y = x[take:], y[take:]
+                    continue
+                if self.buckets == self.capacity:
+                    self._merge_pairs()
+                    continue
+                # Open as many new buckets as the input and the budget allow, in one pass
+                n = min(len(x), (self.capacity - self.buckets) * self.width)
+                k = -(-n // self.width)
+                pad = k * self.width - n
+                bx = np.pad(x[:n], (0, pad), mode='edge').reshape(k, self.width)
+                by = np.pad(y[:n], (0, pad), mode='edge').reshape(k, self.width)
+                rows = np.arange(k)
+                lo, hi = by.argmin(axis=1), by.argmax(axis=1)
+                b = slice(self.buckets, self.buckets + k)
+                self.min_x[b], self.min_y[b] = bx[rows, lo], by[rows, lo]
+                self.max_x[b], self.max_y[b] = bx[rows, hi], by[rows, hi]
+                self.buckets += k
+                self.fill = n - (k - 1) * self.width
+                x, y = x[n:], y[n:]
+
+    def append(self, x, y):
+        self.extend([x], [y])
+
+    def points(self):
+        """
+        Return (x, y) arrays of at most budget + 1 points in x order, ending at the latest point.
+        """
+        with self.lock:
+            if self._points is None:
+                self._points = self._build_points()
+            return self._points
+
+    def _build_points(self):
+        if not self.buckets:
+            return np.empty(0), np.empty(0)
+        b = self.buckets
+        min_first = self.min_x[:b] <= self.max_x[:b]
+        first_x = np.where(min_first, self.min_x[:b], self.max_x[:b])
+        first_y = np.where(min_first, self.min_y[:b], self.max_y[:b])
+        second_x = np.where(min_first, self.max_x[:b], self.min_x[:b])
+        second_y = np.where(min_first, self.max_y[:b], self.min_y[:b])
+        xs = np.column_stack((first_x, second_x)).ravel()
+        ys = np.column_stack((first_y, second_y)).ravel()
+        # Drop the second point where min and max are the same point (e.g. one-point buckets)
+        keep = np.ones(len(xs), dtype=bool)
+        keep[1::2] = first_x != second_x
+        xs, ys = xs[keep], ys[keep]
+        last_x, last_y = self.last
+        if xs[-1] != last_x:
+            xs, ys = np.append(xs, last_x), np.append(ys, last_y)
+        return xs, ys
+
+
+# ----------------------------
+# Rendering
+# ----------------------------
+def plot_line(ax, x, y, budget=DEFAULT_BUDGET, method='minmax', **kwargs):
+    """
+    Plot y against x on a matplotlib Axes after downsampling to the point budget.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    index = downsample_indices(x, y, budget, method) if len(y) > budget else slice(None)
+    return ax.plot(x[index], y[index], **kwargs)
+
+
+def plot_price(ax, x, close, high=None, low=None, short_window=50, long_window=200,
+               atr_period=14, atr_multiplier=1.5, budget=DEFAULT_BUDGET, method='minmax'):
+    """
+    Plot close with short/long SMA overlays and, when high and low are given,
+    a close +/- atr_multiplier * ATR band.
+
+    Indicators are computed on the full series; every overlay is then drawn at
+    the points chosen for close, so the lines stay aligned.
+
+    Parameters:
+    - ax: matplotlib Axes to draw on.
+    - x (array): Bar times (datetime64) or positions.
+    - close, high, low (array): Bar prices.
+    - budget (int): Points drawn per line.
+    - method (str): 'minmax' or 'lttb'.
+    """
+    x = np.asarray(x)
+    close = np.asarray(close, dtype=np.float64)
+    index = downsample_indices(x, close, budget, method) if len(close) > budget else slice(None)
+    ax.plot(x[index], close[index], label="Close", linewidth=1)
+    ax.plot(x[index], sma(close, short_window)[index], label=f"SMA {short_window}", linewidth=1)
+    ax.plot(x[index], sma(close, long_window)[index], label=f"SMA {long_window}", linewidth=1)
+    if high is not None and low is not None:
+        band = atr(high, low, close, atr_period)[index] * atr_multiplier
+        ax.fill_between(x[index], close[index] - band, close[index] + band, alpha=0.2,
+                        label=f"ATR({atr_period}) x {atr_multiplier}")
+    ax.legend(loc="upper left")
+    ax.grid(True)
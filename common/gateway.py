@@ -0,0 +1,538 @@
+# gateway.py
+
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+
+from common.metrics import registry
+from common.rate_limit import ORDER, get_limiter
+
+logger = logging.getLogger(__name__)
+
+# Order statuses
+NEW = 'new'
+ACCEPTED = 'accepted'
+PARTIALLY_FILLED = 'partially_filled'
+PENDING_CANCEL = 'pending_cancel'
+FILLED = 'filled'
+CANCELLED = 'cancelled'
+REJECTED = 'rejected'
+FINAL_STATUSES = {FILLED, CANCELLED, REJECTED}
+
+
+class Order:
+    """
+    Broker-independent order. Side is 'buy' or 'sell'; type is 'market',
+    'limit', 'stop' or 'stop_limit'.
+    """
+
+    __slots__ = ('symbol', 'quantity', 'side', 'type', 'limit_price', 'stop_price', 'time_in_force', 'tag',
+                 'client_id', 'broker_id', 'status', 'filled_quantity', 'avg_fill_price', 'error',
+                 'created_at', 'updated_at')
+
+    def __init__(self, symbol, quantity, side, type='market', limit_price=None, stop_price=None,
+                 time_in_force='day', tag=''):
+        self.symbol = symbol
+        self.quantity = quantity
+        self.side = side
+        self.type = type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.time_in_force = time_in_force
+        self.tag = tag
+        self.client_id = uuid.uuid4().hex
+        self.broker_id = None
+        self.status = NEW
+        self.filled_quantity = 0
+        self.avg_fill_price = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def __repr__(self):
+        return (f"Order({self.side} {self.quantity} {self.symbol} {self.type} status={self.status} "
+                f"filled={self.filled_quantity} broker_id={self.broker_id})")
+
+
+class Gateway:
+    """
+    One order interface over Alpaca, Fyers and the PaperTrader.
+
+    A single asyncio event loop runs on a background thread and owns all broker
+    I/O: submissions, acks and fill updates. Strategy threads call submit() and
+    get a concurrent.futures.Future that resolves to the Order once the broker
+    acknowledged (or rejected) it. Swapping the adapter switches brokers
+    without touching strategy code.
+
+    Final statuses (filled, cancelled, rejected) are terminal. A cancel request
+    moves the order to pending_cancel until the broker reports the outcome.
+    Stream updates that arrive before the submit call has returned the broker
+    id are held and applied once the order is registered.
+
+    With a RiskEngine, each order is checked and its quantity reserved before
+    it is sent; one that would breach a limit is rejected without reaching the
+    broker. On acknowledgement the reservation moves to the broker id, the id
+    fills are reported under, and what is left of it is released when the
+    order reaches a final status. The gateway applies fills to the engine
+    unless the adapter's fills already reach it (a FyersAdapter chained onto
+    FyersAlgoTrader's callbacks, which must then share the engine).
+
+    Parameters:
+    - adapter: PaperAdapter, AlpacaAdapter or FyersAdapter.
+    - risk (RiskEngine): Optional pre-trade limits. Leave unset with the
+      PaperAdapter and give the engine to the PaperTrader, which checks its own orders.
+    - max_early (int): Updates for unknown broker ids kept for replay; ids of
+      orders placed outside the gateway age out past this.
+    """
+
+    def __init__(self, adapter, risk=None, max_early=1000):
+        self.adapter = adapter
+        self.risk = risk
+        self.orders = {}     # client id -> Order
+        self.broker_ids = {}  # broker order id -> Order
+        self.early_updates = collections.OrderedDict()  # unknown broker id -> [update, ...]
+        self.max_early = max_early
+        self.listeners = []
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"gateway-{self.adapter.name}")
+        self.thread.start()
+        self.ready.wait()
+        asyncio.run_coroutine_threadsafe(self.adapter.connect(self), self.loop).result()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.ready.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.adapter.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop = None
+
+    def add_listener(self, callback):
+        """
+        Call callback(order) on the gateway loop thread after every status change.
+        """
+        self.listeners.append(callback)
+
+    # ----------------------------
+    # Orders
+    # ----------------------------
+    def submit(self, order):
+        """
+        Submit one order; returns a Future resolving to the acknowledged Order.
+        """
+        return asyncio.run_coroutine_threadsafe(self._submit_one(order), self.loop)
+
+    def submit_many(self, orders):
+        """
+        Submit orders in as few broker calls as the adapter allows; returns a Future of the list.
+        """
+        return asyncio.run_coroutine_threadsafe(self._submit_many(list(orders)), self.loop)
+
+    def cancel(self, order):
+        """
+        Request cancellation; returns a Future resolving to True if the broker accepted the request.
+        """
+        return asyncio.run_coroutine_threadsafe(self._cancel(order), self.loop)
+
+    async def _submit_one(self, order):
+        return (await self._submit_many([order]))[0]
+
+    async def _submit_many(self, orders):
+        accepted = [order for order in orders if self._reserve(order)]
+        for order in accepted:
+            self.orders[order.client_id] = order
+        batch_size = self.adapter.max_batch
+        batches = [accepted[i:i + batch_size] for i in range(0, len(accepted), batch_size)]
+        histogram = registry.histogram(f"gateway.{self.adapter.name}.submit")
+        start = time.perf_counter_ns()
+        await asyncio.gather(*(self._submit_batch(batch) for batch in batches))
+        histogram.record(time.perf_counter_ns() - start)
+        return orders
+
+    def _reserve(self, order):
+        # Pre-trade check; a rejected order is never sent
+        if self.risk is None:
+            return True
+        quantity = order.quantity if order.side == 'buy' else -order.quantity
+        price = order.limit_price or order.stop_price
+        with self.risk.lock:
+            reason = self.risk.check(order.symbol, quantity, price)
+            if reason is None:
+                self.risk.reserve(order.client_id, order.symbol, quantity, price)
+                return True
+        order.status = REJECTED
+        order.error = f"rejected by risk engine: {reason}"
+        self._notify(order)
+        return False
+
+    async def _cancel(self, order):
+        if order.status in FINAL_STATUSES or order.broker_id is None:
+            return False
+        order.status = PENDING_CANCEL
+        order.updated_at = time.time()
+        self._notify(order)
+        try:
+            accepted = await self.adapter.cancel(order)
+        except Exception as e:
+            logger.error("%s cancel failed: %s", self.adapter.name, e)
+            accepted = False
+        if not accepted and order.status == PENDING_CANCEL:
+            # Refused (or failed): the order is still working
+            order.status = PARTIALLY_FILLED if order.filled_quantity else ACCEPTED
+            order.updated_at = time.time()
+            self._notify(order)
+        return bool(accepted)
+
+    async def _submit_batch(self, batch):
+        if self.adapter.rate_limit is not None:
+            await get_limiter(*self.adapter.rate_limit).acquire_async(priority=ORDER)
+        try:
+            await self.adapter.submit(batch)
+        except Exception as e:
+            logger.error("%s submit failed: %s", self.adapter.name, e)
+            for order in batch:
+                if order.status == NEW:
+                    order.status = REJECTED
+                    order.error = str(e)
+        for order in batch:
+            if self.risk is not None and order.broker_id is not None:
+                # Fills and closes are reported by broker id from here on. One the broker
+                # pushed before this point stays reserved until the order's final status.
+                self.risk.rekey(order.client_id, order.broker_id)
+            self._risk_fill(order, 0, None)
+            self._notify(order)
+            if order.status in FINAL_STATUSES:
+                self._close(order)
+            elif order.broker_id is not None:
+                self.broker_ids[order.broker_id] = order
+                for update in self.early_updates.pop(order.broker_id, ()):
+                    self._update(order, *update)
+
+    # ----------------------------
+    # Updates from broker streams
+    # ----------------------------
+    def on_update(self, broker_id, status, filled_quantity=None, avg_fill_price=None):
+        """
+        Record a broker status update. Safe to call from any thread.
+        """
+        if self.loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._apply_update(broker_id, status, filled_quantity, avg_fill_price)
+        else:
+            self.loop.call_soon_threadsafe(self._apply_update, broker_id, status, filled_quantity, avg_fill_price)
+
+    def _apply_update(self, broker_id, status, filled_quantity, avg_fill_price):
+        order = self.broker_ids.get(broker_id)
+        if order is None:
+            # Streams can report an order before its submit call returns the id
+            self.early_updates.setdefault(broker_id, []).append((status, filled_quantity, avg_fill_price))
+            while len(self.early_updates) > self.max_early:
+                self.early_updates.popitem(last=False)
+            return
+        self._update(order, status, filled_quantity, avg_fill_price)
+
+    def _update(self, order, status, filled_quantity, avg_fill_price):
+        if order.status in FINAL_STATUSES:
+            return
+        if order.status == PENDING_CANCEL and status in (ACCEPTED, PARTIALLY_FILLED):
+            status = PENDING_CANCEL  # Still waiting on the broker's answer to the cancel
+        filled_before, avg_before = order.filled_quantity, order.avg_fill_price
+        order.status = status
+        if filled_quantity is not None:
+            order.filled_quantity = filled_quantity
+        if avg_fill_price is not None:
+            order.avg_fill_price = avg_fill_price
+        order.updated_at = time.time()
+        self._risk_fill(order, filled_before, avg_before)
+        self._notify(order)
+        if status in FINAL_STATUSES:
+            self._close(order)
+
+    def _risk_fill(self, order, filled_before, avg_before):
+        # Apply the newly filled part of an order, at its own price, to the risk engine
+        if self.risk is None or self.adapter.fills_reach_risk:
+            return
+        quantity = order.filled_quantity - filled_before
+        if quantity <= 0 or order.avg_fill_price is None:
+            return
+        price = (order.avg_fill_price * order.filled_quantity - (avg_before or 0.0) * filled_before) / quantity
+        self.risk.on_fill(order.symbol, quantity if order.side == 'buy' else -quantity, price,
+                          order_id=order.broker_id if order.broker_id is not None else order.client_id)
+
+    def _close(self, order):
+        # Done orders stay reachable through the caller's Order object only
+        if self.risk is not None:
+            self.risk.release(order.broker_id if order.broker_id is not None else order.client_id)
+        self.orders.pop(order.client_id, None)
+        self.broker_ids.pop(order.broker_id, None)
+
+    def _notify(self, order):
+        for callback in self.listeners:
+            try:
+                callback(order)
+            except Exception as e:
+                logger.error("Gateway listener failed: %s", e)
+
+
+# ----------------------------
+# Adapters
+# ----------------------------
+class PaperAdapter:
+    """
+    Routes orders to a PaperTrader, which fills them immediately at the given price.
+    Market orders need limit_price set to the price to fill at.
+    """
+
+    name = 'paper'
+    max_batch = 100
+    rate_limit = None
+    fills_reach_risk = False
+
+    def __init__(self, trader):
+        self.trader = trader
+        self.ids = itertools.count(1)
+
+    async def connect(self, gateway):
+        self.gateway = gateway
+
+    async def close(self):
+        pass
+
+    async def submit(self, orders):
+        for order in orders:
+            order.broker_id = f"paper-{next(self.ids)}"
+            trade = self.trader.place_order(order.symbol, order.quantity, order.side, order.limit_price)
+            if trade is None:
+                order.status = REJECTED
+                order.error = "rejected by paper trader"
+            else:
+                order.status = FILLED
+                order.filled_quantity = trade['quantity']
+                order.avg_fill_price = trade['price']
+
+    async def cancel(self, order):
+        return False  # Paper orders fill or reject immediately
+
+
+class AlpacaAdapter:
+    """
+    Alpaca REST orders over one pooled aiohttp session, with fills from the trade_updates stream.
+    Alpaca has no batch endpoint, so a batch is sent as concurrent requests on the pool.
+    """
+
+    name = 'alpaca'
+    max_batch = 1
+    rate_limit = ('alpaca', 'trading')
+    fills_reach_risk = False
+    STATUSES = {'new': ACCEPTED, 'accepted': ACCEPTED, 'pending_new': ACCEPTED, 'partial_fill': PARTIALLY_FILLED,
+                'fill': FILLED, 'canceled': CANCELLED, 'expired': CANCELLED, 'rejected': REJECTED}
+
+    def __init__(self, api_key, secret_key, base_url="https://paper-api.alpaca.markets", pool_size=10):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.session = None
+        self.stream_task = None
+
+    async def connect(self, gateway):
+        import aiohttp
+
+        self.gateway = gateway
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+            headers={"APCA-API-KEY-ID": self.api_key, "APCA-API-SECRET-KEY": self.secret_key},
+        )
+        self.stream_task = asyncio.ensure_future(self._stream())
+
+    async def close(self):
+        if self.stream_task is not None:
+            self.stream_task.cancel()
+        if self.session is not None:
+            await self.session.close()
+
+    async def submit(self, orders):
+        await asyncio.gather(*(self._submit(order) for order in orders))
+
+    async def _submit(self, order):
+        body = {"symbol": order.symbol, "qty": str(order.quantity), "side": order.side, "type": order.type,
+                "time_in_force": order.time_in_force, "client_order_id": order.client_id}
+        if order.limit_price is not None:
+            body["limit_price"] = str(order.limit_price)
+        if order.stop_price is not None:
+            body["stop_price"] = str(order.stop_price)
+        async with self.session.post(f"{self.base_url}/v2/orders", json=body) as response:
+            data = await response.json()
+        if response.status >= 400:
+            order.status = REJECTED
+            order.error = data.get('message', str(data))
+        else:
+            order.broker_id = data['id']
+            order.status = ACCEPTED
+
+    async def cancel(self, order):
+        async with self.session.delete(f"{self.base_url}/v2/orders/{order.broker_id}") as response:
+            return response.status < 400
+
+    async def _stream(self):
+        import aiohttp
+
+        url = self.base_url.replace("https://", "wss://") + "/stream"
+        while True:
+            try:
+                async with self.session.ws_connect(url, heartbeat=30) as ws:
+                    await ws.send_json({"action": "auth", "key": self.api_key, "secret": self.secret_key})
+                    await ws.send_json({"action": "listen", "data": {"streams": ["trade_updates"]}})
+                    async for message in ws:
+                        if message.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                            self._on_message(json.loads(message.data))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Alpaca trade_updates stream dropped: %s; reconnecting", e)
+            await asyncio.sleep(1)
+
+    def _on_message(self, message):
+        if message.get('stream') != 'trade_updates':
+            return
+        data = message['data']
+        status = self.STATUSES.get(data.get('event'))
+        if status is None:
+            return
+        order = data['order']
+        self.gateway.on_update(order['id'], status, float(order.get('filled_qty') or 0),
+                               float(order['filled_avg_price']) if order.get('filled_avg_price') else None)
+
+
+class FyersAdapter:
+    """
+    Fyers v3 orders over one pooled aiohttp session. Batches go through the
+    multi-order endpoint (up to 10 orders per call); fills arrive through an
+    OrderBookMirror's order-socket events.
+    """
+
+    name = 'fyers'
+    max_batch = 10
+    rate_limit = ('fyers', 'default')
+    BASE_URL = "https://api-t1.fyers.in/api/v3"
+    TYPES = {'limit': 1, 'market': 2, 'stop': 3, 'stop_limit': 4}
+    STATUSES = {1: CANCELLED, 2: FILLED, 4: ACCEPTED, 5: REJECTED, 6: ACCEPTED}
+
+    def __init__(self, client_id, token_manager, order_book=None, product_type="INTRADAY", pool_size=10):
+        self.client_id = client_id
+        self.token_manager = token_manager
+        self.order_book = order_book
+        self.product_type = product_type
+        self.pool_size = pool_size
+        self.session = None
+        self.fills_reach_risk = False
+
+    async def connect(self, gateway):
+        import aiohttp
+
+        self.gateway = gateway
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60))
+        if self.order_book is not None:
+            # Chain onto callbacks already installed (e.g. FyersAlgoTrader's risk updates)
+            on_order_closed = self.order_book.on_order_closed
+            on_fill = self.order_book.on_fill
+            # FyersAlgoTrader's fill callback applies every fill, by order id, to its engine
+            self.fills_reach_risk = on_fill is not None
+
+            def order_closed(order):
+                if on_order_closed is not None:
+                    on_order_closed(order)
+                self._on_order(order)
+
+            def fill(trade):
+                if on_fill is not None:
+                    on_fill(trade)
+                self._on_order(self.order_book.get_order(trade.get('orderNumber')) or {})
+
+            self.order_book.on_order_closed = order_closed
+            self.order_book.on_fill = fill
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _headers(self):
+        # Read per call so tokens refreshed by the TokenManager are picked up. The read takes a
+        # file lock and may refresh over HTTP, so it runs on an executor thread, not the loop.
+        token = await asyncio.get_running_loop().run_in_executor(None, self.token_manager.get_access_token)
+        return {"Authorization": f"{self.client_id}:{token}"}
+
+    def _body(self, order):
+        return {
+            "symbol": order.symbol,
+            "qty": order.quantity,
+            "type": self.TYPES[order.type],
+            "side": 1 if order.side == 'buy' else -1,
+            "productType": self.product_type,
+            "limitPrice": order.limit_price or 0,
+            "stopPrice": order.stop_price or 0,
+            "validity": "DAY" if order.time_in_force == 'day' else "IOC",
+            "disclosedQty": 0,
+            "offlineOrder": False,
+            "orderTag": order.tag,
+        }
+
+    async def submit(self, orders):
+        if len(orders) == 1:
+            async with self.session.post(f"{self.BASE_URL}/orders/sync", json=self._body(orders[0]),
+                                         headers=await self._headers()) as response:
+                self._ack(orders[0], await response.json())
+            return
+        async with self.session.post(f"{self.BASE_URL}/multi-order/sync", json=[self._body(o) for o in orders],
+                                     headers=await self._headers()) as response:
+            data = await response.json()
+        results = data.get('data') or []
+        for i, order in enumerate(orders):
+            self._ack(order, results[i].get('body', {}) if i < len(results) else data)
+
+    def _ack(self, order, response):
+        if response.get('s') == 'ok' and response.get('id'):
+            order.broker_id = response['id']
+            order.status = ACCEPTED
+            if self.order_book is not None:
+                # Looked up by id when its pushes arrive, as FyersAlgoTrader.place_order does
+                self.order_book.track_order(order.broker_id, self._body(order))
+        else:
+            order.status = REJECTED
+            order.error = response.get('message', str(response))
+
+    async def cancel(self, order):
+        async with self.session.delete(f"{self.BASE_URL}/orders/sync", json={"id": order.broker_id},
+                                       headers=await self._headers()) as response:
+            return (await response.json()).get('s') == 'ok'
+
+    def _on_order(self, order):
+        status = self.STATUSES.get(order.get('status'))
+        if status == ACCEPTED and order.get('filledQty'):
+            status = PARTIALLY_FILLED
+        if status is not None:
+            self.gateway.on_update(order['id'], status, order.get('filledQty'), order.get('tradedPrice'))
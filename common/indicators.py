@@ -0,0 +1,37 @@
+# indicators.py
+
+import numpy as np
+
+
+def sma(values, window):
+    """
+    Simple moving average along axis 0 (rows are bars), computed from a running
+    sum so the cost does not depend on the window. The first window - 1 rows are NaN.
+
+    Works on a single series or a (time x symbol) matrix. A NaN input makes every
+    later average in its column NaN, so fill gaps first.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        cumsum = np.cumsum(values, axis=0)
+        out[window - 1] = cumsum[window - 1] / window
+        out[window:] = (cumsum[window:] - cumsum[:-window]) / window
+    return out
+
+
+def true_range(high, low, close):
+    """
+    True range along axis 0; the first row has no previous close and is high - low.
+    """
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    prev_close = np.concatenate((np.full((1,) + close.shape[1:], np.nan), close[:-1]))
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(high, low, close, period):
+    """
+    Average true range along axis 0, as a simple average of true range
+    (matching the strategies' rolling-mean ATR).
+    """
+    return sma(true_range(high, low, close), period)
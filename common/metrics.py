@@ -0,0 +1,278 @@
+# metrics.py
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common.rate_limit import limiter_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_PORT = 9180  # Not 9100: that is node_exporter's
+SUB_BUCKET_BITS = 6  # 64 linear sub-buckets per power of two: values kept to within ~1.6%
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram of durations in nanoseconds.
+
+    Each value is rounded down to its bucket floor, so memory stays bounded
+    (a few hundred buckets for ns..hours) and recording is a dict increment.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_ns):
+        shift = max(value_ns.bit_length() - SUB_BUCKET_BITS, 0)
+        bucket = (value_ns >> shift) << shift
+        with self.lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += value_ns
+            if self.min is None or value_ns < self.min:
+                self.min = value_ns
+            if value_ns > self.max:
+                self.max = value_ns
+
+    def percentiles(self, quantiles=QUANTILES):
+        """
+        Return {quantile: value_ns} for the recorded values.
+        """
+        with self.lock:
+            buckets = sorted(self.counts.items())
+            count = self.count
+        result = {}
+        if not count:
+            return {q: 0 for q in quantiles}
+        seen = 0
+        pending = sorted(quantiles)
+        for bucket, bucket_count in buckets:
+            seen += bucket_count
+            while pending and seen >= pending[0] * count:
+                result[pending.pop(0)] = bucket
+            if not pending:
+                break
+        for q in pending:
+            result[q] = self.max
+        return result
+
+    def snapshot(self):
+        percentiles = self.percentiles()
+        with self.lock:
+            return {
+                'count': self.count,
+                'sum_seconds': self.total / 1e9,
+                'min_seconds': (self.min or 0) / 1e9,
+                'max_seconds': self.max / 1e9,
+                'quantiles': {str(q): value / 1e9 for q, value in percentiles.items()},
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.count = 0
+            self.total = 0
+            self.min = None
+            self.max = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.collectors = {}
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(name))
+        return histogram
+
+    def add_collector(self, name, collect):
+        """
+        Register a callable returning a (nested) dict of numbers to export with each scrape.
+        """
+        with self.lock:
+            self.collectors[name] = collect
+
+    def snapshot(self):
+        with self.lock:
+            histograms = list(self.histograms.values())
+            collectors = list(self.collectors.items())
+        result = {'stages': {h.name: h.snapshot() for h in histograms}}
+        for name, collect in collectors:
+            try:
+                result[name] = collect()
+            except Exception as e:
+                logger.error("Metrics collector %s failed: %s", name, e)
+        return result
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = ["# TYPE stage_latency_seconds summary"]
+        for stage, stats in snapshot.pop('stages').items():
+            for q, value in stats['quantiles'].items():
+                lines.append(f'stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {value}')
+            lines.append(f'stage_latency_seconds_sum{{stage="{stage}"}} {stats["sum_seconds"]}')
+            lines.append(f'stage_latency_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        for name, values in snapshot.items():
+            for key, value in _flatten(name, values):
+                lines.append(f"{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(prefix, values):
+    if isinstance(values, dict):
+        for key, value in values.items():
+            yield from _flatten(f"{prefix}_{key}", value)
+    elif isinstance(values, (int, float)) and not isinstance(values, bool):
+        yield "".join(c if c.isalnum() else "_" for c in prefix), values
+
+
+registry = MetricsRegistry()
+registry.add_collector('rate_limit', limiter_metrics)
+
+
+class timer:
+    """
+    Time a block or function into the ``stage`` histogram.
+
+    Usage:
+    - ``with timer("data_fetch"): ...``
+    - ``@timer("order_submit")`` on a function or method.
+    """
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, stage):
+        self.histogram = registry.histogram(stage)
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
+
+    def __call__(self, func):
+        histogram = self.histogram
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter_ns() - start)
+
+        return wrapper
+
+
+class AckTimer:
+    """
+    Time from sending an order to the broker's first status event for it, into the ``stage`` histogram.
+
+    Call submitted(order_id, start_ns) once the order id is known and acked(order_id)
+    from the broker's order-update callback; later events for the id are ignored.
+    Either may come first, since a push can beat the submit response. Unmatched
+    entries are dropped beyond ``max_pending``.
+    """
+
+    def __init__(self, stage, max_pending=1000):
+        self.histogram = registry.histogram(stage)
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.sent = {}    # order id -> perf_counter_ns at submit
+        self.early = {}   # order id -> perf_counter_ns of an ack seen before submitted()
+        self.done = {}    # order ids already recorded, insertion-ordered
+
+    def submitted(self, order_id, start_ns=None):
+        start_ns = time.perf_counter_ns() if start_ns is None else start_ns
+        with self.lock:
+            acked_ns = self.early.pop(order_id, None)
+            if acked_ns is None:
+                self._put(self.sent, order_id, start_ns)
+                return
+            self._put(self.done, order_id, None)
+        self.histogram.record(max(acked_ns - start_ns, 0))
+
+    def acked(self, order_id):
+        now = time.perf_counter_ns()
+        with self.lock:
+            if order_id in self.done:
+                return
+            start_ns = self.sent.pop(order_id, None)
+            if start_ns is None:
+                self._put(self.early, order_id, now)
+                return
+            self._put(self.done, order_id, None)
+        self.histogram.record(now - start_ns)
+
+    def _put(self, pending, order_id, value):
+        pending.setdefault(order_id, value)
+        if len(pending) > self.max_pending:
+            del pending[next(iter(pending))]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = registry.to_prometheus().encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body = json.dumps(registry.snapshot()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port=None, host='127.0.0.1'):
+    """
+    Serve /metrics (Prometheus text) and /metrics.json on a background thread.
+    Calling it again returns the running server.
+
+    The port defaults to METRICS_PORT from the environment, else DEFAULT_METRICS_PORT;
+    give each process on a host its own. Port 0 disables the endpoint. Returns None
+    when disabled or when the port cannot be bound (logged, not raised).
+    """
+    global _server
+    if _server is None:
+        if port is None:
+            port = int(os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT))
+        if not port:
+            return None
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.error("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            return None
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        logger.info("Metrics endpoint listening on http://%s:%s/metrics", host, port)
+    return _server
@@ -0,0 +1,121 @@
+# quote_store.py
+
+import threading
+import time
+
+import numpy as np
+
+# Columns of QuoteStore.book
+BID, ASK, BID_SIZE, ASK_SIZE, TIMESTAMP = range(5)
+
+
+class QuoteStore:
+    """
+    Latest top-of-book quote per symbol in one preallocated (symbol x field) array.
+
+    Each symbol owns a row that is overwritten in place on every quote. Reads,
+    writes and growing the array share one lock, held only for a row copy, so a
+    reader never sees a half-written quote and no write is lost to a regrow.
+
+    Parameters:
+    - capacity (int): Initial number of symbol rows.
+    - max_age (float): Seconds after which a quote is too stale to fill against.
+    """
+
+    def __init__(self, capacity=256, max_age=5.0):
+        self.max_age = max_age
+        self.rows = {}  # symbol -> row in book
+        self.book = np.full((capacity, 5), np.nan)
+        self.lock = threading.Lock()
+
+    def _row(self, symbol):
+        # Call with the lock held
+        row = self.rows.get(symbol)
+        if row is None:
+            row = len(self.rows)
+            if row == len(self.book):
+                grown = np.full((2 * len(self.book), 5), np.nan)
+                grown[:row] = self.book
+                self.book = grown
+            self.rows[symbol] = row
+        return row
+
+    def update(self, symbol, bid, ask, bid_size=0, ask_size=0, timestamp=None):
+        """
+        Record a quote; timestamp is epoch seconds, now if None.
+        """
+        quote = (bid, ask, bid_size, ask_size, time.time() if timestamp is None else timestamp)
+        with self.lock:
+            row = self._row(symbol)  # May replace self.book, so look it up after
+            self.book[row] = quote
+
+    def get(self, symbol):
+        """
+        Return (bid, ask, bid_size, ask_size, timestamp), or None if symbol was never quoted.
+        """
+        with self.lock:
+            row = self.rows.get(symbol)
+            if row is None:
+                return None
+            quote = self.book[row].tolist()
+        return tuple(quote)
+
+    def fresh(self, symbol, max_age=None):
+        """
+        Like get(), but None unless the quote is uncrossed and at most max_age seconds old.
+        """
+        quote = self.get(symbol)
+        if quote is None:
+            return None
+        bid, ask, _, _, timestamp = quote
+        max_age = self.max_age if max_age is None else max_age
+        if not (0 < bid <= ask) or time.time() - timestamp > max_age:
+            return None
+        return quote
+
+    def mid(self, symbol, max_age=None):
+        """
+        Midpoint of a fresh, uncrossed quote, or None.
+        """
+        quote = self.fresh(symbol, max_age)
+        return (quote[BID] + quote[ASK]) / 2 if quote is not None else None
+
+    def fill_price(self, symbol, side, max_age=None):
+        """
+        Price a marketable order crosses the spread at: the ask for a buy, the bid
+        for a sell. None without a fresh, uncrossed quote.
+        """
+        quote = self.fresh(symbol, max_age)
+        if quote is None:
+            return None
+        return quote[ASK] if side == 'buy' else quote[BID]
+
+    def snapshot(self):
+        with self.lock:
+            return {'symbols': len(self.rows), 'capacity': len(self.book)}
+
+
+def alpaca_quote_handler(quotes):
+    """
+    Return an alpaca_trade_api Stream quote callback that records into quotes.
+    """
+    async def on_quote(q):
+        # The stream casts the msgpack timestamp to integer nanoseconds; raw-data mode leaves a Timestamp
+        ts = q.timestamp
+        quotes.update(q.symbol, q.bid_price, q.ask_price, q.bid_size, q.ask_size,
+                      ts.timestamp() if hasattr(ts, 'timestamp') else ts / 1e9)
+
+    return on_quote
+
+
+def start_alpaca_quotes(quotes, symbols, data_feed="iex"):
+    """
+    Stream Alpaca quotes for symbols into quotes on a background thread; returns the Stream.
+    Credentials come from APCA_API_KEY_ID and APCA_API_SECRET_KEY.
+    """
+    from alpaca_trade_api.stream import Stream
+
+    stream = Stream(data_feed=data_feed)
+    stream.subscribe_quotes(alpaca_quote_handler(quotes), *symbols)
+    threading.Thread(target=stream.run, name="quote-stream", daemon=True).start()
+    return stream
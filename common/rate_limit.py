@@ -0,0 +1,209 @@
+# rate_limit.py
+
+import asyncio
+import functools
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: orders may drain a bucket completely, data requests must leave
+# a reserve behind so an order never waits for a burst of data calls to clear.
+ORDER = 0
+DATA = 1
+LANES = {ORDER: 'order', DATA: 'data'}
+DATA_RESERVE = 0.2  # Fraction of each bucket kept back for the order lane
+
+# (provider, endpoint): [(requests, per_seconds), ...] -- every bucket must have
+# a token for a request to go through.
+RATE_LIMITS = {
+    ('alpaca', 'trading'): [(200, 60)],
+    ('alpaca', 'data'): [(200, 60)],
+    ('fyers', 'default'): [(10, 1), (200, 60)],
+    ('yahoo', 'default'): [(5, 1), (2000, 3600)],
+}
+
+# Method routing for the clients used in this repo
+ALPACA_ENDPOINTS = {name: 'data' for name in (
+    'get_bars', 'get_barset', 'get_trades', 'get_quotes', 'get_latest_bar', 'get_latest_trade',
+    'get_latest_quote', 'get_snapshot', 'get_snapshots', 'get_news',
+)}
+ALPACA_ORDER_METHODS = ('submit_order', 'replace_order', 'cancel_order', 'cancel_all_orders',
+                        'close_position', 'close_all_positions')
+FYERS_ORDER_METHODS = ('place_order', 'place_basket_orders', 'modify_order', 'modify_basket_orders',
+                       'cancel_order', 'cancel_basket_orders', 'exit_positions')
+
+STATE_DIR = os.getenv("RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "algo_trading_rate_limits"))
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every process on the host.
+
+    Bucket state (tokens, last refill time) lives in a small file under
+    ``STATE_DIR`` and is updated under a file lock, so all workers draw from
+    one budget. Wait times are recorded per lane for this process.
+    """
+
+    def __init__(self, name, buckets, state_dir=STATE_DIR, data_reserve=DATA_RESERVE):
+        self.name = name
+        self.rates = [requests / per for requests, per in buckets]
+        self.capacities = [float(requests) for requests, _ in buckets]
+        self.data_reserve = data_reserve
+        self.format = 'd' * (2 * len(buckets))
+        os.makedirs(state_dir, exist_ok=True)
+        path = os.path.join(state_dir, f"{name}.bucket")
+        self.file_lock = FileLock(path + '.lock')
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.stats_lock = threading.Lock()
+        self.stats = {lane: {'calls': 0, 'waited': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+                      for lane in LANES.values()}
+
+    def _read(self, now):
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        raw = os.read(self.fd, struct.calcsize(self.format))
+        if len(raw) != struct.calcsize(self.format):
+            return list(self.capacities), [now] * len(self.capacities)
+        values = struct.unpack(self.format, raw)
+        return list(values[0::2]), list(values[1::2])
+
+    def _write(self, tokens, last):
+        values = [v for pair in zip(tokens, last) for v in pair]
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.write(self.fd, struct.pack(self.format, *values))
+
+    def try_acquire(self, tokens=1, priority=DATA):
+        """
+        Take tokens if available. Returns 0 on success, otherwise the number of
+        seconds until enough tokens should be available.
+        """
+        with self.file_lock:
+            now = time.time()
+            levels, last = self._read(now)
+            wait = 0.0
+            for i, (rate, capacity) in enumerate(zip(self.rates, self.capacities)):
+                # Wall clock, since the state is shared across processes; a step back refills nothing
+                levels[i] = min(capacity, levels[i] + max(now - last[i], 0.0) * rate)
+                last[i] = now
+                reserve = capacity * self.data_reserve if priority != ORDER else 0.0
+                shortfall = tokens + reserve - levels[i]
+                if shortfall > 0:
+                    wait = max(wait, shortfall / rate)
+            if wait == 0.0:
+                levels = [level - tokens for level in levels]
+            self._write(levels, last)
+            return wait
+
+    def acquire(self, tokens=1, priority=DATA, timeout=None):
+        """
+        Block until tokens are available. Raises RateLimitTimeout if that would
+        take longer than timeout seconds.
+        """
+        start = time.monotonic()
+        wait = self.try_acquire(tokens, priority)
+        while wait > 0:
+            waited = time.monotonic() - start
+            if timeout is not None and waited + wait > timeout:
+                raise RateLimitTimeout(f"{self.name}: no capacity within {timeout}s")
+            # Re-check at least once a second; other processes change the bucket too
+            time.sleep(min(wait, 1.0))
+            wait = self.try_acquire(tokens, priority)
+        self._record(priority, time.monotonic() - start)
+
+    async def acquire_async(self, tokens=1, priority=DATA):
+        """
+        acquire() for asyncio code: waits with asyncio.sleep instead of blocking the loop,
+        and takes the bucket's file lock on an executor thread.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        wait = await loop.run_in_executor(None, self.try_acquire, tokens, priority)
+        while wait > 0:
+            await asyncio.sleep(min(wait, 1.0))
+            wait = await loop.run_in_executor(None, self.try_acquire, tokens, priority)
+        self._record(priority, time.monotonic() - start)
+
+    def _record(self, priority, waited):
+        with self.stats_lock:
+            stats = self.stats[LANES[priority]]
+            stats['calls'] += 1
+            if waited > 0.001:
+                stats['waited'] += 1
+                stats['total_wait'] += waited
+                stats['max_wait'] = max(stats['max_wait'], waited)
+        if waited > 1:
+            logger.debug("Rate limiter %s delayed a %s request by %.2fs", self.name, LANES[priority], waited)
+
+    def metrics(self):
+        with self.stats_lock:
+            return {lane: dict(stats) for lane, stats in self.stats.items()}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider, endpoint='default'):
+    """
+    Return this process's limiter for provider/endpoint, configured from RATE_LIMITS.
+    """
+    key = (provider, endpoint)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(f"{provider}.{endpoint}", RATE_LIMITS[key])
+            _limiters[key] = limiter
+        return limiter
+
+
+def limiter_metrics():
+    with _limiters_lock:
+        return {limiter.name: limiter.metrics() for limiter in _limiters.values()}
+
+
+def rate_limited(client, provider, endpoints=None, order_methods=(), default_endpoint='default'):
+    """
+    Wrap a client so every method call first draws a token from its provider's budget.
+
+    Parameters:
+    - client: The API client to wrap (e.g. alpaca REST, FyersModel).
+    - provider (str): Provider key in RATE_LIMITS.
+    - endpoints (dict): Method name -> endpoint key; others use default_endpoint.
+    - order_methods (iterable): Method names that go through the order lane.
+    """
+    return _RateLimitedClient(client, provider, endpoints or {}, frozenset(order_methods), default_endpoint)
+
+
+class _RateLimitedClient:
+    def __init__(self, client, provider, endpoints, order_methods, default_endpoint):
+        self._client = client
+        self._provider = provider
+        self._endpoints = endpoints
+        self._order_methods = order_methods
+        self._default_endpoint = default_endpoint
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        limiter = get_limiter(self._provider, self._endpoints.get(name, self._default_endpoint))
+        priority = ORDER if name in self._order_methods else DATA
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            limiter.acquire(priority=priority)
+            return attr(*args, **kwargs)
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
@@ -0,0 +1,249 @@
+# resampler.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+TIMEFRAMES = {
+    '1m': 60 * 10**9,
+    '5m': 5 * 60 * 10**9,
+    '15m': 15 * 60 * 10**9,
+    '1h': 3600 * 10**9,
+    '1d': 86400 * 10**9,
+}
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class _Series:
+    """
+    Growable OHLCV columns (capacity doubles), so appends are amortized O(1)
+    and readers get zero-copy views.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.trimmed = False  # Oldest bars have been dropped
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.columns = {field: np.empty(capacity) for field in FIELDS}
+
+    def _reserve(self, size):
+        capacity = len(self.ts)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        ts = np.empty(capacity, dtype=np.int64)
+        ts[:self.size] = self.ts[:self.size]
+        self.ts = ts
+        for field, column in self.columns.items():
+            grown = np.empty(capacity)
+            grown[:self.size] = column[:self.size]
+            self.columns[field] = grown
+
+    def write(self, at, ts, columns):
+        """
+        Write bars starting at index ``at`` (<= size), dropping anything after them.
+        """
+        end = at + len(ts)
+        self._reserve(end)
+        self.ts[at:end] = ts
+        for field in FIELDS:
+            self.columns[field][at:end] = columns[field]
+        self.size = end
+
+    def drop(self, count):
+        """
+        Drop the oldest ``count`` bars, moving the rest to the front.
+        """
+        keep = self.size - count
+        self.ts[:keep] = self.ts[count:self.size]
+        for column in self.columns.values():
+            column[:keep] = column[count:self.size]
+        self.size = keep
+        self.trimmed = True
+
+    def view(self, start=0):
+        return self.ts[start:self.size], {field: column[start:self.size] for field, column in self.columns.items()}
+
+    @property
+    def nbytes(self):
+        return self.ts.nbytes + sum(column.nbytes for column in self.columns.values())
+
+
+def aggregate(ts, columns, timeframe_ns, origin_ns=0):
+    """
+    Aggregate bars into timeframe buckets in a handful of vectorized operations.
+
+    Returns (bucket_start_ts, columns) for every bucket touched by the input.
+    """
+    bucket = (ts - origin_ns) // timeframe_ns
+    starts = np.flatnonzero(np.diff(bucket)) + 1
+    starts = np.concatenate(([0], starts))
+    ends = np.concatenate((starts[1:], [len(ts)])) - 1
+    return bucket[starts] * timeframe_ns + origin_ns, {
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends],
+        'volume': np.add.reduceat(columns['volume'], starts),
+    }
+
+
+class _Derived:
+    __slots__ = ('series', 'base_start', 'version')
+
+    def __init__(self):
+        self.series = _Series(capacity=256)
+        self.base_start = 0  # Base index where the last (possibly still forming) bucket begins
+        self.version = -1
+
+
+class MultiTimeframeBars:
+    """
+    Base-resolution bars per symbol with lazily derived higher timeframes.
+
+    Derived OHLCV series are built on first access and memoized; when new base
+    bars arrive only the last, still-forming bucket and anything after it is
+    re-aggregated. Timestamps are bar starts in UTC nanoseconds.
+
+    Each series keeps its latest ``max_bars`` bars. The oldest are dropped once
+    a series is a quarter over the cap, so trimming stays amortized O(1). Base
+    bars still inside a derived series' forming bucket are never dropped, and a
+    timeframe first read after a trim starts at its first complete bucket.
+
+    Parameters:
+    - base (str): Base timeframe key in TIMEFRAMES.
+    - origin_ns (int): Bucket alignment offset, e.g. to align 1d buckets to a session open.
+    - max_bars (int): Bars kept per series (base and derived); None keeps everything.
+    """
+
+    def __init__(self, base='1m', origin_ns=0, max_bars=50_000):
+        self.base = base
+        self.origin_ns = origin_ns
+        self.max_bars = max_bars
+        self.lock = threading.Lock()
+        self.symbols = {}   # symbol -> (base _Series, version)
+        self.derived = {}   # (symbol, timeframe) -> _Derived
+
+    # ----------------------------
+    # Ingest
+    # ----------------------------
+    def extend(self, symbol, ts, open, high, low, close, volume):
+        """
+        Append base bars (arrays). Bars older than the last stored bar are ignored and
+        a bar with the same timestamp as the last one replaces it (an in-progress bar update).
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        columns = {'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume}
+        with self.lock:
+            series, version = self.symbols.get(symbol, (None, 0))
+            if series is None:
+                series = _Series()
+            at = series.size
+            if series.size:
+                last = series.ts[series.size - 1]
+                keep = ts >= last
+                ts = ts[keep]
+                columns = {field: np.asarray(values, dtype=np.float64)[keep] for field, values in columns.items()}
+                if len(ts) and ts[0] == last:
+                    at -= 1
+            if not len(ts):
+                return
+            series.write(at, ts, columns)
+            self.symbols[symbol] = (series, version + 1)
+            if self._over_cap(series):
+                self._trim(symbol, series, version + 1)
+
+    def append(self, symbol, ts, open, high, low, close, volume):
+        self.extend(symbol, [ts], [open], [high], [low], [close], [volume])
+
+    def extend_frame(self, symbol, frame):
+        """
+        Append bars from a yfinance/Alpaca-style DataFrame indexed by bar start time.
+        """
+        if frame.empty:
+            return
+        index = frame.index
+        if index.tz is not None:
+            index = index.tz_convert('UTC')
+        names = {column.lower(): column for column in frame.columns}
+        self.extend(symbol, index.asi8, *(frame[names[field]].to_numpy(dtype=np.float64) for field in FIELDS))
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+    def bars(self, symbol, timeframe):
+        """
+        Return (ts, {field: array}) views for symbol at timeframe. The views are
+        only valid until the next ingest for the symbol; copy them to keep them.
+        """
+        with self.lock:
+            series, version = self.symbols.get(symbol, (None, 0))
+            if series is None:
+                return np.empty(0, dtype=np.int64), {field: np.empty(0) for field in FIELDS}
+            if timeframe == self.base:
+                return series.view()
+            derived = self.derived.get((symbol, timeframe))
+            if derived is None:
+                derived = self.derived[(symbol, timeframe)] = _Derived()
+            if derived.version != version:
+                self._update(series, derived, TIMEFRAMES[timeframe])
+                derived.version = version
+            return derived.series.view()
+
+    def _over_cap(self, series):
+        return self.max_bars is not None and series.size > self.max_bars + self.max_bars // 4
+
+    def _trim(self, symbol, series, version):
+        # Bring derived series up to date first, so their forming buckets are known
+        count = series.size - self.max_bars
+        derived_series = [(TIMEFRAMES[timeframe], derived) for (owner, timeframe), derived in self.derived.items()
+                          if owner == symbol]
+        for timeframe_ns, derived in derived_series:
+            if derived.version != version:
+                self._update(series, derived, timeframe_ns)
+                derived.version = version
+            count = min(count, derived.base_start)
+        if count <= 0:
+            return
+        series.drop(count)
+        for _, derived in derived_series:
+            derived.base_start -= count
+
+    def _update(self, series, derived, timeframe_ns):
+        ts, columns = series.view(derived.base_start)
+        if not derived.series.size and series.trimmed:
+            # First built after older base bars were dropped: the first bucket may be missing some
+            buckets = (ts - self.origin_ns) // timeframe_ns
+            skip = int(np.searchsorted(buckets, buckets[0], side='right'))
+            if skip == len(ts):
+                return
+            derived.base_start += skip
+            ts, columns = series.view(derived.base_start)
+        bucket_ts, bucket_columns = aggregate(ts, columns, timeframe_ns, self.origin_ns)
+        # Overwrite the previously forming bucket, then append any new ones
+        at = max(derived.series.size - 1, 0)
+        derived.series.write(at, bucket_ts, bucket_columns)
+        last_bucket = (bucket_ts[-1] - self.origin_ns) // timeframe_ns
+        derived.base_start += int(np.searchsorted((ts - self.origin_ns) // timeframe_ns, last_bucket))
+        if self._over_cap(derived.series):
+            derived.series.drop(derived.series.size - self.max_bars)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'symbols': len(self.symbols),
+                'base_bars': sum(series.size for series, _ in self.symbols.values()),
+                'derived_series': len(self.derived),
+                'bytes': sum(series.nbytes for series, _ in self.symbols.values())
+                         + sum(derived.series.nbytes for derived in self.derived.values()),
+            }
+
+    def frame(self, symbol, timeframe):
+        """
+        Return a DataFrame (Open/High/Low/Close/Volume, UTC index) copy of bars().
+        """
+        ts, columns = self.bars(symbol, timeframe)
+        return pd.DataFrame({field.capitalize(): values.copy() for field, values in columns.items()},
+                            index=pd.to_datetime(ts, utc=True))
@@ -0,0 +1,190 @@
+# risk.py
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RiskEngine:
+    """
+    Portfolio exposure kept as running totals for constant-time pre-trade checks.
+
+    Each symbol carries its filled quantity, the quantity reserved by open
+    orders and its last price. A fill, price change or reservation touches only
+    that symbol and adjusts the gross/net/sector totals by the difference, so
+    nothing ever revalues the whole portfolio. Checks run against committed
+    exposure (filled + reserved), so open orders count against the limits
+    before they fill.
+
+    Parameters:
+    - max_gross (float): Limit on sum of |exposure| across symbols.
+    - max_net (float): Limit on |sum of exposure|.
+    - max_symbol (float): Limit on |exposure| in any one symbol.
+    - sector_limits (dict): Sector -> limit on gross exposure in that sector.
+    - sectors (dict): Symbol -> sector; unmapped symbols are not sector-limited.
+    """
+
+    def __init__(self, max_gross=None, max_net=None, max_symbol=None, sector_limits=None, sectors=None):
+        self.max_gross = max_gross
+        self.max_net = max_net
+        self.max_symbol = max_symbol
+        self.sector_limits = sector_limits or {}
+        self.sectors = sectors or {}
+        self.lock = threading.RLock()
+        self.quantities = {}      # symbol -> filled quantity (signed)
+        self.reserved = {}        # symbol -> quantity reserved by open orders (signed)
+        self.prices = {}          # symbol -> last price
+        self.exposure = {}        # symbol -> filled exposure
+        self.committed = {}       # symbol -> filled + reserved exposure
+        self.orders = {}          # order id -> (symbol, remaining reserved quantity)
+        self.gross = 0.0
+        self.net = 0.0
+        self.committed_gross = 0.0
+        self.committed_net = 0.0
+        self.sector_gross = {}    # sector -> committed gross exposure
+
+    # ----------------------------
+    # Updates
+    # ----------------------------
+    def _revalue(self, symbol):
+        price = self.prices.get(symbol)
+        if price is None:
+            return
+        exposure = self.quantities.get(symbol, 0) * price
+        committed = exposure + self.reserved.get(symbol, 0) * price
+        old_exposure = self.exposure.get(symbol, 0.0)
+        old_committed = self.committed.get(symbol, 0.0)
+        self.exposure[symbol] = exposure
+        self.committed[symbol] = committed
+        self.gross += abs(exposure) - abs(old_exposure)
+        self.net += exposure - old_exposure
+        self.committed_gross += abs(committed) - abs(old_committed)
+        self.committed_net += committed - old_committed
+        sector = self.sectors.get(symbol)
+        if sector is not None:
+            self.sector_gross[sector] = self.sector_gross.get(sector, 0.0) + abs(committed) - abs(old_committed)
+
+    def on_price(self, symbol, price):
+        with self.lock:
+            self.prices[symbol] = price
+            self._revalue(symbol)
+
+    def on_fill(self, symbol, quantity, price, order_id=None):
+        """
+        Apply a fill of signed quantity (negative for sells). If order_id holds a
+        reservation, the filled part is released from it.
+        """
+        with self.lock:
+            self.quantities[symbol] = self.quantities.get(symbol, 0) + quantity
+            if order_id in self.orders:
+                _, remaining = self.orders[order_id]
+                filled = quantity if abs(quantity) < abs(remaining) else remaining
+                self.reserved[symbol] -= filled
+                remaining -= filled
+                if remaining:
+                    self.orders[order_id] = (symbol, remaining)
+                else:
+                    del self.orders[order_id]
+            self.prices[symbol] = price
+            self._revalue(symbol)
+
+    def reserve(self, order_id, symbol, quantity, price=None):
+        """
+        Count an open order's signed quantity against the limits until it fills or is released.
+        """
+        with self.lock:
+            self.orders[order_id] = (symbol, quantity)
+            self.reserved[symbol] = self.reserved.get(symbol, 0) + quantity
+            if price is not None and symbol not in self.prices:
+                self.prices[symbol] = price
+            self._revalue(symbol)
+
+    def release(self, order_id):
+        """
+        Drop what is left of an order's reservation (cancelled, rejected or done).
+        """
+        with self.lock:
+            reservation = self.orders.pop(order_id, None)
+            if reservation is None:
+                return
+            symbol, remaining = reservation
+            self.reserved[symbol] -= remaining
+            self._revalue(symbol)
+
+    def rekey(self, order_id, new_id):
+        """
+        Move an order's reservation to a new id, e.g. the broker's once the order is acknowledged.
+        """
+        with self.lock:
+            if order_id in self.orders:
+                self.orders[new_id] = self.orders.pop(order_id)
+
+    def load_positions(self, positions):
+        """
+        Reset filled quantities from {symbol: (quantity, price)}, keeping open reservations.
+        """
+        with self.lock:
+            for symbol in set(self.quantities) - set(positions):
+                self.quantities[symbol] = 0
+                self._revalue(symbol)
+            for symbol, (quantity, price) in positions.items():
+                self.quantities[symbol] = quantity
+                if price:
+                    self.prices[symbol] = price
+                self._revalue(symbol)
+
+    # ----------------------------
+    # Checks
+    # ----------------------------
+    def check(self, symbol, quantity, price=None):
+        """
+        Return None if an order for signed quantity passes every limit,
+        otherwise a string naming the limit it would breach.
+
+        Orders that reduce an exposure which is already over a limit are allowed.
+        """
+        with self.lock:
+            price = price or self.prices.get(symbol)
+            if price is None:
+                return f"no price for {symbol}"
+            sector = self.sectors.get(symbol)
+            # Totals without this symbol. A symbol never valued (no price yet) is not in
+            # them at all, so its existing quantities are added at this price, not removed.
+            if symbol in self.committed:
+                old = self.committed[symbol]
+                other_gross = self.committed_gross - abs(old)
+                other_net = self.committed_net - old
+                other_sector = self.sector_gross.get(sector, 0.0) - abs(old)
+            else:
+                old = (self.quantities.get(symbol, 0) + self.reserved.get(symbol, 0)) * price
+                other_gross = self.committed_gross
+                other_net = self.committed_net
+                other_sector = self.sector_gross.get(sector, 0.0)
+            new = old + quantity * price
+            grows = abs(new) > abs(old)
+            if self.max_symbol is not None and grows and abs(new) > self.max_symbol:
+                return f"{symbol} exposure {abs(new):.2f} > {self.max_symbol:.2f}"
+            gross = other_gross + abs(new)
+            if self.max_gross is not None and grows and gross > self.max_gross:
+                return f"gross exposure {gross:.2f} > {self.max_gross:.2f}"
+            net = other_net + new
+            if self.max_net is not None and abs(net) > abs(other_net + old) and abs(net) > self.max_net:
+                return f"net exposure {abs(net):.2f} > {self.max_net:.2f}"
+            limit = self.sector_limits.get(sector)
+            if limit is not None and grows:
+                sector_gross = other_sector + abs(new)
+                if sector_gross > limit:
+                    return f"sector {sector} exposure {sector_gross:.2f} > {limit:.2f}"
+            return None
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'gross': self.gross,
+                'net': self.net,
+                'committed_gross': self.committed_gross,
+                'committed_net': self.committed_net,
+                'open_orders': len(self.orders),
+                'sector_gross': dict(self.sector_gross),
+            }
@@ -0,0 +1,95 @@
+# scanner.py
+
+import numpy as np
+import pandas as pd
+
+from common.indicators import true_range
+
+
+def align(frames):
+    """
+    Stack per-symbol bar DataFrames (Open/High/Low/Close columns, either case) into
+    (time x symbol) close, high and low matrices on the union of their indexes.
+
+    Gaps after a symbol's first bar are forward-filled; rows before it stay NaN.
+    Returns (close, high, low, symbols).
+    """
+    symbols = list(frames)
+    matrices = []
+    for field in ('close', 'high', 'low'):
+        columns = {}
+        for symbol, frame in frames.items():
+            names = {column.lower(): column for column in frame.columns}
+            columns[symbol] = frame[names[field]]
+        matrices.append(pd.DataFrame(columns).sort_index().ffill()[symbols].to_numpy(dtype=np.float64))
+    return (*matrices, symbols)
+
+
+def scan(close, high, low, symbols, cash, positions=None, short_window=50, long_window=200,
+         atr_period=14, atr_multiplier=1.5, risk_per_trade=0.01, top=None):
+    """
+    Evaluate the EnhancedMLTrader rules for a whole universe at the latest bar.
+
+    Only the trailing windows are read: each SMA is one column-wise mean over
+    the last ``window`` rows (and the row before, for crossovers), and the ATR
+    is a mean over the last ``atr_period`` true ranges. The cost is
+    O(long_window x symbols) whatever the history length. Symbols with NaN in
+    their windows (not enough history) produce no candidate.
+
+    Parameters:
+    - close, high, low (array): (time x symbol) daily bars, oldest row first.
+    - symbols (list): Column labels.
+    - cash (float): Cash used for risk-based sizing, as in position_sizing.
+    - positions (dict): Symbol -> held quantity; held symbols can only produce sells.
+    - top (int): Keep only the first top candidates.
+
+    Returns a list of candidate dicts ranked with fresh crossovers first, then
+    by trend strength |short SMA - long SMA| / ATR, strongest first.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    positions = positions or {}
+    if len(close) < max(long_window, short_window, atr_period) + 1:
+        raise ValueError(f"Need at least {max(long_window, short_window, atr_period) + 1} bars, got {len(close)}")
+
+    price = close[-1]
+    short = close[-short_window:].mean(axis=0)
+    long_ = close[-long_window:].mean(axis=0)
+    short_prev = close[-short_window - 1:-1].mean(axis=0)
+    long_prev = close[-long_window - 1:-1].mean(axis=0)
+    rows = slice(-atr_period - 1, None)
+    atr = true_range(high[rows], low[rows], close[rows])[1:].mean(axis=0)
+
+    stop_distance = atr * atr_multiplier
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quantity = np.floor(cash * risk_per_trade / stop_distance / price)
+        strength = (short - long_) / atr
+    crossed = ((short_prev <= long_prev) & (short > long_)) | ((short_prev >= long_prev) & (short < long_))
+    held = np.array([positions.get(symbol, 0) > 0 for symbol in symbols], dtype=bool)
+    valid = np.isfinite(strength) & (stop_distance > 0)
+    buy = valid & (short > long_) & ~held & (quantity > 0)
+    sell = valid & (short < long_) & held
+
+    candidates = np.flatnonzero(buy | sell)
+    # lexsort orders by its last key first: crossovers, then strength
+    candidates = candidates[np.lexsort((-np.abs(strength[candidates]), ~crossed[candidates]))][:top]
+
+    results = []
+    for i in candidates.tolist():
+        is_buy = bool(buy[i])
+        last, distance = float(price[i]), float(stop_distance[i])
+        results.append({
+            'symbol': symbols[i],
+            'side': 'buy' if is_buy else 'sell',
+            'quantity': int(quantity[i]) if is_buy else positions[symbols[i]],
+            'price': last,
+            'short_sma': float(short[i]),
+            'long_sma': float(long_[i]),
+            'atr': float(atr[i]),
+            'stop_loss': last - distance if is_buy else last + distance,
+            'take_profit': last + 3 * float(atr[i]) if is_buy else last - 3 * float(atr[i]),
+            'strength': float(strength[i]),
+            'crossed': bool(crossed[i]),
+        })
+    return results
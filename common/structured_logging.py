@@ -0,0 +1,105 @@
+# structured_logging.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Format records as compact JSON lines, including any ``extra=`` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keep every ``every``-th DEBUG record per call site; other levels always pass.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self.counts = {}
+        self.lock = threading.Lock()  # Records are filtered on the calling threads
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        site = (record.pathname, record.lineno)
+        with self.lock:
+            count = self.counts.get(site, 0)
+            self.counts[site] = count + 1
+        return count % self.every == 0
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the message before enqueueing, i.e. on the
+    # calling thread. The queue never leaves the process, so hand the record
+    # over untouched and let the listener thread do all formatting.
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+
+
+def configure_logging(level=logging.INFO, json_lines=True, filename=None, debug_sample_every=1,
+                      fmt='%(asctime)s %(levelname)s %(name)s: %(message)s'):
+    """
+    Route all logging through a queue to a background thread that formats and writes it.
+
+    Parameters:
+    - level (int): Root log level.
+    - json_lines (bool): Write JSON lines instead of plain text records.
+    - filename (str): Log file to write to; stderr if None.
+    - debug_sample_every (int): Keep one in N DEBUG records per call site.
+    - fmt (str): Format for plain text records.
+
+    Records are formatted after the call returns, so mutable objects passed as
+    log arguments should not be changed afterwards. Calling it again (e.g. on a
+    Streamlit rerun) keeps the existing listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handler = logging.FileHandler(filename) if filename else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(fmt))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(debug_sample_every))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued on interpreter exit
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,321 @@
+# telemetry.py
+
+import gc
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 60.0
+
+
+def rss_bytes():
+    """
+    Return (current, peak) resident set size in bytes; peak is 0 where unknown.
+    """
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        current = info.rss
+        peak = getattr(info, 'peak_wset', 0)  # Windows only
+    except ImportError:
+        current = 0
+        try:
+            with open('/proc/self/statm') as statm:
+                current = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            pass
+        peak = 0
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = maxrss if sys.platform == 'darwin' else maxrss * 1024
+    except ImportError:
+        pass
+    return current, max(peak, current)
+
+
+def thread_counts():
+    """
+    Live threads grouped by name with numbering stripped, e.g. "Thread (worker)".
+    """
+    counts = {}
+    for thread in threading.enumerate():
+        name = re.sub(r'[-_ ]?\d+', '', thread.name) or 'unnamed'
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def pyplot_figures():
+    """
+    Open pyplot figures (plt.figure() without plt.close()); 0 if pyplot was never imported.
+    """
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    return len(pyplot.get_fignums()) if pyplot is not None else 0
+
+
+def _numbers(values, prefix=''):
+    # Flatten nested dicts to {"a.b": number}, dropping non-numeric leaves
+    if isinstance(values, dict):
+        flat = {}
+        for key, value in values.items():
+            flat.update(_numbers(value, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(values, (int, float)) and not isinstance(values, bool):
+        return {prefix: values}
+    return {}
+
+
+def _megabytes(value):
+    return f"{value / 2 ** 20:,.1f} MB"
+
+
+class ResourceMonitor:
+    """
+    Samples process memory and the size of tracked structures on a background thread.
+
+    Each sample records RSS, live threads, GC counters, the size of every
+    tracked structure (open pyplot figures are always tracked) and, with
+    tracemalloc on, traced memory and the top allocating source lines. snapshot() returns the latest sample for the
+    metrics endpoint; report() diffs the current state against a baseline
+    (taken at start(), or at the last mark()) to show what grew.
+
+    tracemalloc slows allocation-heavy code noticeably and counting object
+    types walks the whole heap, so both are off by default.
+
+    Parameters:
+    - interval (float): Seconds between samples.
+    - trace_frames (int): Frames tracemalloc keeps per allocation; 0 leaves it off.
+    - top (int): Allocation sites and object types listed in samples and reports.
+    - count_types (bool): Count live objects by type (gc.get_objects) in each sample.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, trace_frames=0, top=10, count_types=False):
+        self.interval = interval
+        self.trace_frames = trace_frames
+        self.top = top
+        self.count_types = count_types
+        self.lock = threading.Lock()
+        self.structures = {'pyplot_figures': pyplot_figures}  # name -> callable returning a size or dict of sizes
+        self.started = time.monotonic()
+        self.latest = None
+        self.baseline = None
+        self.baseline_trace = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def track(self, name, size):
+        """
+        Include a structure in each sample. size() returns a number or a (nested) dict of numbers,
+        e.g. ``monitor.track('paper', trader.sizes)``.
+        """
+        with self.lock:
+            self.structures[name] = size
+
+    # ----------------------------
+    # Sampling
+    # ----------------------------
+    def sample(self):
+        """
+        Take a sample now, store it as the latest and return it.
+        """
+        start = time.perf_counter()
+        current, peak = rss_bytes()
+        threads = thread_counts()
+        generations = gc.get_stats()
+        sample = {
+            'uptime_seconds': time.monotonic() - self.started,
+            'rss_bytes': current,
+            'peak_rss_bytes': peak,
+            'threads': {'count': sum(threads.values()), 'by_name': threads},
+            'gc': {
+                'pending': dict(enumerate(gc.get_count())),
+                'collections': {i: stats['collections'] for i, stats in enumerate(generations)},
+                'collected': sum(stats['collected'] for stats in generations),
+                'uncollectable': sum(stats['uncollectable'] for stats in generations),
+                'garbage': len(gc.garbage),
+            },
+            'structures': self._structure_sizes(),
+        }
+        if self.count_types:
+            sample['types'] = self._type_counts()
+        if tracemalloc.is_tracing():
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            statistics = self._trace_snapshot().statistics('lineno')[:self.top]
+            sample['tracemalloc'] = {
+                'traced_bytes': traced,
+                'peak_traced_bytes': traced_peak,
+                # Lists are left out of the Prometheus output and kept in /metrics.json
+                'top': [{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                         'size_bytes': stat.size, 'count': stat.count} for stat in statistics],
+            }
+        sample['sample_seconds'] = time.perf_counter() - start
+        with self.lock:
+            self.latest = sample
+        return sample
+
+    def _structure_sizes(self):
+        with self.lock:
+            structures = list(self.structures.items())
+        sizes = {}
+        for name, size in structures:
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                logger.error("Telemetry size of %s failed: %s", name, e)
+        return sizes
+
+    def _type_counts(self):
+        counts = {}
+        for obj in gc.get_objects():
+            name = type(obj).__name__
+            counts[name] = counts.get(name, 0) + 1
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True)[:self.top])
+
+    def _trace_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def snapshot(self):
+        """
+        Latest sample, for registry.add_collector. Samples once if the thread has not yet.
+        """
+        with self.lock:
+            latest = self.latest
+        return latest if latest is not None else self.sample()
+
+    # ----------------------------
+    # Background thread
+    # ----------------------------
+    def start(self):
+        if self.trace_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+        if self.baseline is None:
+            self.mark()
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error("Telemetry sample failed: %s", e)
+
+    # ----------------------------
+    # Diff reports
+    # ----------------------------
+    def mark(self):
+        """
+        Make the current state the baseline later reports are diffed against.
+        """
+        baseline = self.sample()
+        trace = self._trace_snapshot() if tracemalloc.is_tracing() else None
+        with self.lock:
+            self.baseline, self.baseline_trace = baseline, trace
+
+    def report(self):
+        """
+        Return a text report of what grew since the baseline: RSS, threads, GC
+        counters, tracked structures and, with tracemalloc on, allocation sites.
+        """
+        with self.lock:
+            baseline, baseline_trace = self.baseline, self.baseline_trace
+        current = self.sample()
+        if baseline is None:
+            baseline = current
+        elapsed = current['uptime_seconds'] - baseline['uptime_seconds']
+        lines = [
+            f"Memory report, {elapsed / 60:.1f} min since baseline",
+            f"RSS {_megabytes(current['rss_bytes'])} "
+            f"({'+' if current['rss_bytes'] >= baseline['rss_bytes'] else '-'}"
+            f"{_megabytes(abs(current['rss_bytes'] - baseline['rss_bytes']))}), "
+            f"peak {_megabytes(current['peak_rss_bytes'])}",
+            f"GC uncollectable {current['gc']['uncollectable']}, garbage {current['gc']['garbage']}",
+        ]
+        for title, key in (("Threads", 'threads'), ("Structures", 'structures'), ("Object types", 'types')):
+            lines.extend(self._diff_lines(title, baseline.get(key, {}), current.get(key, {})))
+        if baseline_trace is not None and tracemalloc.is_tracing():
+            lines.append("Allocation growth (tracemalloc):")
+            for stat in self._trace_snapshot().compare_to(baseline_trace, 'lineno')[:self.top]:
+                frame = stat.traceback[0]
+                lines.append(f"  {frame.filename}:{frame.lineno}  {_megabytes(stat.size)} "
+                             f"({stat.size_diff / 2 ** 20:+,.1f} MB, {stat.count_diff:+,} blocks)")
+        return "\n".join(lines)
+
+    def _diff_lines(self, title, before, after):
+        before, after = _numbers(before), _numbers(after)
+        changes = sorted(((after.get(name, 0) - before.get(name, 0), name) for name in before.keys() | after.keys()),
+                         key=lambda change: abs(change[0]), reverse=True)
+        lines = [f"{title}:"]
+        for delta, name in changes[:self.top]:
+            if delta:
+                lines.append(f"  {name}  {before.get(name, 0):,} -> {after.get(name, 0):,} ({delta:+,})")
+        return lines if len(lines) > 1 else []
+
+    def log_report(self):
+        report = self.report()
+        logger.info(report)
+        return report
+
+    def report_on_signal(self, signum=None):
+        """
+        Log a report whenever the process receives signum (SIGUSR1 by default), e.g.
+        ``kill -USR1 <pid>``. Returns False where signals cannot be installed
+        (Windows, or outside the main thread).
+        """
+        import signal
+
+        signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return False
+        # The handler runs between bytecodes of the main thread; report from a thread instead
+        signal.signal(signum, lambda *_: threading.Thread(target=self.log_report, name="telemetry-report",
+                                                          daemon=True).start())
+        return True
+
+
+def monitor_from_env(structures=None):
+    """
+    Start a ResourceMonitor exporting to the metrics registry as 'telemetry', if
+    TELEMETRY_INTERVAL (seconds) is set; otherwise return None.
+
+    TELEMETRY_TRACEMALLOC=<frames> also traces allocations, and TELEMETRY_TYPES=1
+    counts live objects by type. A report is logged on SIGUSR1 where supported.
+
+    Parameters:
+    - structures (dict): name -> size callable, passed to track().
+    """
+    interval = float(os.getenv("TELEMETRY_INTERVAL") or 0)
+    if interval <= 0:
+        return None
+    from common.metrics import registry
+
+    monitor = ResourceMonitor(interval=interval,
+                              trace_frames=int(os.getenv("TELEMETRY_TRACEMALLOC") or 0),
+                              count_types=os.getenv("TELEMETRY_TYPES", "") not in ("", "0"))
+    for name, size in (structures or {}).items():
+        monitor.track(name, size)
+    monitor.start()
+    registry.add_collector('telemetry', monitor.snapshot)
+    monitor.report_on_signal()
+    logger.info("Telemetry sampling every %ss", interval)
+    return monitor
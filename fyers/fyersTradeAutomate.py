@@ -1,23 +1,39 @@
 # fyers_algo_trader.py
 
-from fyers_apiv3 import fyersModel
 from fyers_apiv3 import fyersModel
 import webbrowser
-import os
 import time
+from token_manager import TokenManager
+from order_book import OrderBookMirror, OPEN_STATUSES
+from quote_coalescer import QuoteCoalescer
+
+from common.rate_limit import rate_limited, FYERS_ORDER_METHODS
+from common.metrics import AckTimer, registry, timer, start_metrics_server
+from common.risk import RiskEngine
+from common.telemetry import monitor_from_env
 
 class FyersAlgoTrader:
-    def __init__(self, client_id, secret_key, redirect_uri):
+    def __init__(self, client_id, secret_key, redirect_uri, pin=None, token_file='fyers_token.json', risk=None):
         self.client_id = client_id
         self.secret_key = secret_key
         self.redirect_uri = redirect_uri
         self.access_token = None
         self.fyers = None
-        self.token_file = 'access_token.txt'
+        self.order_book = None
+        # Batches concurrent get_market_quote calls into multi-symbol requests, with a short cache
+        self.quote_coalescer = None
+        # Optional RiskEngine: pre-trade limit checks, kept current from quotes and order events
+        self.risk = risk
+        # Order placed to first order-socket event for it
+        self.broker_ack = AckTimer("fyers.broker_ack")
+        self.token_file = token_file
+        # Shared, file-locked token store; refreshes before expiry without a browser login
+        self.token_manager = TokenManager(client_id, secret_key, pin=pin, token_file=token_file,
+                                          on_refresh=self._on_token_refresh)
 
     def generate_auth_code(self):
         # Generate the auth code URL
-        session = fyersModel(
+        session = fyersModel.SessionModel(
             client_id=self.client_id,
             secret_key=self.secret_key,
             redirect_uri=self.redirect_uri,
@@ -36,48 +52,81 @@ class FyersAlgoTrader:
 
     def generate_access_token(self, auth_code):
         # Generate the access token using the auth code
-        session = accessToken.SessionModel(
+        session = fyersModel.SessionModel(
             client_id=self.client_id,
             secret_key=self.secret_key,
             redirect_uri=self.redirect_uri,
+            response_type='code',
             grant_type='authorization_code',
         )
         session.set_token(auth_code)
         response = session.generate_token()
         if response["code"] == 200:
             self.access_token = response["access_token"]
-            # Save the access token to a file for future use
-            with open(self.token_file, 'w') as f:
-                f.write(self.access_token)
+            # Save the access and refresh tokens for future use
+            self.token_manager.store(response)
             print("Access token generated and saved.")
         else:
             print("Error generating access token:", response)
 
     def load_access_token(self):
-        # Load access token from file if it exists
-        if os.path.exists(self.token_file):
-            with open(self.token_file, 'r') as f:
-                self.access_token = f.read()
+        # Load access token from the token file, refreshing it if it is about to expire
+        self.access_token = self.token_manager.get_access_token()
+        if self.access_token:
             print("Access token loaded from file.")
         else:
-            print("Access token file not found. Please generate a new one.")
+            print("No valid access token found. Please generate a new one.")
+
+    def start_token_refresh(self):
+        # Keep the access token fresh in the background for long-running workers
+        self.token_manager.start()
+
+    def _on_token_refresh(self, access_token):
+        self.access_token = access_token
+        if self.fyers is not None:
+            self.initialize_fyers()
+        if self.order_book is not None and self.order_book.socket is not None:
+            # Reconnect the order stream with the new token; reconnecting reseeds the mirror
+            self.order_book.close()
+            self.order_book.connect(f"{self.client_id}:{self.access_token}")
 
     def initialize_fyers(self):
         if self.access_token is None:
             self.load_access_token()
         if self.access_token:
-            self.fyers = fyersModel.FyersModel(
+            self.fyers = rate_limited(fyersModel.FyersModel(
                 client_id=self.client_id,
                 token=self.access_token,
                 log_path="",
                 is_async=False
-            )
+            ), 'fyers', order_methods=FYERS_ORDER_METHODS)
+            if self.order_book is None:
+                self.order_book = OrderBookMirror(self.fyers)
+                self.order_book.on_update = lambda order: self.broker_ack.acked(order['id'])
+                if self.risk is not None:
+                    self.order_book.on_fill = self._on_fill
+                    self.order_book.on_order_closed = self._on_order_closed
+                    self.order_book.on_seeded = self._on_order_book_seeded
+            else:
+                self.order_book.fyers = self.fyers
+            if self.quote_coalescer is None:
+                self.quote_coalescer = QuoteCoalescer(self.fyers)
+            else:
+                self.quote_coalescer.fyers = self.fyers
         else:
             print("Access token is not available. Please generate an access token.")
 
+    @timer("fyers.place_order")
     def place_order(self, symbol, qty, order_type, side, productType,
                     limitPrice=0, stopPrice=0, validity="DAY", disclosedQty=0,
                     offlineOrder=False, stopLoss=0, takeProfit=0, trailing_stop_loss=None, orderTag=""):
+        signed_qty = qty if side == 1 else -qty
+        if self.risk is not None:
+            reason = self.risk.check(symbol, signed_qty, limitPrice or None)
+            if reason:
+                response = {"s": "error", "code": -1, "message": f"Rejected by risk engine: {reason}"}
+                print("Place Order Response:", response)
+                return response
         data = {
             "symbol": symbol,
             "qty": qty,
@@ -94,10 +143,17 @@ class FyersAlgoTrader:
             "trailing_stop_loss": trailing_stop_loss,
             "orderTag": orderTag
         }
+        submitted_at = time.perf_counter_ns()
         response = self.fyers.place_order(data)
         print("Place Order Response:", response)
+        if response.get('s') == 'ok' and response.get('id'):
+            self.broker_ack.submitted(response['id'], submitted_at)
+            self.order_book.track_order(response['id'], data)
+            if self.risk is not None:
+                self.risk.reserve(response['id'], symbol, signed_qty, limitPrice or None)
         return response
 
+    @timer("fyers.modify_order")
     def modify_order(self, order_id, order_type, limitPrice, qty):
         data = {
             "id": order_id,
@@ -109,6 +165,7 @@ class FyersAlgoTrader:
         print("Modify Order Response:", response)
         return response
 
+    @timer("fyers.cancel_order")
     def cancel_order(self, order_id):
         data = {
             "id": order_id
@@ -117,6 +174,7 @@ class FyersAlgoTrader:
         print("Cancel Order Response:", response)
         return response
 
+    @timer("fyers.exit_position")
     def exit_position(self, position_id):
         data = {
             "id": position_id
@@ -125,17 +183,73 @@ class FyersAlgoTrader:
         print("Exit Position Response:", response)
         return response
 
+    @timer("fyers.get_positions")
     def get_positions(self):
         response = self.fyers.positions()
         return response
 
+    def start_order_stream(self):
+        # The mirror seeds itself from REST when the socket connects, then follows push events
+        self.order_book.connect(f"{self.client_id}:{self.access_token}")
+
+    def get_position(self, symbol):
+        """
+        Return the net position for symbol, or None if there is none.
+        Reads the local mirror when the order stream is live, otherwise calls REST.
+        Raises RuntimeError if the REST call fails.
+        """
+        if self.order_book is not None and self.order_book.connected:
+            return self.order_book.get_position(symbol)
+        positions = self.get_positions()
+        if positions['s'] != 'ok':
+            raise RuntimeError(f"Error fetching positions: {positions}")
+        return next((pos for pos in positions['netPositions'] if pos['symbol'] == symbol), None)
+
+    def mark_to_market(self, symbol, position):
+        """
+        Return the position's P&L at the latest traded price, or None if no quote is available.
+        REST positions carry a live 'pl'; mirrored positions are marked to a fresh quote,
+        since the mirror's 'pl' only changes on fills.
+        """
+        if self.order_book is None or not self.order_book.connected:
+            return float(position['pl'])
+        quote = self.get_market_quote(symbol)
+        if quote.get('s') != 'ok' or quote['d'][0].get('s') != 'ok':
+            return None
+        ltp = quote['d'][0]['v']['lp']
+        return (float(position.get('realized_profit', 0))
+                + (ltp - float(position.get('netAvg', 0))) * position.get('netQty', 0))
+
+    @timer("fyers.get_market_quote")
     def get_market_quote(self, symbol):
-        data = {
-            "symbols": symbol
-        }
-        response = self.fyers.quotes(data)
+        """
+        Quote one symbol, a comma-separated string or a list of symbols. Concurrent
+        callers share batched requests; quotes younger than the cache TTL are not refetched.
+        """
+        symbols = symbol.split(",") if isinstance(symbol, str) else list(symbol)
+        response = self.quote_coalescer.get(symbols)
+        if self.risk is not None and response.get('s') == 'ok':
+            for quote in response['d']:
+                if quote.get('s') == 'ok':
+                    self.risk.on_price(quote['n'], quote['v']['lp'])
         return response
 
+    def _on_fill(self, trade):
+        qty = trade['tradedQty'] if trade['side'] == 1 else -trade['tradedQty']
+        self.risk.on_fill(trade['symbol'], qty, trade['tradePrice'], order_id=trade.get('orderNumber'))
+
+    def _on_order_closed(self, order):
+        self.risk.release(order['id'])
+
+    def _on_order_book_seeded(self, order_book):
+        # Re-base positions on the broker's view and drop reservations for orders that closed meanwhile
+        self.risk.load_positions({symbol: (position.get('netQty', 0), position.get('ltp'))
+                                  for symbol, position in order_book.positions.items()})
+        for order_id in list(self.risk.orders):
+            order = order_book.get_order(order_id)
+            if order is not None and order.get('status') not in OPEN_STATUSES:
+                self.risk.release(order_id)
+
     def automated_trading_strategy(self, symbol, qty, target_profit_percent, stop_loss_percent, check_interval=60):
         """
         Automated trading strategy:
@@ -180,15 +294,17 @@ class FyersAlgoTrader:
         position_closed = False
         while not position_closed:
             time.sleep(check_interval)
-            positions = self.get_positions()
-            if positions['s'] != 'ok':
-                print("Error fetching positions:", positions)
-                continue
-
             # Find the position for the symbol
-            position = next((pos for pos in positions['netPositions'] if pos['symbol'] == symbol), None)
+            try:
+                position = self.get_position(symbol)
+            except RuntimeError as e:
+                print(e)
+                continue
             if position:
-                pl = float(position['pl'])
+                pl = self.mark_to_market(symbol, position)
+                if pl is None:
+                    print(f"No quote for {symbol}; retrying.")
+                    continue
                 print(f"Current P&L for {symbol}: {pl:.2f}")
                 # Check if target profit or stop loss is reached
                 if pl >= (current_price * qty * target_profit_percent / 100):
@@ -211,8 +327,11 @@ if __name__ == "__main__":
     client_id = "Your_Client_ID"
     secret_key = "Your_Secret_Key"
     redirect_uri = "Your_Redirect_URI"
+    pin = "Your_PIN"  # Needed to refresh the access token without a browser login
 
-    trader = FyersAlgoTrader(client_id, secret_key, redirect_uri)
+    trader = FyersAlgoTrader(client_id, secret_key, redirect_uri, pin=pin,
+                             risk=RiskEngine(max_gross=500000, max_symbol=100000))
+    registry.add_collector('risk', trader.risk.snapshot)
 
     # Load or generate access token
     trader.load_access_token()
@@ -222,8 +341,15 @@ if __name__ == "__main__":
         # Generate access token
         trader.generate_access_token(auth_code)
 
-    # Initialize Fyers API
+    # Initialize Fyers API and keep the token refreshed while we trade
     trader.initialize_fyers()
+    registry.add_collector('quotes', trader.quote_coalescer.metrics)
+    trader.start_token_refresh()
+    trader.start_order_stream()
+    # Broker call latencies at http://127.0.0.1:$METRICS_PORT/metrics (Prometheus) and /metrics.json
+    start_metrics_server()
+    # Opt-in memory sampling: set TELEMETRY_INTERVAL; `kill -USR1 <pid>` logs a diff report
+    monitor_from_env({'order_book': trader.order_book.snapshot})
 
     # Automated trading strategy example
     # Replace with your own parameters
@@ -0,0 +1,237 @@
+# order_book.py
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fyers order status codes
+CANCELLED = 1
+TRADED = 2
+TRANSIT = 4
+REJECTED = 5
+PENDING = 6
+OPEN_STATUSES = {TRANSIT, PENDING}
+CLOSED_STATUSES = {CANCELLED, TRADED, REJECTED}
+# An order moves from transit to pending to a closed status, never back
+_STATUS_RANK = {TRANSIT: 0, PENDING: 1, CANCELLED: 2, TRADED: 2, REJECTED: 2}
+
+
+def _is_stale(existing, update):
+    # Pushes queued while the mirror was seeding can be older than the REST order book
+    old, new = existing.get('status'), update.get('status')
+    if new is not None:
+        if old in CLOSED_STATUSES and new != old:
+            return True
+        if _STATUS_RANK.get(new, 0) < _STATUS_RANK.get(old, 0):
+            return True
+    filled = update.get('filledQty')
+    return filled is not None and filled < (existing.get('filledQty') or 0)
+
+
+class OrderBookMirror:
+    """
+    In-memory mirror of Fyers orders, trades and positions.
+
+    Seeded from the REST order book, trade book and positions each time the
+    order socket connects, then kept current from its push events. Strategy
+    code can check state without a REST call; writes, and reads that iterate
+    the indexes, take a lock so the indexes stay consistent with each other.
+
+    The socket is subscribed before seeding, so pushes that arrive during the
+    REST calls are applied afterwards. An order update older than the mirrored
+    order (an earlier status or fewer shares filled) is ignored, and a trade
+    already in the trade book is not reported again.
+
+    Positions only change on order, trade and position pushes, not on price
+    moves, so their P&L fields go stale; use the mirror for quantities and
+    open orders, and mark P&L to a fresh quote.
+    """
+
+    def __init__(self, fyers):
+        self.fyers = fyers
+        self.lock = threading.RLock()
+        self.orders = {}            # order id -> order
+        self.orders_by_symbol = {}  # symbol -> {order id, ...}
+        self.trades = {}            # trade id -> trade
+        self.trades_by_order = {}   # order id -> [trade, ...]
+        self.positions = {}         # symbol -> position
+        self.connected = False
+        self.socket = None
+        # Optional callbacks: any order push (order), new fill (trade), order reached a final
+        # status (order), mirror reseeded (self)
+        self.on_update = None
+        self.on_fill = None
+        self.on_order_closed = None
+        self.on_seeded = None
+
+    # ----------------------------
+    # Seeding / reconciliation
+    # ----------------------------
+    def seed(self):
+        """
+        Rebuild the mirror from REST. Also used to reconcile after a reconnect,
+        since push events may have been missed while the socket was down.
+        """
+        # Positions before trades: a trade landing in between is then in the trade book, so its
+        # queued push is dropped as a duplicate instead of being counted on top of the positions
+        orderbook = self.fyers.orderbook()
+        positions = self.fyers.positions()
+        tradebook = self.fyers.tradebook()
+        for name, response in (("orderbook", orderbook), ("positions", positions), ("tradebook", tradebook)):
+            if response.get('s') != 'ok':
+                logger.error("Error fetching %s: %s", name, response)
+                return False
+        with self.lock:
+            self.orders.clear()
+            self.orders_by_symbol.clear()
+            self.trades.clear()
+            self.trades_by_order.clear()
+            self.positions.clear()
+            for order in orderbook.get('orderBook') or []:
+                self._update_order(order)
+            for trade in tradebook.get('tradeBook') or []:
+                self._add_trade(trade)
+            for position in positions.get('netPositions') or []:
+                self.positions[position['symbol']] = position
+        logger.info("Order book mirror seeded: %d orders, %d trades, %d positions",
+                    len(self.orders), len(self.trades), len(self.positions))
+        if self.on_seeded is not None:
+            self.on_seeded(self)
+        return True
+
+    reconcile = seed
+
+    # ----------------------------
+    # Updates
+    # ----------------------------
+    def _update_order(self, order):
+        # Returns the mirrored order, or None if the update is older than it
+        order_id = order['id']
+        existing = self.orders.get(order_id)
+        if existing is not None:
+            if _is_stale(existing, order):
+                return None
+            existing.update(order)
+            order = existing
+        else:
+            self.orders[order_id] = order
+        self.orders_by_symbol.setdefault(order['symbol'], set()).add(order_id)
+        return order
+
+    def _add_trade(self, trade):
+        trade_id = trade.get('tradeNumber') or trade.get('id')
+        if trade_id in self.trades:
+            return False
+        self.trades[trade_id] = trade
+        self.trades_by_order.setdefault(trade.get('orderNumber') or trade.get('orderId'), []).append(trade)
+        return True
+
+    def track_order(self, order_id, data):
+        """
+        Record an order we just placed so it can be looked up before its first push event.
+        """
+        with self.lock:
+            if order_id not in self.orders:
+                self._update_order(dict(data, id=order_id, status=TRANSIT, filledQty=0))
+
+    def on_order(self, message):
+        order = message.get('orders', message)
+        with self.lock:
+            previous = self.orders.get(order['id'], {}).get('status')
+            mirrored = self._update_order(order)
+        if mirrored is None:
+            logger.debug("Ignoring stale update for order %s: %s", order['id'], order.get('status'))
+            return
+        if self.on_update is not None:
+            self.on_update(order)
+        if (self.on_order_closed is not None and mirrored.get('status') in CLOSED_STATUSES
+                and previous not in CLOSED_STATUSES):
+            self.on_order_closed(mirrored)
+
+    def on_trade(self, message):
+        trade = message.get('trades', message)
+        with self.lock:
+            added = self._add_trade(trade)
+        if added and self.on_fill is not None:
+            self.on_fill(trade)
+
+    def on_position(self, message):
+        position = message.get('positions', message)
+        with self.lock:
+            existing = self.positions.get(position['symbol'])
+            if existing is not None:
+                existing.update(position)
+            else:
+                self.positions[position['symbol']] = position
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+    def get_order(self, order_id):
+        return self.orders.get(order_id)
+
+    def get_orders(self, symbol):
+        # Iterating the indexes needs the lock: the socket thread adds to them
+        with self.lock:
+            return [self.orders[order_id] for order_id in self.orders_by_symbol.get(symbol, ())]
+
+    def open_orders(self, symbol=None):
+        with self.lock:
+            orders = self.get_orders(symbol) if symbol is not None else list(self.orders.values())
+            return [order for order in orders if order.get('status') in OPEN_STATUSES]
+
+    def get_trades(self, order_id):
+        with self.lock:
+            return list(self.trades_by_order.get(order_id, ()))
+
+    def get_position(self, symbol):
+        return self.positions.get(symbol)
+
+    def net_qty(self, symbol):
+        position = self.positions.get(symbol)
+        return position.get('netQty', 0) if position is not None else 0
+
+    def snapshot(self):
+        with self.lock:
+            return {'orders': len(self.orders), 'trades': len(self.trades), 'positions': len(self.positions)}
+
+    # ----------------------------
+    # Push events
+    # ----------------------------
+    def connect(self, access_token):
+        """
+        Start the Fyers order socket. ``access_token`` is "client_id:token".
+        """
+        from fyers_apiv3.FyersWebsocket import order_ws
+
+        self.socket = order_ws.FyersOrderSocket(
+            access_token=access_token,
+            write_to_file=False,
+            log_path="",
+            on_connect=self._on_connect,
+            on_close=self._on_close,
+            on_error=self._on_error,
+            on_orders=self.on_order,
+            on_trades=self.on_trade,
+            on_positions=self.on_position,
+        )
+        self.socket.connect()
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close_connection()
+            self.socket = None
+        self.connected = False
+
+    def _on_connect(self):
+        self.socket.subscribe(data_type="OnOrders,OnTrades,OnPositions")
+        # Catch up on anything missed while disconnected before trusting the mirror
+        self.connected = self.seed()
+
+    def _on_close(self, message):
+        logger.warning("Order socket closed: %s", message)
+        self.connected = False
+
+    def _on_error(self, message):
+        logger.error("Order socket error: %s", message)
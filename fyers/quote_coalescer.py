@@ -0,0 +1,122 @@
+# quote_coalescer.py
+
+import threading
+import time
+
+MAX_SYMBOLS = 50  # Symbols the Fyers quotes endpoint accepts per request
+
+
+class _Batch:
+    __slots__ = ('symbols', 'full', 'done', 'results', 'error')
+
+    def __init__(self):
+        self.symbols = {}             # Insertion-ordered set of symbols
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = {}             # symbol -> quote entry
+        self.error = None             # Failed response, if the call failed
+
+
+class QuoteCoalescer:
+    """
+    Batches concurrent quote lookups into multi-symbol Fyers ``quotes`` calls.
+
+    The first caller with a cache miss opens a batch and waits up to ``window``
+    seconds for other callers to add symbols, or until the batch reaches
+    ``max_symbols``. It then sends one request for the batch, and every caller
+    picks its own entries from the result. Entries are cached for ``ttl``
+    seconds, so refreshing a watchlist twice in a row costs one round of calls.
+
+    Parameters:
+    - fyers: FyersModel (or rate-limited proxy) used for the ``quotes`` calls.
+    - window (float): Seconds a batch stays open for more symbols.
+    - ttl (float): Seconds a quote is served from cache.
+    - max_symbols (int): Symbols per request.
+    """
+
+    def __init__(self, fyers, window=0.005, ttl=1.0, max_symbols=MAX_SYMBOLS):
+        self.fyers = fyers
+        self.window = window
+        self.ttl = ttl
+        self.max_symbols = max_symbols
+        self.lock = threading.Lock()
+        self.pending = None  # Open batch accepting symbols
+        self.cache = {}      # symbol -> (monotonic time, quote entry)
+        self.requests = 0
+        self.cache_hits = 0
+        self.batches = 0
+
+    def get(self, symbols):
+        """
+        Return a Fyers-shaped quotes response ({"s": "ok", "d": [...]}) for symbols, in order.
+        If a batch request fails, its error response is returned instead.
+        """
+        now = time.monotonic()
+        quotes = {}
+        waits = []
+        lead = []
+        with self.lock:
+            self.requests += len(symbols)
+            for symbol in symbols:
+                if symbol in quotes:
+                    continue
+                cached = self.cache.get(symbol)
+                if cached is not None and now - cached[0] < self.ttl:
+                    quotes[symbol] = cached[1]
+                    self.cache_hits += 1
+                    continue
+                batch = self.pending
+                if batch is None or len(batch.symbols) >= self.max_symbols:
+                    batch = self.pending = _Batch()
+                    lead.append(batch)
+                batch.symbols[symbol] = None
+                if len(batch.symbols) >= self.max_symbols:
+                    batch.full.set()
+                if not waits or waits[-1] is not batch:
+                    waits.append(batch)
+
+        for batch in lead:
+            batch.full.wait(self.window)
+            with self.lock:
+                if self.pending is batch:
+                    self.pending = None
+            self._send(batch)
+
+        for batch in waits:
+            batch.done.wait()
+            if batch.error is not None:
+                return batch.error
+            for symbol in batch.symbols:
+                if symbol in batch.results:
+                    quotes[symbol] = batch.results[symbol]
+        return {"s": "ok", "code": 200,
+                "d": [quotes.get(symbol) or {"n": symbol, "s": "error", "errmsg": "no quote returned"}
+                      for symbol in symbols]}
+
+    def _send(self, batch):
+        try:
+            response = self.fyers.quotes({"symbols": ",".join(batch.symbols)})
+            if response.get('s') == 'ok':
+                now = time.monotonic()
+                entries = response.get('d') or []
+                with self.lock:
+                    self.batches += 1
+                    for entry in entries:
+                        batch.results[entry['n']] = entry
+                        if entry.get('s') == 'ok':
+                            self.cache[entry['n']] = (now, entry)
+            else:
+                batch.error = response
+        except Exception as e:
+            batch.error = {"s": "error", "code": -1, "message": f"Quote request failed: {e}"}
+        finally:
+            batch.done.set()
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'cache_hits': self.cache_hits,
+                'batches': self.batches,
+                'cached_symbols': len(self.cache),
+            }
@@ -0,0 +1,223 @@
+# token_manager.py
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+REFRESH_URL = "https://api-t1.fyers.in/api/v3/validate-refresh-token"
+REFRESH_TOKEN_LIFETIME = 15 * 24 * 3600  # Fyers refresh tokens are valid for 15 days
+
+
+def token_expiry(token):
+    """
+    Read the expiry (epoch seconds) from a JWT without verifying it.
+
+    Returns None when the token is not a JWT or carries no ``exp`` claim.
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenManager:
+    """
+    Persist Fyers access/refresh tokens with their expiry and keep them fresh.
+
+    The token file is shared by every process on the host: reads are a cheap
+    ``stat`` plus JSON load when the file changed, and refreshes happen under a
+    file lock so only one worker hits the refresh endpoint while the others
+    pick up the new token from disk.
+    """
+
+    def __init__(self, client_id, secret_key, pin=None, token_file='fyers_token.json',
+                 refresh_margin=300, on_refresh=None):
+        self.client_id = client_id
+        self.secret_key = secret_key
+        self.pin = pin
+        self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        self.on_refresh = on_refresh
+        self.file_lock = FileLock(token_file + '.lock')
+        self.lock = threading.Lock()
+        self._state = {}
+        self._version = None
+        self._last_token = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def _version_of(self):
+        # Writes replace the file, so the inode changes even when two land within one mtime tick
+        stat = os.stat(self.token_file)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        try:
+            version = self._version_of()
+        except FileNotFoundError:
+            return self._state
+        with self.lock:
+            if version != self._version:
+                try:
+                    with open(self.token_file, 'r') as f:
+                        self._state = json.load(f)
+                    self._version = version
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not read token file %s: %s", self.token_file, e)
+            return self._state
+
+    def _write(self, state):
+        tmp_file = self.token_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.token_file)
+        with self.lock:
+            self._state = state
+            self._version = self._version_of()
+
+    def store(self, response):
+        """
+        Save the tokens from a ``SessionModel.generate_token`` response.
+        """
+        with self.file_lock:
+            # Read under the lock so a refresh written by another process is not overwritten
+            state = dict(self._read())
+            state['access_token'] = response['access_token']
+            state['access_expires_at'] = token_expiry(response['access_token'])
+            if response.get('refresh_token'):
+                state['refresh_token'] = response['refresh_token']
+                state['refresh_expires_at'] = (token_expiry(response['refresh_token'])
+                                               or time.time() + REFRESH_TOKEN_LIFETIME)
+            self._write(state)
+        self._last_token = state['access_token']  # The caller already has it; nothing to notify
+        logger.info("Fyers tokens saved to %s", self.token_file)
+
+    # ----------------------------
+    # Validity
+    # ----------------------------
+    def seconds_left(self):
+        state = self._read()
+        if not state.get('access_token'):
+            return 0
+        expires_at = state.get('access_expires_at')
+        if expires_at is None:
+            # Not a JWT we can inspect; trust it until the API says otherwise
+            return float('inf')
+        return expires_at - time.time()
+
+    def is_valid(self, margin=0):
+        return self.seconds_left() > margin
+
+    def get_access_token(self):
+        """
+        Return a valid access token, refreshing it first if it is about to expire.
+
+        Returns None when no usable token exists and a new login is required.
+        """
+        if not self.is_valid(self.refresh_margin):
+            self.refresh()
+        if self.is_valid():
+            self._last_token = self._read()['access_token']
+            return self._last_token
+        return None
+
+    def _notify(self):
+        # Tell the owner about tokens refreshed here or by another process
+        current = self._read().get('access_token')
+        if current and current != self._last_token:
+            self._last_token = current
+            if self.on_refresh is not None:
+                self.on_refresh(current)
+
+    # ----------------------------
+    # Refresh
+    # ----------------------------
+    def refresh(self):
+        """
+        Exchange the refresh token for a new access token.
+
+        Returns True when a valid access token is available afterwards.
+        """
+        with self.file_lock:
+            state = self._read()
+            if self.is_valid(self.refresh_margin):
+                # Another process refreshed while we waited for the lock
+                refreshed = True
+            else:
+                refreshed = self._request_refresh(state)
+        if refreshed:
+            self._notify()
+        return refreshed
+
+    def _request_refresh(self, state):
+        refresh_token = state.get('refresh_token')
+        if not refresh_token or state.get('refresh_expires_at', 0) <= time.time():
+            logger.warning("No valid Fyers refresh token; a new login is required.")
+            return False
+        if self.pin is None:
+            logger.warning("Fyers PIN not configured; cannot refresh the access token.")
+            return False
+        app_id_hash = hashlib.sha256(f"{self.client_id}:{self.secret_key}".encode()).hexdigest()
+        try:
+            response = requests.post(REFRESH_URL, json={
+                "grant_type": "refresh_token",
+                "appIdHash": app_id_hash,
+                "refresh_token": refresh_token,
+                "pin": str(self.pin),
+            }, timeout=10).json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error("Error refreshing Fyers access token: %s", e)
+            return False
+        if response.get('s') != 'ok' or not response.get('access_token'):
+            logger.error("Error refreshing Fyers access token: %s", response)
+            return False
+        state = dict(state)
+        state['access_token'] = response['access_token']
+        state['access_expires_at'] = token_expiry(response['access_token'])
+        self._write(state)
+        logger.info("Fyers access token refreshed.")
+        return True
+
+    # ----------------------------
+    # Background refresher
+    # ----------------------------
+    def start(self, retry_interval=60):
+        if self._thread is not None:
+            return
+        if self._last_token is None:
+            # The owner is using the token on disk; only later changes are refreshes
+            self._last_token = self._read().get('access_token')
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(retry_interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, retry_interval):
+        while not self._stop_event.is_set():
+            self._notify()
+            wait = self.seconds_left() - self.refresh_margin
+            if wait > 0:
+                # Wake up periodically to notice tokens written by other processes
+                self._stop_event.wait(min(wait, 3600))
+                continue
+            if not self.refresh():
+                self._stop_event.wait(retry_interval)
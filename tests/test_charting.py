@@ -0,0 +1,72 @@
+# test_charting.py
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from common.charting import DownsampledSeries, lttb_indices, minmax_indices
+
+
+def walk(n, seed=0):
+    return np.cumsum(np.random.default_rng(seed).normal(size=n))
+
+
+def test_short_series_is_kept_whole():
+    y = walk(50)
+    assert np.array_equal(minmax_indices(y, budget=100), np.arange(50))
+    assert np.array_equal(lttb_indices(np.arange(50), y, budget=100), np.arange(50))
+
+
+@pytest.mark.parametrize("n", [10_000, 10_007, 12_345])
+def test_minmax_keeps_extremes_and_endpoints(n):
+    y = walk(n)
+    index = minmax_indices(y, budget=200)
+    assert len(index) <= 202
+    assert index.min() == 0 and index.max() == n - 1
+    assert np.all(np.diff(index) > 0)
+    assert y.argmin() in index and y.argmax() in index
+
+
+def test_lttb_selects_budget_points_in_order():
+    n, budget = 10_000, 300
+    y = walk(n)
+    index = lttb_indices(np.arange(n), y, budget=budget)
+    assert len(index) == budget
+    assert index[0] == 0 and index[-1] == n - 1
+    assert np.all(np.diff(index) > 0)
+
+
+def test_lttb_keeps_an_isolated_spike():
+    y = np.zeros(10_000)
+    y[4321] = 50.0
+    assert 4321 in lttb_indices(np.arange(len(y)), y, budget=100)
+
+
+def test_lttb_accepts_datetime_x():
+    x = np.arange(5_000).astype('datetime64[m]')
+    y = walk(5_000)
+    assert np.array_equal(lttb_indices(x, y, budget=100), lttb_indices(np.arange(5_000), y, budget=100))
+
+
+def test_streaming_series_matches_one_shot_build():
+    x, y = np.arange(20_000), walk(20_000)
+    whole = DownsampledSeries(budget=200)
+    whole.extend(x, y)
+    chunked = DownsampledSeries(budget=200)
+    for start in range(0, len(x), 777):
+        chunked.extend(x[start:start + 777], y[start:start + 777])
+    for a, b in zip(whole.points(), chunked.points()):
+        assert np.array_equal(a, b)
+
+
+def test_streaming_series_stays_in_budget_and_keeps_extremes():
+    series = DownsampledSeries(budget=200)
+    y = walk(50_000)
+    for i, value in enumerate(y):
+        series.append(i, value)
+    xs, ys = series.points()
+    assert len(series) == 50_000
+    assert len(xs) <= 201
+    assert np.all(np.diff(xs) > 0)
+    assert ys.max() == y.max() and ys.min() == y.min()
+    assert (xs[-1], ys[-1]) == (49_999, y[-1])
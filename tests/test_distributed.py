@@ -0,0 +1,117 @@
+# test_distributed.py
+
+import json
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("filelock")
+
+from distributed import WARMUP_DAYS, BarCache, Coordinator, make_tasks, run_worker  # noqa: E402
+
+GRID = {'short_window': (20, 50), 'long_window': (100, 200), 'atr_period': (14,), 'atr_multiplier': (1.5,)}
+PERIOD = ('2020-01-01', '2021-12-31')
+
+
+def cache_bars(directory, symbol, seed):
+    # Pre-populate the shared cache under the name run_simulation loads, so no worker downloads
+    start, end = PERIOD
+    warmup = (datetime.strptime(start, '%Y-%m-%d') - timedelta(days=WARMUP_DAYS)).strftime('%Y-%m-%d')
+    ts = np.arange(np.datetime64(warmup), np.datetime64(end) + 1).astype('datetime64[ns]').astype(np.int64)
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.01, len(ts))))
+    np.savez(directory / f"{symbol}_{warmup}_{end}.npz", ts=ts, close=close, high=close * 1.01, low=close * 0.99)
+
+
+class Client:
+    """
+    A hand-driven worker connection, to hold or drop shards on cue.
+    """
+
+    def __init__(self, address, worker):
+        self.sock = socket.create_connection(address)
+        self.rfile, self.wfile = self.sock.makefile('rb'), self.sock.makefile('wb')
+        self.send({'type': 'hello', 'worker': worker})
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+    def next(self):
+        self.send({'type': 'next'})
+        return json.loads(self.rfile.readline())
+
+    def close(self):
+        self.rfile.close()
+        self.wfile.close()
+        self.sock.close()
+
+
+def test_lost_shards_are_retried_and_stragglers_are_stolen(tmp_path):
+    for seed, symbol in enumerate(('AAA', 'BBB')):
+        cache_bars(tmp_path, symbol, seed)
+    tasks = make_tasks(GRID, ['AAA', 'BBB'], [PERIOD])
+    coordinator = Coordinator(tasks, port=0, steal_after=0.2, lease_timeout=30).start()
+    try:
+        dropper = Client(coordinator.address, 'dropper')
+        dropped = dropper.next()['shard']
+        dropper.close()  # Disconnects holding a shard
+
+        straggler = Client(coordinator.address, 'straggler')
+        held = straggler.next()['shard']  # Holds a shard without finishing it
+
+        workers = [threading.Thread(target=run_worker, args=(*coordinator.address, str(tmp_path)),
+                                    kwargs={'worker': f"w{i}"}) for i in range(3)]
+        for worker in workers:
+            worker.start()
+        results, failed = coordinator.wait(timeout=60)
+        for worker in workers:
+            worker.join(timeout=30)
+
+        assert failed == {} and sorted(results) == list(range(len(tasks)))
+        assert results[dropped]['worker'].startswith('w')
+        assert results[held]['worker'].startswith('w')
+        status = coordinator.status()
+        assert status['requeued'] >= 1 and status['stolen'] >= 1
+
+        # The straggler's late result is a duplicate, and an unknown shard id is ignored
+        straggler.send({'type': 'result', 'shard': held, 'result': {'late': True}})
+        straggler.send({'type': 'result', 'shard': 9999, 'result': {}})
+        straggler.send({'type': 'error', 'shard': 'x', 'error': 'bad id'})
+        assert straggler.next() == {'type': 'done'}  # Its handler is still serving
+        assert 'late' not in coordinator.results[held]['result']
+        straggler.close()
+    finally:
+        coordinator.stop()
+
+
+def test_bad_token_is_rejected(tmp_path):
+    coordinator = Coordinator(make_tasks(GRID, ['AAA'], [PERIOD]), port=0, token='secret').start()
+    try:
+        client = Client(coordinator.address, 'intruder')
+        client.send({'type': 'next'})
+        assert client.rfile.readline() == b""
+        client.close()
+        time.sleep(0.1)
+        assert coordinator.status()['workers'] == 0
+    finally:
+        coordinator.stop()
+
+
+def test_bar_cache_downloads_past_a_stale_lock(tmp_path, monkeypatch):
+    downloads = []
+
+    def download(self, symbol, start, end, path):
+        downloads.append(symbol)
+        np.savez(path, ts=np.arange(3), close=np.ones(3), high=np.ones(3), low=np.ones(3))
+
+    monkeypatch.setattr(BarCache, '_download', download)
+    (tmp_path / "AAA_2020-01-01_2020-12-31.npz.lock").write_text("")  # Left by a worker that died
+    cache = BarCache(str(tmp_path), lock_timeout=0.1)
+    assert list(cache.load('AAA', '2020-01-01', '2020-12-31')['close']) == [1.0, 1.0, 1.0]
+    cache.load('AAA', '2020-01-01', '2020-12-31')
+    assert downloads == ['AAA']
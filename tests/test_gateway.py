@@ -0,0 +1,222 @@
+# test_gateway.py
+
+import asyncio
+import itertools
+
+import pytest
+
+from common.gateway import (ACCEPTED, CANCELLED, FILLED, PARTIALLY_FILLED, PENDING_CANCEL, REJECTED, Gateway,
+                            FyersAdapter, Order, PaperAdapter)
+from common.risk import RiskEngine
+from order_book import TRANSIT, OrderBookMirror
+from paper_trading import PaperTrader
+
+
+class FakeAdapter:
+    """
+    Accepts every order. Stream updates queued in `early` are delivered before
+    the submit call returns, as a fast broker stream would.
+    """
+
+    name = 'fake'
+    max_batch = 10
+    rate_limit = None
+    fills_reach_risk = False
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.sent = []
+        self.early = []
+        self.cancel_result = True
+        self.fail = None
+
+    async def connect(self, gateway):
+        self.gateway = gateway
+
+    async def close(self):
+        pass
+
+    async def submit(self, orders):
+        if self.fail is not None:
+            raise self.fail
+        for order in orders:
+            self.sent.append(order)
+            order.broker_id = f"b{next(self.ids)}"
+            for status, filled, price in self.early:
+                self.gateway.on_update(order.broker_id, status, filled, price)
+            await asyncio.sleep(0)
+            order.status = ACCEPTED
+
+    async def cancel(self, order):
+        return self.cancel_result
+
+
+@pytest.fixture
+def gateway():
+    gateway = Gateway(FakeAdapter())
+    gateway.start()
+    yield gateway
+    gateway.stop()
+
+
+@pytest.fixture
+def risky():
+    risk = RiskEngine(max_symbol=1500)
+    risk.on_price('SPY', 100.0)
+    gateway = Gateway(FakeAdapter(), risk=risk)
+    gateway.start()
+    yield gateway
+    gateway.stop()
+
+
+def settle(gateway):
+    # Run everything already scheduled on the gateway loop
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), gateway.loop).result()
+
+
+def record(gateway):
+    seen = []
+    gateway.add_listener(lambda order: seen.append(order.status))
+    return seen
+
+
+def test_accept_then_fill(gateway):
+    seen = record(gateway)
+    order = gateway.submit(Order('SPY', 10, 'buy')).result()
+    assert order.status == ACCEPTED
+    gateway.on_update(order.broker_id, PARTIALLY_FILLED, 4, 100.0)
+    gateway.on_update(order.broker_id, FILLED, 10, 100.5)
+    settle(gateway)
+    assert (order.status, order.filled_quantity, order.avg_fill_price) == (FILLED, 10, 100.5)
+    assert seen == [ACCEPTED, PARTIALLY_FILLED, FILLED]
+    assert gateway.orders == {} and gateway.broker_ids == {}
+
+
+def test_fill_before_submit_returns_is_applied(gateway):
+    gateway.adapter.early = [(FILLED, 10, 101.0)]
+    seen = record(gateway)
+    order = gateway.submit(Order('SPY', 10, 'buy')).result()
+    assert (order.status, order.filled_quantity) == (FILLED, 10)
+    assert seen == [ACCEPTED, FILLED]
+    assert gateway.early_updates == {} and gateway.broker_ids == {}
+
+
+def test_final_status_is_terminal(gateway):
+    order = gateway.submit(Order('SPY', 10, 'buy')).result()
+    gateway.on_update(order.broker_id, CANCELLED)
+    settle(gateway)
+    gateway._update(order, ACCEPTED, None, None)
+    assert order.status == CANCELLED
+
+
+def test_cancel_pending_until_broker_confirms(gateway):
+    order = gateway.submit(Order('SPY', 10, 'buy')).result()
+    assert gateway.cancel(order).result() is True
+    assert order.status == PENDING_CANCEL
+    gateway.on_update(order.broker_id, PARTIALLY_FILLED, 3, 100.0)
+    settle(gateway)
+    assert (order.status, order.filled_quantity) == (PENDING_CANCEL, 3)
+    gateway.on_update(order.broker_id, CANCELLED, 3)
+    settle(gateway)
+    assert order.status == CANCELLED
+    assert gateway.broker_ids == {}
+
+
+def test_refused_cancel_restores_working_status(gateway):
+    gateway.adapter.cancel_result = False
+    order = gateway.submit(Order('SPY', 10, 'buy')).result()
+    gateway.on_update(order.broker_id, PARTIALLY_FILLED, 5, 100.0)
+    settle(gateway)
+    assert gateway.cancel(order).result() is False
+    assert order.status == PARTIALLY_FILLED
+
+
+def test_cancel_of_final_order_is_refused(gateway):
+    order = gateway.submit(Order('SPY', 10, 'buy')).result()
+    gateway.on_update(order.broker_id, FILLED, 10, 100.0)
+    settle(gateway)
+    assert gateway.cancel(order).result() is False
+    assert order.status == FILLED
+
+
+def test_submit_error_rejects_batch(gateway):
+    gateway.adapter.fail = RuntimeError("down")
+    orders = gateway.submit_many([Order('SPY', 1, 'buy'), Order('AAPL', 1, 'buy')]).result()
+    assert [(o.status, o.error) for o in orders] == [(REJECTED, "down")] * 2
+    assert gateway.orders == {}
+
+
+def test_unknown_update_buffer_is_bounded():
+    gateway = Gateway(FakeAdapter(), max_early=3)
+    for i in range(5):
+        gateway._apply_update(f"x{i}", FILLED, 1, 1.0)
+    assert list(gateway.early_updates) == ['x2', 'x3', 'x4']
+
+
+def test_paper_adapter_fills_immediately():
+    trader = PaperTrader(initial_cash=10000)
+    gateway = Gateway(PaperAdapter(trader))
+    gateway.start()
+    try:
+        filled, rejected = gateway.submit_many([Order('SPY', 10, 'buy', limit_price=100.0),
+                                                Order('AAPL', 10, 'sell', limit_price=50.0)]).result()
+    finally:
+        gateway.stop()
+    assert (filled.status, filled.filled_quantity, filled.avg_fill_price) == (FILLED, 10, 100.0)
+    assert rejected.status == REJECTED
+    assert trader.positions == {'SPY': 10}
+
+
+def test_risk_breach_is_rejected_before_submit(risky):
+    risk = risky.risk
+    ok, over = risky.submit_many([Order('SPY', 10, 'buy'), Order('SPY', 10, 'buy')]).result()
+    assert ok.status == ACCEPTED
+    assert over.status == REJECTED and over.error.startswith("rejected by risk engine")
+    assert risky.adapter.sent == [ok]
+    assert risk.orders == {ok.broker_id: ('SPY', 10)} and risk.committed['SPY'] == 1000.0
+
+
+def test_fills_consume_the_reservation(risky):
+    risk = risky.risk
+    order = risky.submit(Order('SPY', 10, 'buy')).result()
+    risky.on_update(order.broker_id, PARTIALLY_FILLED, 4, 100.0)
+    settle(risky)
+    assert (risk.quantities['SPY'], risk.reserved['SPY']) == (4, 6)
+    risky.on_update(order.broker_id, FILLED, 10, 101.0)
+    settle(risky)
+    assert (risk.quantities['SPY'], risk.reserved['SPY'], risk.orders) == (10, 0, {})
+    assert risk.prices['SPY'] == pytest.approx((1010.0 - 400.0) / 6)
+
+
+def test_cancel_and_submit_error_release_the_rest(risky):
+    risk = risky.risk
+    order = risky.submit(Order('SPY', 10, 'buy')).result()
+    risky.on_update(order.broker_id, PARTIALLY_FILLED, 3, 100.0)
+    risky.on_update(order.broker_id, CANCELLED, 3)
+    settle(risky)
+    assert (risk.quantities['SPY'], risk.reserved['SPY'], risk.orders) == (3, 0, {})
+
+    risky.adapter.fail = RuntimeError("down")
+    order = risky.submit(Order('SPY', 5, 'sell')).result()
+    assert order.status == REJECTED
+    assert (risk.reserved['SPY'], risk.orders) == (0, {})
+
+
+def test_fills_reported_elsewhere_are_not_applied_twice(risky):
+    risk = risky.risk
+    risky.adapter.fills_reach_risk = True
+    order = risky.submit(Order('SPY', 10, 'sell')).result()
+    # As FyersAlgoTrader's order book callback does, by broker order id
+    risk.on_fill('SPY', -10, 100.0, order_id=order.broker_id)
+    risky.on_update(order.broker_id, FILLED, 10, 100.0)
+    settle(risky)
+    assert (risk.quantities['SPY'], risk.reserved['SPY'], risk.orders) == (-10, 0, {})
+
+
+def test_fyers_ack_tracks_the_order():
+    book = OrderBookMirror(None)
+    adapter = FyersAdapter('client', None, order_book=book)
+    order = Order('NSE:SBIN-EQ', 5, 'buy', 'limit', limit_price=600.0)
+    adapter._ack(order, {'s': 'ok', 'id': 'F1'})
+    assert order.broker_id == 'F1'
+    assert (book.get_order('F1')['status'], book.get_order('F1')['qty']) == (TRANSIT, 5)
@@ -0,0 +1,144 @@
+# test_order_book.py
+
+from order_book import PENDING, TRADED, TRANSIT, OrderBookMirror
+
+SYMBOL = "NSE:SBIN-EQ"
+
+
+def order(order_id, status, filled=0, qty=10):
+    return {"id": order_id, "symbol": SYMBOL, "status": status, "qty": qty, "filledQty": filled}
+
+
+def trade(trade_id, order_id, qty):
+    return {"tradeNumber": trade_id, "orderNumber": order_id, "symbol": SYMBOL, "tradedQty": qty,
+            "tradePrice": 600.0, "side": 1}
+
+
+class FakeFyers:
+    # REST books as Fyers returns them; each call hands out fresh dicts, as a new response would
+    def __init__(self):
+        self.orders = []
+        self.trades = []
+        self.net = []
+        self.calls = []
+        self.fail = None
+
+    def _response(self, name, key, rows):
+        self.calls.append(name)
+        if name == self.fail:
+            return {"s": "error", "message": "down"}
+        return {"s": "ok", key: [dict(row) for row in rows]}
+
+    def orderbook(self):
+        return self._response("orderbook", "orderBook", self.orders)
+
+    def tradebook(self):
+        return self._response("tradebook", "tradeBook", self.trades)
+
+    def positions(self):
+        return self._response("positions", "netPositions", self.net)
+
+
+class FakeSocket:
+    def __init__(self):
+        self.subscriptions = []
+
+    def subscribe(self, data_type):
+        self.subscriptions.append(data_type)
+
+
+def mirror(fyers):
+    book = OrderBookMirror(fyers)
+    book.socket = FakeSocket()
+    book.fills, book.closed, book.seeds = [], [], []
+    book.on_fill = book.fills.append
+    book.on_order_closed = book.closed.append
+    book.on_seeded = book.seeds.append
+    return book
+
+
+def test_seed_builds_the_indexes():
+    fyers = FakeFyers()
+    fyers.orders = [order("O1", TRADED, 10), order("O2", PENDING)]
+    fyers.trades = [trade("T1", "O1", 10)]
+    fyers.net = [{"symbol": SYMBOL, "netQty": 10}]
+    book = mirror(fyers)
+    book._on_connect()
+
+    assert book.connected and book.seeds == [book]
+    assert fyers.calls == ["orderbook", "positions", "tradebook"]
+    assert [o["id"] for o in book.open_orders(SYMBOL)] == ["O2"]
+    assert sorted(o["id"] for o in book.get_orders(SYMBOL)) == ["O1", "O2"]
+    assert [t["tradeNumber"] for t in book.get_trades("O1")] == ["T1"]
+    assert book.net_qty(SYMBOL) == 10 and book.net_qty("NSE:OTHER-EQ") == 0
+    assert book.fills == [] and book.closed == []
+
+
+def test_failed_seed_leaves_the_mirror_disconnected():
+    fyers = FakeFyers()
+    fyers.fail = "tradebook"
+    book = mirror(fyers)
+    book._on_connect()
+    assert not book.connected and book.seeds == []
+
+
+def test_trades_are_reported_once():
+    fyers = FakeFyers()
+    fyers.trades = [trade("T1", "O1", 4)]
+    book = mirror(fyers)
+    book.seed()
+    book.on_trade({"trades": trade("T1", "O1", 4)})  # Already in the trade book
+    book.on_trade({"trades": trade("T2", "O1", 6)})
+    book.on_trade(trade("T2", "O1", 6))
+    assert [t["tradeNumber"] for t in book.fills] == ["T2"]
+    assert len(book.get_trades("O1")) == 2
+
+
+def test_closed_callback_fires_once_per_order():
+    book = mirror(FakeFyers())
+    book.seed()
+    book.track_order("O1", {"symbol": SYMBOL, "qty": 10})
+    assert book.get_order("O1")["status"] == TRANSIT
+    book.on_order({"orders": order("O1", PENDING, 4)})
+    assert book.closed == []
+    book.on_order({"orders": order("O1", TRADED, 10)})
+    book.on_order({"orders": order("O1", TRADED, 10)})
+    assert [o["id"] for o in book.closed] == ["O1"]
+    assert book.closed[0] is book.get_order("O1") and book.open_orders() == []
+
+
+def test_stale_order_updates_are_ignored():
+    book = mirror(FakeFyers())
+    book.seed()
+    updates = []
+    book.on_update = lambda pushed: updates.append((pushed["status"], pushed["filledQty"]))
+    book.on_order(order("O1", PENDING, 5))
+    book.on_order(order("O1", PENDING, 3))  # Fewer shares filled
+    book.on_order(order("O1", TRANSIT, 5))  # Earlier status
+    assert (book.get_order("O1")["status"], book.get_order("O1")["filledQty"]) == (PENDING, 5)
+    book.on_order(order("O1", TRADED, 10))
+    book.on_order(order("O1", PENDING, 10))
+    assert book.get_order("O1")["status"] == TRADED
+    assert updates == [(PENDING, 5), (TRADED, 10)]
+
+
+def test_reconnect_reseeds_and_drops_pushes_queued_during_it():
+    fyers = FakeFyers()
+    fyers.orders = [order("O1", PENDING)]
+    book = mirror(fyers)
+    book._on_connect()
+    book._on_close("network")
+    assert not book.connected
+
+    # O1 filled while the socket was down; its pushes are delivered only after the reseed
+    fyers.orders = [order("O1", TRADED, 10)]
+    fyers.trades = [trade("T1", "O1", 10)]
+    fyers.net = [{"symbol": SYMBOL, "netQty": 10}]
+    book._on_connect()
+    book.on_order(order("O1", PENDING))
+    book.on_trade(trade("T1", "O1", 10))
+    book.on_order(order("O1", TRADED, 10))
+
+    assert book.connected and len(book.socket.subscriptions) == 2 and len(book.seeds) == 2
+    assert book.get_order("O1")["status"] == TRADED and book.net_qty(SYMBOL) == 10
+    assert book.fills == [] and book.closed == []
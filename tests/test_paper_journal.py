@@ -0,0 +1,91 @@
+# test_paper_journal.py
+
+import json
+import os
+
+import pytest
+
+from paper_journal import PaperTraderJournal
+from paper_trading import PaperTrader
+
+
+def trade(trader):
+    trader.place_order("SPY", 10, "buy", 100.0)
+    trader.place_order("AAPL", 5, "buy", 50.0)
+    trader.place_order("SPY", 4, "sell", 110.0)
+    trader.place_order("AAPL", 100, "sell", 55.0)  # Rejected: not enough shares
+    trader.place_order("MSFT", 1, "buy", 200.0)
+
+
+def state(trader):
+    return (trader.cash, trader.positions, trader.order_history, trader.trade_history, trader.portfolio_history)
+
+
+def reopen(directory, snapshot_every=1000):
+    return PaperTrader(initial_cash=10000, journal=PaperTraderJournal(directory, snapshot_every=snapshot_every))
+
+
+@pytest.mark.parametrize("snapshot_every", [1000, 2, 1])
+def test_recovery_restores_state_and_histories(tmp_path, snapshot_every):
+    trader = reopen(tmp_path, snapshot_every)
+    trade(trader)
+    expected = state(trader)
+    trader.journal.close()
+
+    recovered = reopen(tmp_path, snapshot_every)
+    assert state(recovered) == expected
+    recovered.place_order("SPY", 1, "buy", 100.0)
+    expected = state(recovered)
+    recovered.journal.close()
+
+    assert state(reopen(tmp_path, snapshot_every)) == expected
+
+
+def test_snapshots_hold_only_cash_and_positions(tmp_path):
+    trader = reopen(tmp_path, snapshot_every=2)
+    trade(trader)
+    trader.journal.close()
+    with open(tmp_path / 'snapshot.json') as f:
+        snapshot = json.load(f)
+    assert set(snapshot) == {'seq', 'cash', 'positions'}
+    assert snapshot['positions'] == {'SPY': 6, 'AAPL': 5, 'MSFT': 1}
+
+
+def test_torn_tail_record_is_ignored(tmp_path):
+    trader = reopen(tmp_path)
+    trade(trader)
+    expected = state(trader)
+    trader.journal.close()
+    last_segment = sorted(p for p in os.listdir(tmp_path) if p.startswith('wal-'))[-1]
+    with open(tmp_path / last_segment, 'a') as f:
+        f.write('{"seq": 999, "type": "fi')
+
+    assert state(reopen(tmp_path)) == expected
+
+
+def test_second_writer_is_refused(tmp_path):
+    trader = reopen(tmp_path)
+    with pytest.raises(RuntimeError):
+        PaperTraderJournal(str(tmp_path))
+    trader.journal.close()
+    PaperTraderJournal(str(tmp_path)).close()
+
+
+def test_torn_record_in_reopened_segment_is_cut_off(tmp_path):
+    trader = reopen(tmp_path, snapshot_every=2)
+    trader.place_order("SPY", 10, "buy", 100.0)  # Order and fill: snapshot, then an empty segment
+    trader.journal.close()
+    last_segment = sorted(p for p in os.listdir(tmp_path) if p.startswith('wal-'))[-1]
+    with open(tmp_path / last_segment, 'a') as f:
+        f.write('{"seq": 3, "type": "or')
+
+    # Recovery resumes at that segment's first seq, so the next events go into the same file
+    trader = reopen(tmp_path)
+    trader.place_order("SPY", 1, "buy", 100.0)
+    trader.place_order("SPY", 2, "buy", 100.0)
+    expected = state(trader)
+    trader.journal.close()
+
+    recovered = reopen(tmp_path)
+    assert state(recovered) == expected
+    assert recovered.cash == 10000 - 1300.0 and recovered.positions == {'SPY': 13}
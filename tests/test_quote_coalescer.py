@@ -0,0 +1,84 @@
+# test_quote_coalescer.py
+
+import threading
+
+from quote_coalescer import QuoteCoalescer
+
+
+class FakeFyers:
+    def __init__(self, response=None):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.response = response
+
+    def quotes(self, data):
+        symbols = data["symbols"].split(",")
+        with self.lock:
+            self.calls.append(symbols)
+        if self.response is not None:
+            return self.response
+        return {"s": "ok", "d": [{"n": symbol, "s": "ok", "v": {"lp": float(len(symbol))}} for symbol in symbols]}
+
+
+def test_returns_quotes_in_request_order():
+    coalescer = QuoteCoalescer(FakeFyers(), window=0)
+    response = coalescer.get(["NSE:B", "NSE:AA", "NSE:B"])
+    assert response["s"] == "ok"
+    assert [entry["n"] for entry in response["d"]] == ["NSE:B", "NSE:AA", "NSE:B"]
+
+
+def test_concurrent_lookups_share_batched_calls():
+    fyers = FakeFyers()
+    coalescer = QuoteCoalescer(fyers, window=0.05, ttl=60, max_symbols=50)
+    symbols = [f"NSE:S{i}" for i in range(300)]
+    start = threading.Barrier(len(symbols))
+    results = {}
+
+    def lookup(symbol):
+        start.wait()
+        results[symbol] = coalescer.get([symbol])
+
+    threads = [threading.Thread(target=lookup, args=(symbol,)) for symbol in symbols]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results[symbol]["d"][0]["n"] == symbol for symbol in symbols)
+    assert all(len(call) <= 50 for call in fyers.calls)
+    assert sorted(s for call in fyers.calls for s in call) == sorted(symbols)
+    assert len(fyers.calls) < 30
+
+
+def test_cached_quotes_are_not_refetched_within_ttl():
+    fyers = FakeFyers()
+    coalescer = QuoteCoalescer(fyers, window=0, ttl=60)
+    coalescer.get(["NSE:A", "NSE:B"])
+    coalescer.get(["NSE:A", "NSE:B"])
+    assert len(fyers.calls) == 1
+    assert coalescer.metrics()["cache_hits"] == 2
+
+
+def test_expired_quotes_are_refetched():
+    fyers = FakeFyers()
+    coalescer = QuoteCoalescer(fyers, window=0, ttl=0)
+    coalescer.get(["NSE:A"])
+    coalescer.get(["NSE:A"])
+    assert len(fyers.calls) == 2
+
+
+def test_batches_split_at_max_symbols():
+    fyers = FakeFyers()
+    coalescer = QuoteCoalescer(fyers, window=0, max_symbols=10)
+    coalescer.get([f"NSE:S{i}" for i in range(25)])
+    assert [len(call) for call in fyers.calls] == [10, 10, 5]
+
+
+def test_error_response_is_returned_and_not_cached():
+    error = {"s": "error", "code": 500, "message": "down"}
+    fyers = FakeFyers(response=error)
+    coalescer = QuoteCoalescer(fyers, window=0, ttl=60)
+    assert coalescer.get(["NSE:A"]) == error
+    fyers.response = None
+    assert coalescer.get(["NSE:A"])["s"] == "ok"
+    assert len(fyers.calls) == 2
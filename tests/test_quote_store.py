@@ -0,0 +1,58 @@
+# test_quote_store.py
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from common.quote_store import ASK, BID, QuoteStore  # noqa: E402
+
+
+def test_fresh_mid_and_fill_price():
+    quotes = QuoteStore(max_age=5.0)
+    assert quotes.get('SPY') is None and quotes.mid('SPY') is None
+    quotes.update('SPY', 99.0, 101.0, 10, 20)
+    assert quotes.mid('SPY') == 100.0
+    assert quotes.fill_price('SPY', 'buy') == 101.0 and quotes.fill_price('SPY', 'sell') == 99.0
+    quotes.update('OLD', 99.0, 101.0, timestamp=time.time() - 60)
+    assert quotes.get('OLD') is not None and quotes.fresh('OLD') is None
+    quotes.update('CROSSED', 101.0, 99.0)
+    assert quotes.fill_price('CROSSED', 'buy') is None
+
+
+def test_concurrent_writes_survive_growth_and_reads_are_whole():
+    quotes = QuoteStore(capacity=2)
+    writers, symbols_each, rounds = 4, 50, 40
+    torn = []
+    done = threading.Event()
+
+    def write(w):
+        for k in range(rounds):
+            for s in range(symbols_each):
+                # Every field of a quote derives from k, so a mixed row shows up as a mismatch
+                quotes.update(f"W{w}S{s}", k, k + 1, k, k, float(k))
+
+    def read():
+        while not done.is_set():
+            for symbol in list(quotes.rows):
+                quote = quotes.get(symbol)
+                if quote[ASK] != quote[BID] + 1 or len(set(quote[:1] + quote[2:])) != 1:
+                    torn.append(quote)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for thread in readers + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+
+    assert torn == []
+    assert quotes.snapshot()['symbols'] == writers * symbols_each
+    last = rounds - 1
+    assert all(quotes.get(f"W{w}S{s}") == (last, last + 1, last, last, last)
+               for w in range(writers) for s in range(symbols_each))
@@ -0,0 +1,78 @@
+# test_rate_limit.py
+
+import pytest
+
+pytest.importorskip("filelock")
+
+from common import rate_limit  # noqa: E402
+from common.rate_limit import DATA, ORDER, RateLimiter, RateLimitTimeout  # noqa: E402
+
+BUCKETS = [(10, 3600)]  # One token per 360s, so nothing refills between calls unless the clock moves
+
+
+class Clock:
+    # Stands in for the time module inside rate_limit
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # A real sleep takes at least a tick; a tiny float wait would never move a large timestamp
+        self.now += max(seconds, 0.001)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+
+def drain(limiter, priority):
+    taken = 0
+    while limiter.try_acquire(priority=priority) == 0:
+        taken += 1
+    return taken
+
+
+def test_instances_share_one_budget(tmp_path, clock):
+    first = RateLimiter('shared', BUCKETS, state_dir=str(tmp_path), data_reserve=0)
+    second = RateLimiter('shared', BUCKETS, state_dir=str(tmp_path), data_reserve=0)
+    assert all(first.try_acquire() == 0 for _ in range(6))
+    assert drain(second, DATA) == 4
+    assert first.try_acquire() == pytest.approx(360.0)
+    assert RateLimiter('other', BUCKETS, state_dir=str(tmp_path)).try_acquire() == 0
+
+
+def test_data_lane_leaves_the_reserve_to_orders(tmp_path, clock):
+    limiter = RateLimiter('lanes', BUCKETS, state_dir=str(tmp_path))
+    assert drain(limiter, DATA) == 8
+    assert drain(limiter, ORDER) == 2
+    clock.now += 360
+    assert limiter.try_acquire(priority=DATA) > 0
+    assert limiter.try_acquire(priority=ORDER) == 0
+
+
+def test_clock_stepping_back_refills_nothing(tmp_path, clock):
+    limiter = RateLimiter('clock', BUCKETS, state_dir=str(tmp_path))
+    drain(limiter, ORDER)
+    clock.now -= 3600
+    assert limiter.try_acquire(priority=ORDER) == pytest.approx(360.0)
+    # Refill resumes from the stepped-back time, not from the later one written before
+    clock.now += 360
+    assert limiter.try_acquire(priority=ORDER) == 0
+    assert limiter.try_acquire(priority=ORDER) > 0
+
+
+def test_acquire_times_out_instead_of_waiting(tmp_path, clock):
+    limiter = RateLimiter('timeout', BUCKETS, state_dir=str(tmp_path))
+    drain(limiter, ORDER)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(priority=ORDER, timeout=10)
+    limiter.acquire(priority=ORDER)  # Sleeps on the fake clock until a token is back
+    assert limiter.metrics()['order']['waited'] == 1
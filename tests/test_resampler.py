@@ -0,0 +1,89 @@
+# test_resampler.py
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from common.resampler import MultiTimeframeBars  # noqa: E402
+
+RULES = {'5m': '5min', '15m': '15min', '1h': '1h', '1d': '1D'}
+
+
+def minute_bars(n, seed=1):
+    # 1-minute bars with random gaps, as from a feed that skips quiet minutes
+    rng = np.random.default_rng(seed)
+    minutes = np.cumsum(rng.integers(1, 4, n))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.0005, n)),
+        'High': close * 1.001,
+        'Low': close * 0.999,
+        'Close': close,
+        'Volume': rng.integers(1, 1000, n).astype(float),
+    }, index=pd.to_datetime(1_700_000_000 * 10**9 + minutes * 60 * 10**9, utc=True))
+
+
+def resampled(frame, rule):
+    return frame.resample(rule, origin='epoch').agg(
+        {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}).dropna()
+
+
+def test_incremental_appends_match_pandas():
+    frame = minute_bars(3000)
+    store = MultiTimeframeBars()
+    rng = np.random.default_rng(2)
+    i = 0
+    while i < len(frame):
+        step = int(rng.integers(1, 40))
+        store.extend_frame('SPY', frame.iloc[i:i + step])
+        i += step
+        # Read some timeframes mid-stream so later appends update memoized series
+        for timeframe in rng.choice(list(RULES), 2, replace=False):
+            store.bars('SPY', timeframe)
+    for timeframe, rule in RULES.items():
+        pd.testing.assert_frame_equal(store.frame('SPY', timeframe), resampled(frame, rule), check_freq=False)
+
+
+def test_single_bar_appends_match_pandas():
+    frame = minute_bars(500)
+    store = MultiTimeframeBars()
+    for ts, row in zip(frame.index.asi8, frame.itertuples(index=False)):
+        store.append('SPY', ts, row.Open, row.High, row.Low, row.Close, row.Volume)
+        store.bars('SPY', '15m')
+    pd.testing.assert_frame_equal(store.frame('SPY', '15m'), resampled(frame, '15min'), check_freq=False)
+    assert len(store.bars('SPY', '1m')[0]) == len(frame)
+
+
+def test_same_timestamp_replaces_and_older_bars_are_ignored():
+    frame = minute_bars(30)
+    store = MultiTimeframeBars()
+    store.extend_frame('SPY', frame)
+    store.bars('SPY', '5m')
+    last = frame.index.asi8[-1]
+    store.append('SPY', last, 1.0, 500.0, 0.5, 2.0, 7.0)
+    store.append('SPY', frame.index.asi8[0], 9.0, 9.0, 9.0, 9.0, 9.0)
+    ts, columns = store.bars('SPY', '1m')
+    assert len(ts) == 30 and columns['close'][-1] == 2.0
+    assert store.bars('SPY', '5m')[1]['high'][-1] == 500.0
+
+
+def test_retention_caps_series_and_keeps_derived_bars_exact():
+    frame = minute_bars(5000)
+    store = MultiTimeframeBars(max_bars=400)
+    for i in range(0, len(frame), 7):
+        store.extend_frame('SPY', frame.iloc[i:i + 7])
+        if i % 700 == 0:
+            store.bars('SPY', '1h')
+    store.bars('SPY', '5m')
+    assert len(store.bars('SPY', '1m')[0]) <= 500
+    for timeframe, rule in (('5m', '5min'), ('1h', '1h')):
+        derived = store.frame('SPY', timeframe)
+        assert len(derived) <= 500
+        pd.testing.assert_frame_equal(derived, resampled(frame, rule).iloc[-len(derived):], check_freq=False)
+    assert store.snapshot()['base_bars'] <= 500
+
+
+def test_unknown_symbol_is_empty():
+    ts, columns = MultiTimeframeBars().bars('NONE', '5m')
+    assert len(ts) == 0 and set(columns) == {'open', 'high', 'low', 'close', 'volume'}
@@ -0,0 +1,98 @@
+# test_risk.py
+
+import random
+
+import pytest
+
+from common.risk import RiskEngine
+from paper_journal import PaperTraderJournal
+from paper_trading import PaperTrader
+
+
+def recomputed(engine):
+    # Totals from scratch, to compare with the engine's running ones
+    gross = net = committed_gross = committed_net = 0.0
+    for symbol, price in engine.prices.items():
+        exposure = engine.quantities.get(symbol, 0) * price
+        committed = exposure + engine.reserved.get(symbol, 0) * price
+        gross += abs(exposure)
+        net += exposure
+        committed_gross += abs(committed)
+        committed_net += committed
+    return gross, net, committed_gross, committed_net
+
+
+def test_running_totals_match_full_revaluation():
+    rng = random.Random(3)
+    engine = RiskEngine(sectors={'A': 'tech', 'B': 'tech'})
+    symbols = ['A', 'B', 'C', 'D']
+    open_orders = []
+    for i in range(2000):
+        action = rng.random()
+        symbol = rng.choice(symbols)
+        if action < 0.3:
+            engine.on_price(symbol, rng.uniform(10, 200))
+        elif action < 0.6:
+            engine.on_fill(symbol, rng.randint(-50, 50), rng.uniform(10, 200))
+        elif action < 0.8:
+            engine.reserve(i, symbol, rng.randint(-50, 50), rng.uniform(10, 200))
+            open_orders.append(i)
+        elif open_orders:
+            engine.release(open_orders.pop(rng.randrange(len(open_orders))))
+    totals = (engine.gross, engine.net, engine.committed_gross, engine.committed_net)
+    assert totals == pytest.approx(recomputed(engine))
+    tech = sum(abs(engine.committed[s]) for s in ('A', 'B') if s in engine.committed)
+    assert engine.sector_gross['tech'] == pytest.approx(tech)
+
+
+def test_symbol_gross_and_net_limits():
+    engine = RiskEngine(max_gross=12_000, max_net=6_000, max_symbol=5_000)
+    assert engine.check('A', 10, 100.0) is None
+    assert engine.check('A', 60, 100.0).startswith('A exposure')
+    engine.on_fill('A', 30, 100.0)
+    engine.on_fill('B', 20, 100.0)
+    assert engine.check('C', 20, 100.0).startswith('net exposure')
+    engine.on_fill('C', -40, 100.0)
+    assert engine.check('D', 40, 100.0).startswith('gross exposure')
+    assert engine.check('D', 20, 100.0) is None
+
+
+def test_reducing_an_over_limit_position_is_allowed():
+    engine = RiskEngine(max_symbol=1_000)
+    engine.on_fill('A', 100, 100.0)
+    assert engine.check('A', -10, 100.0) is None
+    assert engine.check('A', 10, 100.0) is not None
+
+
+def test_reservations_count_until_released():
+    engine = RiskEngine(max_gross=10_000)
+    engine.reserve('o1', 'A', 80, 100.0)
+    assert engine.check('B', 30, 100.0).startswith('gross exposure')
+    engine.on_fill('A', 30, 100.0, order_id='o1')
+    engine.release('o1')
+    assert engine.check('B', 30, 100.0) is None
+
+
+def test_unvalued_existing_position_counts_in_gross():
+    engine = RiskEngine(max_gross=10_000, max_net=10_000)
+    # A is loaded without a price, so it is not valued yet
+    engine.load_positions({'B': (50, 100.0), 'A': (40, None)})
+    # 5,000 (B) + 4,000 existing + 2,000 new A = 11,000
+    assert engine.check('A', 20, 100.0).startswith('gross exposure')
+    assert engine.check('A', 10, 100.0) is None
+
+
+def test_recovered_paper_positions_are_seeded_into_the_engine(tmp_path):
+    trader = PaperTrader(initial_cash=100_000, journal=PaperTraderJournal(str(tmp_path), snapshot_every=1),
+                         risk=RiskEngine(max_gross=20_000))
+    trader.place_order('SPY', 100, 'buy', 100.0)
+    trader.place_order('AAPL', 50, 'buy', 100.0)
+    trader.journal.close()
+
+    risk = RiskEngine(max_gross=20_000)
+    recovered = PaperTrader(initial_cash=100_000, journal=PaperTraderJournal(str(tmp_path), snapshot_every=1),
+                            risk=risk)
+    assert risk.quantities == {'SPY': 100, 'AAPL': 50}
+    assert risk.gross == pytest.approx(15_000)
+    assert recovered.place_order('MSFT', 60, 'buy', 100.0) is None
+    recovered.journal.close()
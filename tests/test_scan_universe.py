@@ -0,0 +1,74 @@
+# test_scan_universe.py
+
+import sys
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+import paper_trading  # noqa: E402
+from paper_trading import PaperTrader, download_daily, scan_universe  # noqa: E402
+
+
+def daily(seed, n=260):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.001, 0.01, n)))
+    return pd.DataFrame({'Close': close, 'High': close * 1.01, 'Low': close * 0.99, 'Open': close, 'Volume': 1.0},
+                        index=pd.bdate_range(end='2024-10-14', periods=n))
+
+
+class FakeYahoo:
+    # yf.download: (field, ticker) columns for several tickers, flat columns for one; 'BAD' has no data
+    def __init__(self):
+        self.calls = []
+
+    def download(self, tickers, **kwargs):
+        self.calls.append(list(tickers))
+        frames = {t: daily(int(t[3:])) for t in tickers if t != 'BAD'}
+        if not frames:
+            return pd.DataFrame()
+        if len(tickers) == 1:
+            return frames[tickers[0]]
+        return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.tokens = 0
+
+    def acquire(self, tokens=1, priority=None, timeout=None):
+        self.tokens += tokens
+
+
+@pytest.fixture
+def yahoo(monkeypatch):
+    fake = FakeYahoo()
+    monkeypatch.setitem(sys.modules, 'yfinance', types.SimpleNamespace(download=fake.download))
+    limiter = CountingLimiter()
+    monkeypatch.setattr(paper_trading, 'get_limiter', lambda provider: limiter)
+    return fake, limiter
+
+
+def test_download_batches_draw_one_token_per_symbol(yahoo):
+    fake, limiter = yahoo
+    symbols = [f"SYM{i}" for i in range(45)] + ['BAD']
+    frames = download_daily(symbols, days=260, batch_size=20)
+    assert [len(call) for call in fake.calls] == [20, 20, 6]
+    assert limiter.tokens == 46
+    assert sorted(frames) == sorted(symbols[:-1])
+    pd.testing.assert_series_equal(frames['SYM7']['Close'], daily(7)['Close'], check_names=False)
+
+
+def test_single_symbol_flat_columns(yahoo):
+    frames = download_daily(['SYM3'], days=260)
+    assert list(frames) == ['SYM3']
+    assert frames['SYM3']['Close'].iloc[-1] == daily(3)['Close'].iloc[-1]
+
+
+def test_scan_accepts_a_generator(yahoo):
+    trader = PaperTrader(initial_cash=100000)
+    candidates = scan_universe(trader, (f"SYM{i}" for i in range(30)))
+    assert {c['symbol'] for c in candidates} <= {f"SYM{i}" for i in range(30)}
+    assert scan_universe(trader, iter(['BAD'])) == []
@@ -0,0 +1,122 @@
+# test_token_manager.py
+
+import base64
+import json
+import threading
+import time
+import types
+
+import pytest
+
+pytest.importorskip("filelock")
+requests = pytest.importorskip("requests")
+
+from token_manager import TokenManager  # noqa: E402
+
+
+def jwt(expires_in, tag='a'):
+    payload = json.dumps({'exp': time.time() + expires_in, 'tag': tag}).encode()
+    return "header." + base64.urlsafe_b64encode(payload).decode().rstrip('=') + ".signature"
+
+
+class FakeRefreshEndpoint:
+    # Stands in for requests.post against the Fyers refresh URL
+    def __init__(self, token):
+        self.token = token
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            self.calls.append(json)
+        time.sleep(0.05)  # Long enough for the other workers to queue on the file lock
+        return types.SimpleNamespace(json=lambda: {'s': 'ok', 'access_token': self.token})
+
+
+def manager(path, pin=1234):
+    refreshed = []
+    tokens = TokenManager('APP-100', 'secret', pin=pin, token_file=str(path), on_refresh=refreshed.append)
+    tokens.refreshed = refreshed
+    return tokens
+
+
+def write_state(path, access_in, refresh_in=15 * 24 * 3600):
+    access, refresh = jwt(access_in), jwt(refresh_in, 'refresh')
+    with open(path, 'w') as f:
+        json.dump({'access_token': access, 'access_expires_at': time.time() + access_in,
+                   'refresh_token': refresh, 'refresh_expires_at': time.time() + refresh_in}, f)
+    return access, refresh
+
+
+def test_store_keeps_a_refresh_token_written_by_another_process(tmp_path):
+    path = tmp_path / 'token.json'
+    first, second = manager(path), manager(path)
+    assert second.get_access_token() is None  # Caches the empty state
+    refresh = jwt(15 * 24 * 3600, 'refresh')
+    first.store({'access_token': jwt(3600), 'refresh_token': refresh})
+    second.store({'access_token': jwt(3600, 'b')})
+
+    state = json.loads(path.read_text())
+    assert state['refresh_token'] == refresh and state['refresh_expires_at'] > time.time()
+    assert first.get_access_token() == state['access_token']
+    first._notify()
+    second._notify()
+    assert first.refreshed == [] and second.refreshed == []  # The callers stored those tokens themselves
+
+
+def test_concurrent_refresh_posts_once_and_notifies_each_manager_once(tmp_path, monkeypatch):
+    path = tmp_path / 'token.json'
+    old, _ = write_state(path, access_in=-60)
+    new = jwt(3600, 'new')
+    endpoint = FakeRefreshEndpoint(new)
+    monkeypatch.setattr(requests, 'post', endpoint.post)
+    managers = [manager(path) for _ in range(4)]
+    start = threading.Barrier(len(managers))
+    tokens = {}
+
+    def get(i):
+        start.wait()
+        tokens[i] = managers[i].get_access_token()
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(len(managers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(endpoint.calls) == 1 and endpoint.calls[0]['pin'] == '1234'
+    assert set(tokens.values()) == {new}
+    assert all(m.refreshed == [new] for m in managers)
+    for m in managers:
+        m._notify()
+    assert all(m.refreshed == [new] for m in managers)
+
+
+def test_token_refreshed_elsewhere_is_notified_once(tmp_path, monkeypatch):
+    path = tmp_path / 'token.json'
+    write_state(path, access_in=3600)
+    watcher = manager(path)
+    watcher.get_access_token()
+    watcher._notify()
+    assert watcher.refreshed == []
+
+    endpoint = FakeRefreshEndpoint(jwt(7200, 'new'))
+    monkeypatch.setattr(requests, 'post', endpoint.post)
+    other = manager(path)
+    other.refresh_margin = 4000  # Forces a refresh of the still-valid token
+    assert other.refresh()
+    watcher._notify()
+    watcher._notify()
+    assert watcher.refreshed == [endpoint.token]
+
+
+def test_refresh_needs_a_pin_and_a_live_refresh_token(tmp_path, monkeypatch):
+    endpoint = FakeRefreshEndpoint(jwt(3600))
+    monkeypatch.setattr(requests, 'post', endpoint.post)
+    path = tmp_path / 'token.json'
+    write_state(path, access_in=-60)
+    assert not manager(path, pin=None).refresh()
+    write_state(path, access_in=-60, refresh_in=-1)
+    no_login = manager(path)
+    assert no_login.get_access_token() is None
+    assert endpoint.calls == [] and no_login.refreshed == []
@@ -0,0 +1,190 @@
+# paper_journal.py
+
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+
+from filelock import FileLock, Timeout
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'item'):  # numpy scalars
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(record):
+    if 'timestamp' in record:
+        record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+    return record
+
+
+class PaperTraderJournal:
+    """
+    Write-ahead log plus periodic snapshots of PaperTrader state.
+
+    Orders and fills are appended to an in-memory queue and written by a
+    background thread, which fsyncs once per batch (group commit), so the order
+    path never waits on the disk. Every ``snapshot_every`` events a compact
+    snapshot (cash and positions) is written atomically and a new log segment
+    started. Segments are kept: they are the order and trade history. Recovery
+    takes cash and positions from the snapshot, rebuilds the histories from the
+    segments it covers and replays only the events after it.
+
+    Only one journal may write a directory at a time; a second one raises
+    RuntimeError instead of interleaving sequence numbers with the first.
+
+    Layout of ``directory``:
+    - snapshot.json: latest snapshot, with the sequence number it includes.
+    - wal-<first seq>.log: JSON lines of events, one segment per snapshot interval.
+    - journal.lock: held by the writing process.
+    """
+
+    def __init__(self, directory, snapshot_every=1000):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.seq = 0
+        self.events_since_snapshot = 0
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.thread = None
+        os.makedirs(directory, exist_ok=True)
+        self.dir_lock = FileLock(os.path.join(directory, 'journal.lock'))
+        try:
+            self.dir_lock.acquire(timeout=0)
+        except Timeout:
+            raise RuntimeError(f"Paper journal {directory} is already open in another trader or process") from None
+
+    # ----------------------------
+    # Recovery
+    # ----------------------------
+    def recover(self):
+        """
+        Return (snapshot_state, history_events, tail_events) from disk.
+
+        snapshot_state is None if no snapshot has been written yet. history_events
+        are the events the snapshot already includes, for rebuilding the order and
+        trade history; tail_events came after it and must be replayed.
+        """
+        state = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                state = json.load(f)
+            self.seq = state['seq']
+        snapshot_seq = self.seq
+        history, tail = [], []
+        for path in sorted(glob.glob(os.path.join(self.directory, 'wal-*.log'))):
+            good, torn = 0, False
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError
+                        event = json.loads(line)
+                    except ValueError:
+                        torn = True
+                        break
+                    good += len(line)
+                    if event['seq'] <= snapshot_seq:
+                        history.append(_decode(event))
+                    elif event['seq'] > self.seq:
+                        tail.append(_decode(event))
+                        self.seq = event['seq']
+            if torn:
+                # Torn write at the tail of the last segment. Cut it off, or the next
+                # event appended to a reopened segment would be glued onto it.
+                logger.warning("Truncating incomplete journal record in %s", path)
+                os.truncate(path, good)
+        self.events_since_snapshot = len(tail)
+        logger.info("Recovered paper state: snapshot seq %s, %d history events + %d log events",
+                    state['seq'] if state else None, len(history), len(tail))
+        return state, history, tail
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+    def start(self):
+        self._open_segment(self.seq + 1)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, kind, record):
+        """
+        Queue an 'order' or 'fill' event. Call with the trader's lock held so
+        sequence numbers follow the order state changed in.
+        """
+        self.seq += 1
+        self.events_since_snapshot += 1
+        self.queue.put((self.seq, kind, record))
+
+    def maybe_snapshot(self, get_state):
+        """
+        Queue a snapshot from get_state() if snapshot_every events have been appended since the last one.
+        """
+        if self.events_since_snapshot >= self.snapshot_every:
+            self.snapshot(get_state())
+
+    def snapshot(self, state):
+        state = dict(state, seq=self.seq)
+        self.events_since_snapshot = 0
+        self.queue.put((self.seq, 'snapshot', state))
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+        self.dir_lock.release()
+
+    def _open_segment(self, first_seq):
+        path = os.path.join(self.directory, f'wal-{first_seq:012d}.log')
+        self.file = open(path, 'a')
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _write_snapshot(self, seq, state):
+        self._sync()
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'), default=_encode)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Later events are replayed from here on; earlier segments stay as history
+        self.file.close()
+        self._open_segment(seq + 1)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Group commit: take whatever queued up while the last fsync ran
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is _STOP:
+                    self._sync()
+                    self.file.close()
+                    return
+                seq, kind, record = item
+                if kind == 'snapshot':
+                    self._write_snapshot(seq, record)
+                else:
+                    self.file.write(json.dumps(dict(record, seq=seq, type=kind),
+                                               separators=(',', ':'), default=_encode) + '\n')
+            self._sync()
@@ -0,0 +1,441 @@
+# paper_trading.py
+
+import pandas as pd
+import time
+import functools
+import logging
+import threading
+from datetime import datetime
+
+from common.rate_limit import rate_limited, get_limiter
+from common.metrics import timer
+from common.quote_store import BID, ASK, TIMESTAMP
+from common.scanner import align, scan
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=256)
+def get_ticker(symbol):
+    # yfinance Ticker whose calls draw from the shared Yahoo rate-limit budget, one per
+    # symbol rather than per call. yfinance is imported here, on first use, to keep it out of startup
+    import yfinance as yf
+    return rate_limited(yf.Ticker(symbol), 'yahoo')
+
+# ----------------------------
+# PaperTrader Class
+# ----------------------------
+class PaperTrader:
+    def __init__(self, initial_cash=100000, journal=None, risk=None, bars=None, quotes=None):
+        self.cash = initial_cash
+        self.positions = {}  # symbol: quantity
+        self.order_history = []
+        self.trade_history = []
+        self.portfolio_history = []
+        self.last_prices = {}  # symbol: last price seen by get_price or a fill, for cached valuation
+        self.lock = threading.RLock()  # Re-entrant: order execution and valuation nest lock acquisitions
+        # Optional RiskEngine: pre-trade limit checks, updated on every fill and price
+        self.risk = risk
+        # Optional MultiTimeframeBars fed with every 1-minute fetch, so strategies can read
+        # 5m/15m/1h/1d bars derived from it instead of fetching each timeframe
+        self.bars = bars
+        # Optional QuoteStore fed by a live quote stream: fills cross the spread and
+        # get_price reads the midpoint instead of fetching bars
+        self.quotes = quotes
+        # Optional PaperTraderJournal: restore state from disk and log every order and fill
+        self.journal = journal
+        if journal is not None:
+            self.recover()
+
+    def recover(self):
+        state, history, tail = self.journal.recover()
+        with self.lock:
+            if state is not None:
+                self.cash = state['cash']
+                self.positions = state['positions']
+            # Events the snapshot covers only rebuild the histories; each fill carries the
+            # cash and positions it left behind, for the portfolio history
+            for event in history:
+                kind = event.pop('type')
+                event.pop('seq')
+                if kind == 'order':
+                    self.order_history.append(event)
+                elif kind == 'fill':
+                    row = {'cash': event.pop('cash'), 'positions': event.pop('positions'),
+                           'timestamp': event['timestamp']}
+                    self.trade_history.append(event)
+                    self.portfolio_history.append(row)
+                    self.last_prices[event['symbol']] = event['price']
+            if self.risk is not None:
+                # Fills below reach the engine as deltas; give it the snapshot positions to apply them to
+                self.risk.load_positions({symbol: (quantity, self.last_prices.get(symbol))
+                                          for symbol, quantity in self.positions.items()})
+            for event in tail:
+                kind = event.pop('type')
+                event.pop('seq')
+                if kind == 'order':
+                    self.order_history.append(event)
+                elif kind == 'fill':
+                    event.pop('cash', None)
+                    event.pop('positions', None)
+                    self.apply_fill(event)
+            self.journal.start()
+            if state is None:
+                # Persist the starting cash so a log-only recovery has a base to replay onto
+                self.journal.snapshot(self.get_state())
+
+    def get_state(self):
+        # Compact: the histories are rebuilt from the journal's log segments
+        with self.lock:
+            return {'cash': self.cash, 'positions': self.positions.copy()}
+
+    @timer("paper.get_price")
+    def get_price(self, symbol):
+        if self.quotes is not None:
+            quote = self.quotes.fresh(symbol)
+            if quote is not None:
+                mid = (quote[BID] + quote[ASK]) / 2
+                if self.risk is not None:
+                    self.risk.on_price(symbol, mid)
+                self.last_prices[symbol] = mid
+                return mid, datetime.fromtimestamp(quote[TIMESTAMP])
+        ticker = get_ticker(symbol)
+        data = ticker.history(period="1d", interval="1m")
+        if data.empty:
+            logger.warning("No data retrieved for %s", symbol)
+            return None, None
+        if self.bars is not None:
+            self.bars.extend_frame(symbol, data)
+        latest_price = data['Close'].iloc[-1]
+        latest_time = data.index[-1]
+        self.last_prices[symbol] = latest_price
+        if self.risk is not None:
+            self.risk.on_price(symbol, latest_price)
+        return latest_price, latest_time
+
+    @timer("paper.place_order")
+    def place_order(self, symbol, quantity, side, price):
+        with self.lock:
+            if self.risk is not None:
+                reason = self.risk.check(symbol, quantity if side == 'buy' else -quantity, price)
+                if reason:
+                    logger.warning("Rejected %s order for %s shares of %s: %s", side, quantity, symbol, reason)
+                    return
+            order = {
+                'symbol': symbol,
+                'quantity': quantity,
+                'side': side,
+                'price': price,
+                'timestamp': datetime.now()
+            }
+            self.order_history.append(order)
+            if self.journal is not None:
+                self.journal.append('order', order)
+            logger.info("Placed %s order for %s shares of %s at %s", side, quantity, symbol, price)
+            # Simulate immediate execution; returns the trade, or None if it was not filled
+            return self.execute_order(order)
+
+    def execute_order(self, order):
+        with self.lock:
+            symbol = order['symbol']
+            quantity = order['quantity']
+            side = order['side']
+            price = order['price']
+            if self.quotes is not None:
+                # Cross the spread: buys lift the ask, sells hit the bid
+                price = self.quotes.fill_price(symbol, side) or price
+
+            if side == 'buy':
+                if self.cash < quantity * price:
+                    logger.warning("Insufficient cash to execute BUY order.")
+                    return
+            elif side == 'sell':
+                if self.positions.get(symbol, 0) < quantity:
+                    logger.warning("Insufficient shares to execute SELL order.")
+                    return
+            else:
+                logger.error("Invalid order side.")
+                return
+
+            # Record the trade
+            trade = {
+                'symbol': symbol,
+                'quantity': quantity,
+                'side': side,
+                'price': price,
+                'timestamp': datetime.now()
+            }
+            self.apply_fill(trade)
+            logger.info("Executed %s: %s shares of %s at %s", side.upper(), quantity, symbol, price)
+            if self.journal is not None:
+                self.journal.append('fill', dict(trade, cash=self.cash, positions=self.positions.copy()))
+                self.journal.maybe_snapshot(self.get_state)
+            return trade
+
+    def apply_fill(self, trade):
+        """
+        Apply an already validated fill to cash and positions. Also used to replay the journal.
+        """
+        with self.lock:
+            symbol = trade['symbol']
+            quantity = trade['quantity']
+            if trade['side'] == 'buy':
+                self.cash -= quantity * trade['price']
+                self.positions[symbol] = self.positions.get(symbol, 0) + quantity
+            else:
+                self.cash += quantity * trade['price']
+                self.positions[symbol] -= quantity
+                if self.positions[symbol] == 0:
+                    del self.positions[symbol]
+            self.trade_history.append(trade)
+            self.last_prices[symbol] = trade['price']
+            self.record_portfolio(trade['timestamp'])
+            if self.risk is not None:
+                signed = quantity if trade['side'] == 'buy' else -quantity
+                self.risk.on_fill(symbol, signed, trade['price'])
+
+    def record_portfolio(self, timestamp=None):
+        with self.lock:
+            portfolio = {
+                'cash': self.cash,
+                'positions': self.positions.copy(),
+                'timestamp': timestamp or datetime.now()
+            }
+            self.portfolio_history.append(portfolio)
+
+    def get_portfolio_value(self):
+        with self.lock:
+            total = self.cash
+            positions = self.positions.copy()
+        # Fetch prices outside the lock so orders are not blocked on network I/O
+        for symbol, qty in positions.items():
+            price, _ = self.get_price(symbol)
+            if price:
+                total += qty * price
+        return total
+
+    def sizes(self):
+        """
+        Lengths of the in-memory ledgers and attached stores, for telemetry.
+        """
+        with self.lock:
+            sizes = {
+                'orders': len(self.order_history),
+                'trades': len(self.trade_history),
+                'portfolio_history': len(self.portfolio_history),
+                'positions': len(self.positions),
+            }
+        if self.bars is not None:
+            sizes['bars'] = self.bars.snapshot()
+        if self.quotes is not None:
+            sizes['quotes'] = self.quotes.snapshot()
+        return sizes
+
+    def cached_portfolio_value(self):
+        """
+        Portfolio value at the last price seen for each symbol, without fetching any.
+        Positions that were never priced count as zero.
+        """
+        with self.lock:
+            return self.cash + sum(qty * self.last_prices.get(symbol, 0) for symbol, qty in self.positions.items())
+
+    def print_portfolio(self):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        # Valued at cached prices: this runs on the trading thread every cycle
+        with self.lock:
+            cash = self.cash
+            positions = self.positions.copy()
+            total_value = self.cached_portfolio_value()
+        logger.info("Portfolio", extra={'cash': cash, 'positions': positions, 'total_value': total_value})
+
+# ----------------------------
+# EnhancedMLTrader Class
+# ----------------------------
+class EnhancedMLTrader:
+    def __init__(self, trader: PaperTrader, symbol: str = "SPY", risk_per_trade: float = 0.01, 
+                 short_window: int = 50, long_window: int = 200, 
+                 atr_period: int = 14, atr_multiplier: float = 1.5, atr_timeframe: str = None):
+        self.trader = trader
+        self.symbol = symbol
+        self.risk_per_trade = risk_per_trade
+        self.short_window = short_window
+        self.long_window = long_window
+        self.atr_period = atr_period
+        self.atr_multiplier = atr_multiplier
+        # Timeframe (e.g. '15m') of the ATR behind the stop distance, derived from the trader's
+        # MultiTimeframeBars; daily bars are used while there are too few, or if None
+        self.atr_timeframe = atr_timeframe
+        logger.info("Initialized strategy for %s with short_window=%s, long_window=%s, atr_period=%s, atr_multiplier=%s, "
+                    "atr_timeframe=%s", self.symbol, self.short_window, self.long_window, self.atr_period,
+                    self.atr_multiplier, self.atr_timeframe)
+
+    def fetch_daily_bars(self, days: int):
+        ticker = get_ticker(self.symbol)
+        with timer("data_fetch"):
+            return ticker.history(period=f"{days + 10}d", interval="1d")  # Fetch extra data to ensure indicator calculation
+
+    def atr_bars(self, daily):
+        # Derived from the 1-minute bars get_price already fetched, so no extra request
+        if self.atr_timeframe is None or self.trader.bars is None:
+            return daily
+        bars = self.trader.bars.frame(self.symbol, self.atr_timeframe)
+        return bars if len(bars) > self.atr_period else daily
+
+    def calculate_sma(self, window: int, data=None):
+        if data is None:
+            data = self.fetch_daily_bars(window)
+        if data.empty:
+            logger.warning("No data for SMA calculation for %s", self.symbol)
+            return None
+        with timer("indicator_compute"):
+            sma = data['Close'].rolling(window=window).mean().iloc[-1]
+        logger.debug("Calculated SMA(%s): %s", window, sma)
+        return sma
+
+    def calculate_atr(self, data=None):
+        if data is None:
+            data = self.fetch_daily_bars(self.atr_period)
+        if data.empty:
+            logger.warning("No data for ATR calculation for %s", self.symbol)
+            return None
+        with timer("indicator_compute"):
+            high = data['High']
+            low = data['Low']
+            close = data['Close']
+            tr1 = high - low
+            tr2 = (high - close.shift()).abs()
+            tr3 = (low - close.shift()).abs()
+            tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
+            atr = tr.rolling(self.atr_period).mean().iloc[-1]
+        logger.debug("Calculated ATR: %s", atr)
+        return atr
+
+    @timer("sizing")
+    def position_sizing(self, stop_loss_distance):
+        with self.trader.lock:
+            cash = self.trader.cash
+        risk_amount = cash * self.risk_per_trade
+        position_size = risk_amount / stop_loss_distance
+        price, _ = self.trader.get_price(self.symbol)
+        if price:
+            quantity = int(position_size / price)
+            logger.debug("Position sizing calculated: %s shares", quantity)
+            return quantity
+        return 0
+
+    @timer("iteration")
+    def on_trading_iteration(self):
+        try:
+            # One daily fetch covers both SMAs and the ATR
+            data = self.fetch_daily_bars(max(self.short_window, self.long_window, self.atr_period + 1))
+            short_sma = self.calculate_sma(self.short_window, data)
+            long_sma = self.calculate_sma(self.long_window, data)
+            atr = self.calculate_atr(self.atr_bars(data))
+            if short_sma is None or long_sma is None or atr is None:
+                logger.warning("Insufficient data to calculate indicators.")
+                return
+            last_price, last_time = self.trader.get_price(self.symbol)
+            if last_price is None:
+                logger.warning("Could not retrieve last price for %s", self.symbol)
+                return
+            stop_loss_distance = atr * self.atr_multiplier
+            quantity = self.position_sizing(stop_loss_distance)
+            current_positions = self.trader.positions
+
+            logger.debug("Short SMA: %s, Long SMA: %s, Last Price: %s, ATR: %s, Stop Loss Distance: %s, Quantity: %s",
+                         short_sma, long_sma, last_price, atr, stop_loss_distance, quantity)
+
+            # Golden Cross (Buy Signal)
+            if short_sma > long_sma and self.symbol not in current_positions:
+                take_profit_price = last_price + (atr * 3)
+                stop_loss_price = last_price - stop_loss_distance
+                with timer("order_submit"):
+                    self.trader.place_order(
+                        symbol=self.symbol,
+                        quantity=quantity,
+                        side="buy",
+                        price=last_price
+                    )
+                logger.info("Placed BUY order for %s shares at %s", quantity, last_price)
+            # Death Cross (Sell Signal)
+            elif short_sma < long_sma and self.symbol in current_positions:
+                position_qty = current_positions[self.symbol]
+                take_profit_price = last_price - (atr * 3)
+                stop_loss_price = last_price + stop_loss_distance
+                with timer("order_submit"):
+                    self.trader.place_order(
+                        symbol=self.symbol,
+                        quantity=position_qty,
+                        side="sell",
+                        price=last_price
+                    )
+                logger.info("Placed SELL order for %s shares at %s", position_qty, last_price)
+            else:
+                logger.info("No trading signal detected.")
+        except Exception as e:
+            logger.error("Error during trading iteration: %s", e)
+
+# ----------------------------
+# Universe Scan
+# ----------------------------
+def download_daily(symbols, days, batch_size=20):
+    """
+    Daily bars for many symbols as {symbol: DataFrame}, batch_size tickers per yf.download call.
+    yfinance sends one request per ticker, so each batch first draws one Yahoo token per symbol.
+    Symbols without data are left out.
+    """
+    import yfinance as yf
+
+    limiter = get_limiter('yahoo')
+    frames = {}
+    for i in range(0, len(symbols), batch_size):
+        batch = symbols[i:i + batch_size]
+        for _ in batch:
+            limiter.acquire()
+        with timer("data_fetch"):
+            data = yf.download(batch, period=f"{days}d", interval="1d", group_by="column", progress=False)
+        if data.empty:
+            continue
+        for symbol in batch:
+            # One ticker may come back with flat columns
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(1):
+                    continue
+                frame = data.xs(symbol, axis=1, level=1)
+            else:
+                frame = data
+            frame = frame.dropna(how='all')
+            if not frame.empty:
+                frames[symbol] = frame
+    return frames
+
+
+def scan_universe(trader: PaperTrader, symbols, short_window: int = 50, long_window: int = 200,
+                  atr_period: int = 14, atr_multiplier: float = 1.5, risk_per_trade: float = 0.01, top=None):
+    """
+    Rank EnhancedMLTrader signals across many symbols: batched multi-ticker downloads,
+    then a single vectorized scan instead of per-symbol fetches and indicator calls.
+    """
+    symbols = list(symbols)
+    days = max(short_window, long_window, atr_period) + 10
+    frames = download_daily(symbols, days)
+    if not frames:
+        logger.warning("No data retrieved for universe scan")
+        return []
+    with trader.lock:
+        cash = trader.cash
+        positions = trader.positions.copy()
+    with timer("indicator_compute"):
+        close, high, low, symbols = align(frames)
+        return scan(close, high, low, symbols, cash, positions,
+                    short_window=short_window, long_window=long_window, atr_period=atr_period,
+                    atr_multiplier=atr_multiplier, risk_per_trade=risk_per_trade, top=top)
+
+# ----------------------------
+# Trading Loop Function
+# ----------------------------
+def trading_loop(trader: PaperTrader, strategy: EnhancedMLTrader, symbol: str, interval: int, stop_event: threading.Event):
+    while not stop_event.is_set():
+        strategy.on_trading_iteration()
+        trader.print_portfolio()
+        time.sleep(interval)